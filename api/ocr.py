@@ -6,42 +6,47 @@ import os
 # Add backend directory to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
+# One function instance serves one request at a time: OCR in-process instead
+# of paying for a process pool on every cold start
+os.environ.setdefault('OCR_POOL_WORKERS', '1')
+
 try:
-    from backend.ocr_processor import process_document
+    from ocr_processor import process_document
 except ImportError:
     process_document = None
 
 app = Flask(__name__)
 CORS(app)
 
-def handler(event, context):
+
+@app.route('/', defaults={'path': ''}, methods=['GET', 'POST'])
+@app.route('/<path:path>', methods=['GET', 'POST'])
+def handler(path):
     """Vercel serverless function handler"""
     if not process_document:
-        return {
-            'statusCode': 500,
-            'body': jsonify({'error': 'OCR processor not available'})
-        }
-    
+        return jsonify({'error': 'OCR processor not available'}), 500
+
+    if request.method != 'POST':
+        return jsonify({'error': 'Method not allowed'}), 405
+
     try:
-        if request.method == 'POST':
-            if 'file' not in request.files:
-                return jsonify({'error': 'No file provided'}), 400
-            
-            file = request.files['file']
-            result = process_document(file)
-            
-            return jsonify({
-                'success': True,
-                'data': result
-            }), 200
-        else:
-            return jsonify({'error': 'Method not allowed'}), 405
-            
+        if 'file' not in request.files:
+            return jsonify({'error': 'No file provided'}), 400
+
+        file = request.files['file']
+        result = process_document(file, document_type=request.form.get('document_type') or 'auto')
+
+        return jsonify({
+            'success': True,
+            'data': result
+        }), 200
+
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
+
 # For Vercel
 app = app
@@ -0,0 +1,251 @@
+"""
+Admission control for the extraction endpoints.
+
+Every extraction fans its OCR out over the whole process pool, so running
+more of them at once only makes them all slower: in enrollment season a burst
+of uploads would have every request time out together. At most
+OCR_ADMISSION_CONCURRENCY extractions run at once; the next ones wait in a
+FIFO queue of bounded depth, and requests that would not start within
+OCR_ADMISSION_MAX_WAIT_SECONDS (or before their own deadline) are rejected
+right away with a Retry-After, so the box keeps finishing the work it accepted.
+
+Waits are estimated from the cost of a document (megapixels to OCR: image
+size, or page count times rendered page size for PDFs) and the drain rate: the
+megapixels per second an extraction slot has recently been getting through.
+The limits apply per service process (per gunicorn worker under serve.py).
+Background jobs and the documents of an accepted batch queue without the depth
+and wait limits, bounded only by their own deadline.
+
+Configuration:
+- OCR_ADMISSION_CONCURRENCY: extractions running at once (default 2, 0
+  disables admission control)
+- OCR_ADMISSION_QUEUE_DEPTH: extractions waiting for a slot (default 16)
+- OCR_ADMISSION_MAX_WAIT_SECONDS: longest wait a request is queued for (default 20)
+- OCR_ADMISSION_INITIAL_RATE: megapixels per second per slot assumed before
+  the first extraction finishes (default 1.0)
+"""
+
+import io
+import os
+import math
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+OCR_ADMISSION_CONCURRENCY = int(os.environ.get('OCR_ADMISSION_CONCURRENCY', 2))
+OCR_ADMISSION_QUEUE_DEPTH = int(os.environ.get('OCR_ADMISSION_QUEUE_DEPTH', 16))
+OCR_ADMISSION_MAX_WAIT_SECONDS = float(os.environ.get('OCR_ADMISSION_MAX_WAIT_SECONDS', 20))
+OCR_ADMISSION_INITIAL_RATE = float(os.environ.get('OCR_ADMISSION_INITIAL_RATE', 1.0))
+
+# Weight of the newest measurement in the drain rate average
+RATE_SMOOTHING = 0.2
+# Extractions shorter than this (errors, empty pages) say nothing about the rate
+MIN_RATE_SAMPLE_SECONDS = 0.5
+# Cost of a document whose size cannot be read, and the least any document costs
+FALLBACK_COST = 5.0
+MIN_COST = 0.1
+MAX_RETRY_AFTER_SECONDS = 300
+WAIT_SAMPLES = 500
+
+
+class AdmissionRejected(Exception):
+    """The extraction was turned away; the client should retry after ``retry_after`` seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Server busy ({reason}), retry in {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def document_cost(file_bytes: bytes, filename: str = '') -> float:
+    """
+    Estimated OCR cost of a document in megapixels.
+
+    Images cost their pixel count (read from the header only); PDFs the pixel
+    count of every page at its render resolution, so a ten-page scan costs ten
+    pages.
+    """
+    try:
+        if file_bytes[:5] == b'%PDF-' or filename.lower().endswith('.pdf'):
+            from pdf_pages import page_pixels
+            pixels = sum(page_pixels(file_bytes))
+        else:
+            with Image.open(io.BytesIO(file_bytes)) as image:
+                pixels = image.width * image.height * getattr(image, 'n_frames', 1)
+    except Exception as e:
+        logger.debug(f"Could not size {filename or 'document'}: {e}")
+        return FALLBACK_COST
+    return max(pixels / 1e6, MIN_COST)
+
+
+class _Ticket:
+    def __init__(self, cost: float):
+        self.cost = cost
+        self.arrived = time.monotonic()
+        self.started: Optional[float] = None
+
+
+class AdmissionController:
+    """Bounded concurrency with a bounded, cost-aware FIFO queue in front of it."""
+
+    def __init__(self, concurrency: int = OCR_ADMISSION_CONCURRENCY,
+                 queue_depth: int = OCR_ADMISSION_QUEUE_DEPTH,
+                 max_wait: float = OCR_ADMISSION_MAX_WAIT_SECONDS,
+                 initial_rate: float = OCR_ADMISSION_INITIAL_RATE):
+        self.concurrency = concurrency
+        self.queue_depth = queue_depth
+        self.max_wait = max_wait
+        # Megapixels per second one slot gets through
+        self.rate = initial_rate
+        self._running = set()
+        self._waiting = deque()
+        self._condition = threading.Condition()
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._counts = {'admitted': 0, 'completed': 0, 'rejected': 0, 'timed_out': 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.concurrency > 0
+
+    def _backlog_seconds(self, now: float) -> float:
+        """Seconds until the running and queued work is done at the current drain rate."""
+        remaining = sum(ticket.cost for ticket in self._waiting)
+        for ticket in self._running:
+            remaining += max(ticket.cost - (now - ticket.started) * self.rate, 0.0)
+        return remaining / (self.rate * self.concurrency)
+
+    def _retry_after(self, now: float) -> int:
+        return min(max(math.ceil(self._backlog_seconds(now)), 1), MAX_RETRY_AFTER_SECONDS)
+
+    def _can_start(self, ticket: Optional[_Ticket] = None) -> bool:
+        if len(self._running) >= self.concurrency:
+            return False
+        return not self._waiting or self._waiting[0] is ticket
+
+    def _reject_reason(self, timeout: Optional[float], now: float) -> Optional[str]:
+        """Why a new request would be turned away now (None when it may queue)."""
+        if len(self._waiting) >= self.queue_depth:
+            return 'queue full'
+        if self._backlog_seconds(now) > min(self.max_wait, timeout if timeout is not None else self.max_wait):
+            return 'estimated wait too long'
+        return None
+
+    def check(self, timeout: Optional[float] = None) -> None:
+        """Raise AdmissionRejected if a request arriving now would be turned away."""
+        if not self.enabled:
+            return
+        with self._condition:
+            now = time.monotonic()
+            if self._can_start():
+                return
+            reason = self._reject_reason(timeout, now)
+            if reason is not None:
+                self._counts['rejected'] += 1
+                raise AdmissionRejected(reason, self._retry_after(now))
+
+    @contextmanager
+    def admit(self, cost: float, timeout: Optional[float] = None, bounded: bool = True) -> Iterator[float]:
+        """
+        Hold an extraction slot for the duration of the block.
+
+        Args:
+            cost: Estimated cost in megapixels (see document_cost)
+            timeout: Longest the caller can wait, e.g. its deadline's remaining time
+            bounded: Apply the queue depth and wait limits (False for background
+                jobs, which wait for a slot as long as ``timeout`` allows)
+
+        Yields:
+            Seconds the request waited for its slot
+
+        Raises:
+            AdmissionRejected: Turned away up front or when the wait ran out
+        """
+        if not self.enabled:
+            yield 0.0
+            return
+        ticket = self._acquire(cost, timeout, bounded)
+        try:
+            yield ticket.started - ticket.arrived
+        finally:
+            self._release(ticket)
+
+    def _acquire(self, cost: float, timeout: Optional[float], bounded: bool) -> _Ticket:
+        ticket = _Ticket(max(cost, MIN_COST))
+        with self._condition:
+            if not self._can_start():
+                if bounded:
+                    reason = self._reject_reason(timeout, ticket.arrived)
+                    if reason is not None:
+                        self._counts['rejected'] += 1
+                        raise AdmissionRejected(reason, self._retry_after(ticket.arrived))
+                    timeout = min(self.max_wait, timeout) if timeout is not None else self.max_wait
+                expires = ticket.arrived + timeout if timeout is not None else None
+                self._waiting.append(ticket)
+                while not self._can_start(ticket):
+                    remaining = expires - time.monotonic() if expires is not None else None
+                    if remaining is not None and remaining <= 0:
+                        self._waiting.remove(ticket)
+                        self._counts['timed_out'] += 1
+                        # The next in line may be able to start now
+                        self._condition.notify_all()
+                        raise AdmissionRejected('wait timed out', self._retry_after(time.monotonic()))
+                    self._condition.wait(remaining)
+                self._waiting.popleft()
+            ticket.started = time.monotonic()
+            self._running.add(ticket)
+            self._counts['admitted'] += 1
+            self._waits.append(ticket.started - ticket.arrived)
+        return ticket
+
+    def _release(self, ticket: _Ticket) -> None:
+        seconds = time.monotonic() - ticket.started
+        with self._condition:
+            self._running.discard(ticket)
+            self._counts['completed'] += 1
+            if seconds >= MIN_RATE_SAMPLE_SECONDS:
+                self.rate += RATE_SMOOTHING * (ticket.cost / seconds - self.rate)
+            self._condition.notify_all()
+
+    def stats(self) -> Dict:
+        """Queue depth, drain rate, wait times and counters."""
+        with self._condition:
+            now = time.monotonic()
+            waits = sorted(self._waits)
+            stats = dict(self._counts)
+            stats.update({
+                'concurrency': self.concurrency,
+                'running': len(self._running),
+                'queued': len(self._waiting),
+                'queue_depth': self.queue_depth,
+                'max_wait_seconds': self.max_wait,
+                'drain_rate_mpx_per_second': round(self.rate * max(self.concurrency, 1), 3),
+                'backlog_seconds': round(self._backlog_seconds(now), 3) if self.enabled else 0.0,
+                'oldest_wait_seconds': round(now - self._waiting[0].arrived, 3) if self._waiting else 0.0,
+                'wait_seconds': {
+                    'mean': round(sum(waits) / len(waits), 3) if waits else None,
+                    'p95': round(waits[int(0.95 * (len(waits) - 1))], 3) if waits else None,
+                    'max': round(waits[-1], 3) if waits else None,
+                },
+            })
+            return stats
+
+
+_admission = None
+_admission_lock = threading.Lock()
+
+
+def get_admission() -> AdmissionController:
+    """Return the process-wide admission controller."""
+    global _admission
+    if _admission is None:
+        with _admission_lock:
+            if _admission is None:
+                _admission = AdmissionController()
+    return _admission
@@ -0,0 +1,143 @@
+"""
+Batch extraction of enrollment packets.
+
+Registrars upload a birth certificate, Form 137 and Form 138 together, and at
+the start of term whole class lists. A batch is a set of uploaded files and/or
+zip archives. Archive members are read from the in-memory archive one at a
+time when their turn comes; nothing is extracted to disk.
+
+Documents run concurrently over a thread pool, each one fanning its OCR out
+over the shared process pool as usual. They are started largest first so a
+big multi-page scan does not start last and leave the batch waiting on one
+straggler.
+
+Configuration:
+- OCR_EXTRACT_BATCH_WORKERS: documents processed at once (defaults to the OCR
+  pool worker count, at most 4)
+- OCR_EXTRACT_BATCH_MAX_FILES: documents accepted per batch (default 100)
+- OCR_EXTRACT_BATCH_MAX_FILE_MB: larger documents and archive members are
+  rejected (default 25)
+"""
+
+import io
+import os
+import time
+import zipfile
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ocr_pool import OCR_POOL_WORKERS
+from deadline import Deadline, deadline_expired
+
+logger = logging.getLogger(__name__)
+
+OCR_EXTRACT_BATCH_WORKERS = int(os.environ.get('OCR_EXTRACT_BATCH_WORKERS', min(max(OCR_POOL_WORKERS, 1), 4)))
+OCR_EXTRACT_BATCH_MAX_FILES = int(os.environ.get('OCR_EXTRACT_BATCH_MAX_FILES', 100))
+OCR_EXTRACT_BATCH_MAX_FILE_MB = float(os.environ.get('OCR_EXTRACT_BATCH_MAX_FILE_MB', 25))
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.png', '.jpg', '.jpeg', '.bmp', '.tiff')
+
+# Handler for one document: (bytes, lowercased filename) -> (payload, HTTP status, cache hit)
+DocumentHandler = Callable[[bytes, str], Tuple[Dict, int, bool]]
+
+
+class BatchItem:
+    """One document of a batch whose bytes are read only when it is processed."""
+
+    def __init__(self, name: str, size: int, read: Callable[[], bytes]):
+        self.name = name
+        self.size = size
+        self.read = read
+
+
+class BatchError(ValueError):
+    """The batch cannot be accepted (too many documents, unreadable archive)."""
+
+
+def _max_file_bytes() -> int:
+    return int(OCR_EXTRACT_BATCH_MAX_FILE_MB * 1024 * 1024)
+
+
+def collect_items(uploads: List[Tuple[str, bytes]]) -> Tuple[List[BatchItem], List[Dict]]:
+    """
+    Turn uploaded files into batch items, expanding zip archives.
+
+    Args:
+        uploads: (filename, bytes) of every uploaded file
+
+    Returns:
+        Tuple of (items to process, results for entries that were rejected)
+
+    Raises:
+        BatchError: The batch is over OCR_EXTRACT_BATCH_MAX_FILES documents or an
+            archive cannot be read
+    """
+    items, rejected = [], []
+
+    def add(name: str, size: int, read: Callable[[], bytes]) -> None:
+        if not name.lower().endswith(SUPPORTED_EXTENSIONS):
+            rejected.append({'filename': name, 'status': 400, 'error': 'Unsupported file type'})
+        elif size > _max_file_bytes():
+            rejected.append({'filename': name, 'status': 413, 'error': 'File too large'})
+        else:
+            items.append(BatchItem(name, size, read))
+
+    for filename, data in uploads:
+        if filename.lower().endswith('.zip'):
+            try:
+                archive = zipfile.ZipFile(io.BytesIO(data))
+            except zipfile.BadZipFile as e:
+                raise BatchError(f"{filename}: {e}")
+            for member in archive.infolist():
+                # Skip folders and the resource forks macOS adds to archives
+                if member.is_dir() or member.filename.startswith('__MACOSX/'):
+                    continue
+                add(member.filename, member.file_size,
+                    lambda archive=archive, member=member: archive.read(member))
+        else:
+            add(filename, len(data), lambda data=data: data)
+
+    if len(items) > OCR_EXTRACT_BATCH_MAX_FILES:
+        raise BatchError(f"At most {OCR_EXTRACT_BATCH_MAX_FILES} documents per batch, got {len(items)}")
+    return items, rejected
+
+
+def run_batch(items: List[BatchItem], handler: DocumentHandler, deadline: Optional[Deadline] = None,
+              workers: int = OCR_EXTRACT_BATCH_WORKERS) -> List[Dict]:
+    """
+    Extract every item, largest first, over a pool of worker threads.
+
+    Args:
+        items: Documents of the batch
+        handler: Extracts one document
+        deadline: Optional budget for the whole batch; documents not started
+            before it expires are reported as skipped
+        workers: Documents processed at once
+
+    Returns:
+        One result per item, in the order of ``items``, with the filename, HTTP
+        status, payload and timing of the document
+    """
+    def process(item: BatchItem) -> Dict:
+        if deadline_expired(deadline):
+            return {'filename': item.name, 'status': 503, 'error': 'Batch deadline reached before this document'}
+        started = time.monotonic()
+        try:
+            payload, status, cached = handler(item.read(), item.name.lower())
+            result = {'filename': item.name, 'status': status, 'result': payload, 'cache': 'HIT' if cached else 'MISS'}
+        except Exception as e:
+            logger.exception(f"Batch document {item.name} failed")
+            result = {'filename': item.name, 'status': 500, 'error': str(e)}
+        result['seconds'] = round(time.monotonic() - started, 3)
+        result['bytes'] = item.size
+        return result
+
+    order = sorted(range(len(items)), key=lambda index: -items[index].size)
+    results: List[Optional[Dict]] = [None] * len(items)
+    with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix='ocr-batch') as executor:
+        # Submitted largest first; the pool starts them in that order
+        futures = {index: executor.submit(process, items[index]) for index in order}
+        for index, future in futures.items():
+            results[index] = future.result()
+    return results
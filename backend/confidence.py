@@ -0,0 +1,39 @@
+"""
+Blending Tesseract's word confidences into the candidate scores.
+
+The candidate scorers judge plain strings with keyword, name, date and noise
+heuristics. Tesseract also reports a confidence for every word it reads; the
+length-weighted mean of those is a direct measure of how cleanly a candidate was
+recognized. The blended score adds OCR_CONFIDENCE_WEIGHT points for every point
+of mean confidence above OCR_CONFIDENCE_BASELINE and subtracts them below it, so
+a cleanly read candidate reaches the good-enough score sooner and garbage from a
+bad threshold variant sinks even when it happens to contain a keyword.
+
+Configuration:
+- OCR_USE_CONFIDENCE: request word confidences and blend them in (default 1)
+- OCR_CONFIDENCE_WEIGHT: score points per confidence point (default 1.0)
+- OCR_CONFIDENCE_BASELINE: mean confidence that neither adds nor subtracts (default 70)
+"""
+
+import os
+from typing import Optional
+
+OCR_USE_CONFIDENCE = os.environ.get('OCR_USE_CONFIDENCE', '1').lower() not in ('0', 'false', 'no')
+OCR_CONFIDENCE_WEIGHT = float(os.environ.get('OCR_CONFIDENCE_WEIGHT', 1.0))
+OCR_CONFIDENCE_BASELINE = float(os.environ.get('OCR_CONFIDENCE_BASELINE', 70))
+
+
+def blend_score(score: float, confidence: Optional[float]) -> float:
+    """
+    Combine a heuristic text score with a candidate's mean word confidence.
+
+    Args:
+        score: Heuristic score of the text
+        confidence: Mean word confidence (0-100), None when unknown
+
+    Returns:
+        The blended score; the heuristic score alone when the confidence is unknown
+    """
+    if confidence is None or not OCR_USE_CONFIDENCE:
+        return score
+    return score + OCR_CONFIDENCE_WEIGHT * (confidence - OCR_CONFIDENCE_BASELINE)
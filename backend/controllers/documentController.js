@@ -19,7 +19,9 @@ const extractDocumentData = async (file) => {
     
     const response = await axios.post('http://localhost:5001/api/extract-pdf', formData, {
       headers: {
-        ...formData.getHeaders()
+        ...formData.getHeaders(),
+        // Let the OCR service return its best partial result before we give up
+        'X-OCR-Deadline': '27'
       },
       timeout: 30000
     });
@@ -0,0 +1,127 @@
+"""
+Per-request time budget for the OCR pipeline.
+
+The Node backend gives up on an extraction after 30 seconds. A Deadline is
+created for every request and handed down the pipeline; once it runs out (or
+the client disconnects) no new Tesseract work is started, queued pool jobs are
+cancelled, running Tesseract calls are bounded by the remaining time, and the
+best result found so far is returned with ``partial: true``.
+
+The budget comes from the ``X-OCR-Deadline`` header or the ``deadline`` form
+field (seconds), falling back to the server default.
+
+Configuration:
+- OCR_DEADLINE_SECONDS: default budget per request (default 25, 0 disables it)
+- OCR_DEADLINE_MAX_SECONDS: upper bound for client-supplied budgets (default 120)
+"""
+
+import os
+import time
+import socket
+import select
+import logging
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+OCR_DEADLINE_SECONDS = float(os.environ.get('OCR_DEADLINE_SECONDS', 25))
+OCR_DEADLINE_MAX_SECONDS = float(os.environ.get('OCR_DEADLINE_MAX_SECONDS', 120))
+
+# Don't probe the client socket more often than this
+_DISCONNECT_CHECK_INTERVAL = 0.25
+
+
+class Deadline:
+    """
+    Time budget for one request, optionally cancelled by a client disconnect.
+
+    Once expired() returns True it keeps returning True, and ``tripped`` records
+    that work was actually cut short.
+    """
+
+    def __init__(self, seconds: Optional[float] = None, cancelled: Optional[Callable[[], bool]] = None):
+        self.seconds = seconds if seconds and seconds > 0 else None
+        self.expires_at = time.monotonic() + self.seconds if self.seconds else None
+        self._cancelled = cancelled
+        self._last_probe = 0.0
+        self.tripped = False
+        self.reason: Optional[str] = None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None for an unlimited budget."""
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self) -> bool:
+        """True once the budget is used up or the client has gone away."""
+        if self.tripped:
+            return True
+        if self.expires_at is not None and time.monotonic() >= self.expires_at:
+            self._trip('deadline')
+        elif self._cancelled is not None:
+            now = time.monotonic()
+            if now - self._last_probe >= _DISCONNECT_CHECK_INTERVAL:
+                self._last_probe = now
+                if self._cancelled():
+                    self._trip('disconnected')
+        return self.tripped
+
+    def tesseract_timeout(self) -> float:
+        """Timeout for a single Tesseract call (0 means none, as in pytesseract)."""
+        remaining = self.remaining()
+        if remaining is None:
+            return 0
+        # pytesseract treats 0 as "no timeout", so never hand it a zero
+        return max(remaining, 0.1)
+
+    def _trip(self, reason: str) -> None:
+        self.tripped = True
+        self.reason = reason
+        logger.warning(f"OCR work cut short: {reason}")
+
+
+def tesseract_timeout(deadline: Optional[Deadline]) -> float:
+    """Tesseract timeout for an optional deadline."""
+    return deadline.tesseract_timeout() if deadline is not None else 0
+
+
+def deadline_expired(deadline: Optional[Deadline]) -> bool:
+    """True when an optional deadline has run out."""
+    return deadline is not None and deadline.expired()
+
+
+def client_disconnected(environ) -> bool:
+    """
+    Check whether the client behind a WSGI request has closed its connection.
+
+    Works with the Werkzeug development server and gunicorn sync workers, which
+    expose the client socket in the environ. Must only be used after the request
+    body has been read: a readable socket that yields no data means EOF.
+    """
+    sock = environ.get('werkzeug.socket') or environ.get('gunicorn.socket')
+    if sock is None:
+        return False
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        if not readable:
+            return False
+        return sock.recv(1, socket.MSG_PEEK) == b''
+    except (OSError, ValueError):
+        return True
+
+
+def from_request(req) -> Deadline:
+    """Build the deadline for a Flask request (header, then form field, then default)."""
+    value = req.headers.get('X-OCR-Deadline') or req.form.get('deadline')
+    seconds = OCR_DEADLINE_SECONDS
+    if value:
+        try:
+            seconds = float(value)
+            # Client budgets are capped at OCR_DEADLINE_MAX_SECONDS
+            if seconds <= 0 or seconds > OCR_DEADLINE_MAX_SECONDS:
+                seconds = OCR_DEADLINE_MAX_SECONDS
+        except ValueError:
+            logger.warning(f"Ignoring invalid OCR deadline: {value!r}")
+    environ = req.environ
+    return Deadline(seconds, cancelled=lambda: client_disconnected(environ))
@@ -0,0 +1,196 @@
+"""
+Page orientation and skew correction.
+
+Replaces the brute-force approach of OCR'ing the page at a dozen candidate
+angles. The page is straightened with exactly one rotation before any OCR:
+
+- orientation (0/90/180/270) comes from a single Tesseract OSD call, falling
+  back to a layout cue when OSD is unavailable or unsure: the blank gaps
+  between text lines leave many empty rows in the ink profile but hardly any
+  empty columns, whatever the page size
+- skew comes from the horizontal projection profile of a downscaled,
+  binarized copy of the page: at the right angle the text lines fall into few
+  rows, which maximizes the variance of the row ink counts. All candidate
+  angles are scored at once with NumPy.
+
+Configuration:
+- OCR_DESKEW_MAX_ANGLE: largest skew searched, in degrees (default 10)
+- OCR_OSD_MIN_CONFIDENCE: OSD confidence needed to trust its orientation (default 1.5)
+"""
+
+import os
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+import ocr_backend
+from deadline import Deadline, deadline_expired, tesseract_timeout
+
+logger = logging.getLogger(__name__)
+
+OCR_DESKEW_MAX_ANGLE = float(os.environ.get('OCR_DESKEW_MAX_ANGLE', 10))
+OCR_OSD_MIN_CONFIDENCE = float(os.environ.get('OCR_OSD_MIN_CONFIDENCE', 1.5))
+
+# Working sizes: skew is measured on a small copy, OSD needs readable glyphs
+SKEW_MAX_DIMENSION = 1200
+OSD_MAX_DIMENSION = 2000
+# Ink pixels used for the projection profiles (evenly subsampled above this)
+MAX_INK_POINTS = 60000
+# Rotations smaller than this are not worth resampling the page for
+MIN_SKEW_ANGLE = 0.1
+# A profile bin with less ink than this share of the mean counts as blank
+BLANK_BIN_LEVEL = 0.1
+# How many times more blank columns than blank rows mark a sideways page
+ORIENTATION_GAP_RATIO = 2.0
+
+
+def _downscale(image: Image.Image, max_dimension: int) -> Image.Image:
+    scale = max_dimension / max(image.size)
+    if scale >= 1:
+        return image
+    return image.resize((max(1, int(image.width * scale)), max(1, int(image.height * scale))), Image.BILINEAR)
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    """Otsu's threshold of an 8-bit grayscale array."""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    levels = np.arange(256)
+    weight_dark = np.cumsum(hist)
+    weight_light = weight_dark[-1] - weight_dark
+    sum_dark = np.cumsum(hist * levels)
+    mean_dark = sum_dark / np.maximum(weight_dark, 1)
+    mean_light = (sum_dark[-1] - sum_dark) / np.maximum(weight_light, 1)
+    between = weight_dark * weight_light * (mean_dark - mean_light) ** 2
+    return int(np.argmax(between))
+
+
+def _ink_points(gray: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Centered (x, y) coordinates of the dark pixels of a grayscale page."""
+    ys, xs = np.nonzero(gray <= otsu_threshold(gray))
+    if len(xs) > MAX_INK_POINTS:
+        keep = np.linspace(0, len(xs) - 1, MAX_INK_POINTS).astype(np.int64)
+        xs, ys = xs[keep], ys[keep]
+    xs = xs - xs.mean() if len(xs) else xs
+    ys = ys - ys.mean() if len(ys) else ys
+    return xs, ys
+
+
+def _profile_variance(xs: np.ndarray, ys: np.ndarray, angles: np.ndarray) -> np.ndarray:
+    """Variance of the row ink counts after rotating the ink by each angle (degrees)."""
+    theta = np.deg2rad(angles)
+    rows = np.rint(np.outer(np.cos(theta), ys) - np.outer(np.sin(theta), xs)).astype(np.int64)
+    rows -= rows.min()
+    height = int(rows.max()) + 1
+    # One bincount for all angles: shift each angle's rows into its own block
+    rows += (np.arange(len(angles)) * height)[:, None]
+    counts = np.bincount(rows.ravel(), minlength=len(angles) * height).reshape(len(angles), height)
+    return counts.var(axis=1)
+
+
+def estimate_skew(gray: np.ndarray, max_angle: float = OCR_DESKEW_MAX_ANGLE) -> float:
+    """
+    Estimate the skew of a grayscale page from its horizontal projection profile.
+
+    Args:
+        gray: 8-bit grayscale page (ideally already downscaled)
+        max_angle: Largest skew searched, in degrees
+
+    Returns:
+        Angle in degrees to rotate the page counter-clockwise (PIL convention)
+        so its text lines are horizontal; 0.0 when the page has too little ink
+    """
+    xs, ys = _ink_points(gray)
+    if len(xs) < 100:
+        return 0.0
+
+    # Coarse search over the whole range, then refine around the best angle
+    coarse = np.arange(-max_angle, max_angle + 0.25, 0.5)
+    best = coarse[np.argmax(_profile_variance(xs, ys, coarse))]
+    fine = np.arange(best - 0.5, best + 0.55, 0.05)
+    return float(round(fine[np.argmax(_profile_variance(xs, ys, fine))], 2))
+
+
+def _blank_fraction(coordinates: np.ndarray) -> float:
+    """Share of the bins between the first and last inked one that are (nearly) blank."""
+    bins = np.rint(coordinates).astype(np.int64)
+    counts = np.bincount(bins - bins.min())
+    return float(np.mean(counts < BLANK_BIN_LEVEL * counts.mean()))
+
+
+def _layout_orientation(gray: np.ndarray) -> int:
+    """
+    Orientation from the layout alone: 90 when text lines run vertically, else 0.
+
+    Horizontal text lines leave blank rows between them while their words
+    cover almost every column, so a sideways page has far more blank columns
+    than blank rows. Pages where the cue is unclear are left as they are. The
+    layout cannot tell 90 from 270 (or 0 from 180); OSD is needed for that.
+    """
+    xs, ys = _ink_points(gray)
+    if len(xs) < 100:
+        return 0
+    blank_rows, blank_columns = _blank_fraction(ys), _blank_fraction(xs)
+    return 90 if blank_columns > ORIENTATION_GAP_RATIO * max(blank_rows, 0.05) else 0
+
+
+def detect_orientation(image: Image.Image, deadline: Optional[Deadline] = None, tally=None) -> int:
+    """
+    Clockwise rotation (0, 90, 180 or 270) that makes the page upright.
+
+    Args:
+        image: Grayscale page
+        deadline: Optional request deadline; OSD is skipped once it has run out
+        tally: Optional object with an ``ocr_calls`` counter for the OSD call
+    """
+    if not deadline_expired(deadline):
+        try:
+            if tally is not None:
+                tally.ocr_calls += 1
+            rotate, confidence = ocr_backend.detect_orientation(_downscale(image, OSD_MAX_DIMENSION),
+                                                                timeout=tesseract_timeout(deadline))
+            if confidence >= OCR_OSD_MIN_CONFIDENCE:
+                return rotate
+            logger.info(f"Ignoring low-confidence OSD orientation {rotate} ({confidence:.2f})")
+        except Exception as e:
+            logger.info(f"OSD unavailable, using the layout orientation cue: {e}")
+
+    return _layout_orientation(np.asarray(_downscale(image, SKEW_MAX_DIMENSION)))
+
+
+def deskew_image(image: Image.Image, deadline: Optional[Deadline] = None, tally=None,
+                 detect_rotation: bool = True) -> Image.Image:
+    """
+    Straighten a grayscale page with a single rotation.
+
+    Args:
+        image: Grayscale ('L') page
+        deadline: Optional request deadline bounding the OSD call
+        tally: Optional object with an ``ocr_calls`` counter for the OSD call
+        detect_rotation: Also correct 90/180/270 degree orientation
+
+    Returns:
+        The rotated page, or the input image when it is already straight
+    """
+    if image.mode != 'L':
+        image = image.convert('L')
+
+    orientation = detect_orientation(image, deadline, tally) if detect_rotation else 0
+
+    # Measure the skew on a small upright copy
+    small = _downscale(image, SKEW_MAX_DIMENSION)
+    if orientation:
+        small = small.rotate(-orientation, expand=True)
+    skew = estimate_skew(np.asarray(small))
+    if abs(skew) < MIN_SKEW_ANGLE:
+        skew = 0.0
+
+    if not orientation and not skew:
+        return image
+
+    logger.info(f"Deskewing page: orientation {orientation}, skew {skew:.2f} degrees")
+    if not skew:
+        # Exact quarter turns need no resampling
+        return image.rotate(-orientation, expand=True)
+    return image.rotate(skew - orientation, resample=Image.BICUBIC, expand=True, fillcolor=255)
@@ -10,6 +10,13 @@ import logging
 import traceback
 import os
 
+from result_cache import get_cache
+from strategy_stats import get_stats
+from deadline import from_request as deadline_from_request
+from admission import AdmissionRejected, document_cost, get_admission
+import lazy_imports
+import warmup
+
 # Import the enhanced OCR processor
 try:
     from ocr_processor import DocumentOCRProcessor, extract_birth_certificate_data, apply_ocr_corrections
@@ -25,6 +32,13 @@ CORS(app)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Overloaded: tell the client when the admission queue should have drained
+@app.errorhandler(AdmissionRejected)
+def handle_admission_rejected(e):
+    response = jsonify({'success': False, 'error': str(e), 'retry_after': e.retry_after})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 429
+
 # Initialize the enhanced OCR processor
 if OCR_PROCESSOR_AVAILABLE:
     try:
@@ -74,18 +88,33 @@ def extract_text_from_image_bytes():
         
         # Get document type from request (defaults to auto-detection)
         document_type = request.form.get('document_type', 'auto')
+        deadline = deadline_from_request(request)
+        
+        # Repeat uploads of the same image are served from the result cache
+        cache = get_cache()
+        cache_key = cache.make_key(image_bytes, document_type)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            logger.info("Serving cached OCR result")
+            response = jsonify(cached)
+            response.headers['X-Cache'] = 'HIT'
+            return response
         
         logger.info(f"Processing image with document type: {document_type}")
         
         # Extract text using enhanced OCR processor
-        extracted_text = ocr_processor.extract_text_from_image(image_bytes, document_type)
+        with get_admission().admit(document_cost(image_bytes), deadline.remaining()):
+            ocr_result = ocr_processor.extract_document(image_bytes, document_type, deadline=deadline)
+        extracted_text = ocr_result['text']
         
         if not extracted_text or len(extracted_text.strip()) < 10:
             return jsonify({
                 'success': False,
                 'error': 'Could not extract meaningful text from image',
                 'text': extracted_text,
-                'structured_data': {}
+                'structured_data': {},
+                'ocr_calls': ocr_result['ocr_calls'],
+                'partial': ocr_result['partial']
             }), 400
         
         logger.info(f"Successfully extracted {len(extracted_text)} characters of text")
@@ -112,18 +141,33 @@ def extract_text_from_image_bytes():
             except Exception as e:
                 logger.warning(f"Failed to extract structured birth certificate data: {e}")
         
+        # Fields read from the form's template boxes beat the regex guesses
+        structured_data.update(ocr_result.get('fields', {}))
+        
         # Apply final corrections
         corrected_text = apply_ocr_corrections(extracted_text, detected_type)
         
-        return jsonify({
+        result = {
             'success': True,
             'text': corrected_text,
             'raw_text': extracted_text,
             'structured_data': structured_data,
             'document_type': detected_type,
-            'confidence': 'high' if len([v for v in structured_data.values() if v]) > 3 else 'medium'
-        })
-        
+            'confidence': 'high' if len([v for v in structured_data.values() if v]) > 3 else 'medium',
+            'ocr_calls': ocr_result['ocr_calls'],
+            'early_exit': ocr_result['early_exit'],
+            'partial': ocr_result['partial']
+        }
+        # Results cut short by the deadline are not cached so a retry can do better
+        if not ocr_result['partial']:
+            cache.set(cache_key, result)
+        
+        response = jsonify(result)
+        response.headers['X-Cache'] = 'MISS'
+        return response
+        
+    except AdmissionRejected:
+        raise
     except Exception as e:
         logger.error(f"Enhanced OCR extraction failed: {e}")
         logger.error(traceback.format_exc())
@@ -166,18 +210,23 @@ def extract_birth_certificate():
         logger.info("Processing birth certificate with enhanced NSO preprocessing")
         
         # Force birth certificate processing
-        extracted_text = ocr_processor.extract_text_from_image(image_bytes, 'birth_certificate')
+        deadline = deadline_from_request(request)
+        with get_admission().admit(document_cost(image_bytes), deadline.remaining()):
+            ocr_result = ocr_processor.extract_document(image_bytes, 'birth_certificate', deadline=deadline)
+        extracted_text = ocr_result['text']
         
         if not extracted_text or len(extracted_text.strip()) < 10:
             return jsonify({
                 'success': False,
-                'error': 'Could not extract meaningful text from birth certificate image'
+                'error': 'Could not extract meaningful text from birth certificate image',
+                'partial': ocr_result['partial']
             }), 400
         
         logger.info(f"Successfully extracted {len(extracted_text)} characters from birth certificate")
         
-        # Extract structured birth certificate data
+        # Extract structured birth certificate data; template fields beat the regex guesses
         birth_data = extract_birth_certificate_data(extracted_text)
+        birth_data.update(ocr_result.get('fields', {}))
         
         # Apply NSO-specific corrections
         corrected_text = apply_ocr_corrections(extracted_text, 'birth_certificate')
@@ -199,9 +248,14 @@ def extract_birth_certificate():
             'confidence': confidence_level,
             'confidence_score': confidence_score,
             'extracted_fields': filled_fields,
-            'total_fields': total_fields
+            'total_fields': total_fields,
+            'ocr_calls': ocr_result['ocr_calls'],
+            'early_exit': ocr_result['early_exit'],
+            'partial': ocr_result['partial']
         })
         
+    except AdmissionRejected:
+        raise
     except Exception as e:
         logger.error(f"Birth certificate extraction failed: {e}")
         logger.error(traceback.format_exc())
@@ -213,11 +267,27 @@ def extract_birth_certificate():
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint."""
+    # Not ready (503) while the worker warms up or after its warm-up failed
+    ready = warmup.ready()
     return jsonify({
-        'status': 'healthy',
+        'status': 'healthy' if ready else 'starting',
         'processor_available': OCR_PROCESSOR_AVAILABLE and ocr_processor is not None,
         'enhanced_features': OCR_PROCESSOR_AVAILABLE,
-        'version': '2.0.0-enhanced'
+        'version': '2.0.0-enhanced',
+        'warmup': warmup.status(),
+        'startup': lazy_imports.startup_report(),
+        'cache': get_cache().stats(),
+        'admission': get_admission().stats()
+    }), 200 if ready else 503
+
+@app.route('/api/ocr-stats', methods=['GET'])
+def ocr_stats():
+    """Win rates of the OCR candidate combinations per document type."""
+    stats = get_stats()
+    return jsonify({
+        'min_samples': stats.min_samples,
+        'prune_below': stats.prune_below,
+        'document_types': stats.table()
     })
 
 @app.route('/test-nso', methods=['GET'])
@@ -309,5 +379,7 @@ def test_patterns():
             'error': str(e)
         }), 500
 
+lazy_imports.record_startup('enhanced_extractor')
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5002, debug=True)
@@ -2,9 +2,11 @@
 import io
 import re
 import os
-import pdfplumber
-import pytesseract
-from flask import Flask, request, jsonify
+import json
+import time
+import queue
+import threading
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 from werkzeug.exceptions import HTTPException
 from PIL import Image, ImageFilter, ImageOps, ImageEnhance
@@ -12,15 +14,28 @@ import numpy as np
 import logging
 import traceback
 
-# Tesseract path
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+# Heavy dependencies (OpenCV, pdfplumber, pytesseract) are imported on first use
+import lazy_imports
 
-# Try to import OpenCV for advanced image processing
-try:
-    import cv2
-    CV2_AVAILABLE = True
-except ImportError:
-    CV2_AVAILABLE = False
+# Tesseract path
+lazy_imports.set_tesseract_cmd(r'C:\Program Files\Tesseract-OCR\tesseract.exe')
+
+# OCR engine (persistent tesserocr engine when available, pytesseract otherwise)
+import ocr_backend
+from result_cache import get_cache
+from strategy_stats import get_stats
+from confidence import OCR_USE_CONFIDENCE, blend_score
+from deadline import Deadline, deadline_expired, from_request as deadline_from_request, tesseract_timeout
+from job_queue import OCR_JOB_DEADLINE_SECONDS, get_queue
+from batch_extract import BatchError, collect_items, run_batch
+from admission import AdmissionRejected, document_cost, get_admission
+from deskew import deskew_image
+from pyramid import ResolutionPyramid
+from text_metrics import scale_for_ocr
+from pdf_pages import OCR_PDF_EARLY_STOP, iter_pdf, ocr_pdf_pages, page_count, read_pdf
+import form_templates
+import layout_classifier
+import warmup
 
 # Try to import enhanced OCR processor
 try:
@@ -69,6 +84,13 @@ def handle_http_exception(e):
     response.headers['Access-Control-Allow-Methods'] = 'GET,POST,OPTIONS'
     return response
 
+# Overloaded: tell the client when the admission queue should have drained
+@app.errorhandler(AdmissionRejected)
+def handle_admission_rejected(e):
+    response = jsonify({'success': False, 'error': str(e), 'retry_after': e.retry_after})
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response, 429
+
 @app.route('/extract', methods=['POST'])
 def extract_text_from_image_bytes():
     """
@@ -106,43 +128,15 @@ def extract_text_from_image_bytes():
         
         # Get document type from request (defaults to auto-detection)
         document_type = request.form.get('document_type', 'auto')
+        deadline = deadline_from_request(request)
         
-        logger.info(f"Processing image with document type: {document_type}")
-        
-        # Extract text using enhanced OCR processor
-        extracted_text = ocr_processor.extract_text_from_image(image_bytes, document_type)
-        
-        if not extracted_text or len(extracted_text.strip()) < 10:
-            return jsonify({
-                'success': False,
-                'error': 'Could not extract meaningful text from image',
-                'text': extracted_text,
-                'structured_data': {}
-            }), 400
-        
-        logger.info(f"Successfully extracted {len(extracted_text)} characters of text")
-        
-        # Extract structured data based on document type
-        structured_data = {}
-        if document_type == 'birth_certificate' or 'birth' in extracted_text.lower():
-            try:
-                structured_data = extract_birth_certificate_data(extracted_text)
-                logger.info(f"Extracted birth certificate data: {list(structured_data.keys())}")
-            except Exception as e:
-                logger.warning(f"Failed to extract structured birth certificate data: {e}")
-        
-        # Apply final corrections
-        corrected_text = apply_ocr_corrections(extracted_text, document_type)
-        
-        return jsonify({
-            'success': True,
-            'text': corrected_text,
-            'raw_text': extracted_text,
-            'structured_data': structured_data,
-            'document_type': document_type,
-            'confidence': 'high' if len(structured_data) > 3 else 'medium'
-        })
+        result, status, cached = _extract_image_result(image_bytes, document_type, deadline)
+        response = jsonify(result)
+        response.headers['X-Cache'] = 'HIT' if cached else 'MISS'
+        return response, status
         
+    except AdmissionRejected:
+        raise
     except Exception as e:
         logger.error(f"OCR extraction failed: {e}")
         logger.error(traceback.format_exc())
@@ -153,13 +147,113 @@ def extract_text_from_image_bytes():
             'structured_data': {}
         }), 500
 
+def _admitted(file_bytes, filename='', deadline=None, bounded=True):
+    """
+    An admission-control slot for one extraction (see admission.py), waited for
+    at most until the deadline. Unbounded callers (jobs, batch documents) skip
+    the queue depth and wait limits.
+    """
+    timeout = deadline.remaining() if deadline is not None else None
+    return get_admission().admit(document_cost(file_bytes, filename), timeout, bounded=bounded)
+
+def _check_admission(cache_key, seconds=None):
+    """Turn a request away before streaming starts when it would be rejected (cached results never are)."""
+    if not get_cache().contains(cache_key):
+        get_admission().check(seconds)
+
+def _structured_data(text, document_type, fields=None):
+    """Structured fields of a processor text, with the template fields on top."""
+    structured_data = {}
+    if document_type == 'birth_certificate' or 'birth' in text.lower():
+        try:
+            structured_data = extract_birth_certificate_data(text)
+            logger.info(f"Extracted birth certificate data: {list(structured_data.keys())}")
+        except Exception as e:
+            logger.warning(f"Failed to extract structured birth certificate data: {e}")
+    
+    # Fields read from the form's template boxes beat the regex guesses
+    structured_data.update(fields or {})
+    return structured_data
+
+def _extract_image_result(image_bytes, document_type, deadline=None, progress=None):
+    """
+    The /extract pipeline behind the result cache.
+    progress is handed to DocumentOCRProcessor.extract_document for drafts.
+    Returns a (result, HTTP status, served from cache) tuple.
+    """
+    # Repeat uploads of the same image are served from the result cache
+    cache = get_cache()
+    cache_key = cache.make_key(image_bytes, document_type)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        logger.info("Serving cached OCR result")
+        return cached, 200, True
+    
+    logger.info(f"Processing image with document type: {document_type}")
+    
+    # Extract text using enhanced OCR processor
+    with _admitted(image_bytes, deadline=deadline):
+        ocr_result = ocr_processor.extract_document(image_bytes, document_type, deadline=deadline, progress=progress)
+    extracted_text = ocr_result['text']
+    
+    if not extracted_text or len(extracted_text.strip()) < 10:
+        return {
+            'success': False,
+            'error': 'Could not extract meaningful text from image',
+            'text': extracted_text,
+            'structured_data': {},
+            'ocr_calls': ocr_result['ocr_calls'],
+            'partial': ocr_result['partial']
+        }, 400, False
+    
+    logger.info(f"Successfully extracted {len(extracted_text)} characters of text")
+    
+    # Extract structured data based on document type
+    structured_data = _structured_data(extracted_text, document_type, ocr_result.get('fields'))
+    
+    # Apply final corrections
+    corrected_text = apply_ocr_corrections(extracted_text, document_type)
+    
+    result = {
+        'success': True,
+        'text': corrected_text,
+        'raw_text': extracted_text,
+        'structured_data': structured_data,
+        'document_type': document_type,
+        'confidence': 'high' if len(structured_data) > 3 else 'medium',
+        'ocr_calls': ocr_result['ocr_calls'],
+        'early_exit': ocr_result['early_exit'],
+        'partial': ocr_result['partial']
+    }
+    # Results cut short by the deadline are not cached so a retry can do better
+    if not ocr_result['partial']:
+        cache.set(cache_key, result)
+    return result, 200, False
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint."""
+    # Not ready (503) while the worker warms up or after its warm-up failed
+    ready = warmup.ready()
     return jsonify({
-        'status': 'healthy',
+        'status': 'healthy' if ready else 'starting',
         'processor_available': OCR_PROCESSOR_AVAILABLE and ocr_processor is not None,
-        'version': '2.0.0-enhanced'
+        'version': '2.0.0-enhanced',
+        'warmup': warmup.status(),
+        'startup': lazy_imports.startup_report(),
+        'cache': get_cache().stats(),
+        'admission': get_admission().stats(),
+        'jobs': get_queue().counts()
+    }), 200 if ready else 503
+
+@app.route('/api/ocr-stats', methods=['GET'])
+def ocr_stats():
+    """Win rates of the OCR candidate combinations per document type."""
+    stats = get_stats()
+    return jsonify({
+        'min_samples': stats.min_samples,
+        'prune_below': stats.prune_below,
+        'document_types': stats.table()
     })
 
 @app.route('/test', methods=['GET'])
@@ -197,16 +291,11 @@ def test_extraction():
             'error': str(e)
         }), 500
 
-# Helper function to extract text from PDF using pdfplumber
-def extract_text_from_pdf(pdf_bytes):
-    text = ""
-    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-        for page in pdf.pages:
-            text += page.extract_text() or ""
-    return text
-
-def evaluate_text_quality(text):
-    """Evaluate the quality of extracted text for birth certificates"""
+def evaluate_text_quality(text, confidence=None):
+    """
+    Evaluate the quality of extracted text for birth certificates.
+    Blends in Tesseract's mean word confidence when it is given.
+    """
     score = 0
     
     # Length score (reasonable length is good)
@@ -243,7 +332,7 @@ def evaluate_text_quality(text):
     if words > single_chars:
         score += 10
     
-    return max(score, 0)
+    return max(blend_score(score, confidence), 0)
 
 
 def preprocess_image_for_ocr(image_bytes, rotate=True, denoise=True, threshold=True):
@@ -261,7 +350,8 @@ def preprocess_image_for_ocr(image_bytes, rotate=True, denoise=True, threshold=T
     img_np = np.array(img)
     original_img = img_np.copy()
 
-    if CV2_AVAILABLE:
+    cv2 = lazy_imports.cv2()
+    if cv2 is not None:
         # Enhanced denoising for mobile photos
         if denoise:
             img_np = cv2.fastNlMeansDenoising(img_np, None, h=10, templateWindowSize=7, searchWindowSize=21)
@@ -270,27 +360,9 @@ def preprocess_image_for_ocr(image_bytes, rotate=True, denoise=True, threshold=T
         kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, 1))
         img_np = cv2.morphologyEx(img_np, cv2.MORPH_CLOSE, kernel)
         
-        # Enhanced rotation correction using Hough line detection
+        # Orientation and skew correction with a single rotation (see deskew.py)
         if rotate:
-            edges = cv2.Canny(img_np, 50, 150, apertureSize=3)
-            lines = cv2.HoughLines(edges, 1, np.pi/180, threshold=100)
-            
-            if lines is not None:
-                angles = []
-                for rho, theta in lines[:10]:  # Use first 10 lines
-                    angle = theta * 180 / np.pi
-                    if angle > 90:
-                        angle = angle - 180
-                    angles.append(angle)
-                
-                if angles:
-                    # Use median angle for robust rotation correction
-                    rotation_angle = np.median(angles)
-                    if abs(rotation_angle) > 0.5:  # Only rotate if significant skew
-                        (h, w) = img_np.shape
-                        center = (w // 2, h // 2)
-                        M = cv2.getRotationMatrix2D(center, rotation_angle, 1.0)
-                        img_np = cv2.warpAffine(img_np, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+            img_np = np.array(deskew_image(Image.fromarray(img_np)))
 
         # Enhanced adaptive thresholding for birth certificates
         if threshold:
@@ -332,12 +404,8 @@ def preprocess_image_for_ocr(image_bytes, rotate=True, denoise=True, threshold=T
     # Convert back to PIL Image
     img = Image.fromarray(img_np)
 
-    # Intelligent upscaling for mobile photos - increased for better OCR
-    min_width = 2500  # Even higher resolution for complex documents
-    if img.width < min_width:
-        scale = min_width / img.width
-        new_size = (int(img.width * scale), int(img.height * scale))
-        img = img.resize(new_size, Image.LANCZOS)
+    # Scale by the measured glyph size (shrinks pages with large text, enlarges small text)
+    img = scale_for_ocr(img)
 
     # Final enhancement specifically for text documents
     img = ImageOps.autocontrast(img, cutoff=0.5)
@@ -346,8 +414,13 @@ def preprocess_image_for_ocr(image_bytes, rotate=True, denoise=True, threshold=T
     
     return img
 
-def extract_text_from_image_bytes(image_bytes):
-    """Optimized OCR extraction for birth certificates and documents"""
+def extract_text_from_image_bytes(image_bytes, deadline=None, on_improvement=None):
+    """
+    Optimized OCR extraction for birth certificates and documents.
+    Stops trying further approaches once the optional request deadline runs out.
+    on_improvement, when given, is called with (text, score) every time an
+    approach beats the best text so far.
+    """
     
     # Try Google Cloud Vision OCR if credentials are set
     if os.environ.get('GOOGLE_APPLICATION_CREDENTIALS'):
@@ -373,71 +446,83 @@ def extract_text_from_image_bytes(image_bytes):
     
     print(f"DEBUG: Original image size: {img.size}")
     
+    # Straighten the page once (orientation + skew) before any OCR pass
+    try:
+        img = deskew_image(img, deadline=deadline)
+    except Exception as e:
+        print(f"DEBUG: Deskew failed: {e}")
+    
     # Store best result
     best_text = ""
     best_score = 0
     
-    # Approach 1: High-quality upscaling with optimized preprocessing
-    try:
-        print("DEBUG: Applying optimized preprocessing")
-        
-        # Aggressive upscaling for small text (birth certificates often have small text)
-        target_size = 3500
-        if img.width < target_size:
-            scale = target_size / img.width
-            new_size = (int(img.width * scale), int(img.height * scale))
-            enhanced_img = img.resize(new_size, Image.LANCZOS)
-            print(f"DEBUG: Upscaled to {new_size}")
-        else:
-            enhanced_img = img.copy()
-        
-        # Optimized preprocessing pipeline
-        enhanced_img = ImageOps.autocontrast(enhanced_img, cutoff=1)
-        enhanced_img = ImageEnhance.Contrast(enhanced_img).enhance(2.8)
-        enhanced_img = ImageEnhance.Brightness(enhanced_img).enhance(1.05)
-        
-        # Noise reduction
-        enhanced_img = enhanced_img.filter(ImageFilter.MedianFilter(size=3))
-        
-        # Sharpening
-        enhanced_img = enhanced_img.filter(ImageFilter.SHARPEN)
-        enhanced_img = enhanced_img.filter(ImageFilter.UnsharpMask(radius=1, percent=150, threshold=2))
-        
-        # Try OCR with most effective configuration first
-        text = pytesseract.image_to_string(enhanced_img, config='--psm 6 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789.,:/()- ')
-        
-        if text.strip() and len(text) > 100:
-            score = evaluate_text_quality(text)
-            if score > best_score:
-                best_text = text
-                best_score = score
-                print(f"DEBUG: Approach 1 scored {score:.2f}")
-                
-        # If first config didn't work well, try alternative
-        if best_score < 50:
-            text = pytesseract.image_to_string(enhanced_img, config='--psm 3')
+    # The page is scaled by its measured glyph size. In the pyramid scale mode OCR
+    # starts at the smallest legible scale and only grows while the result stays
+    # below the score that makes approach 2 unnecessary
+    page = ResolutionPyramid.for_mode(img)
+    
+    # Approach 1: Glyph-size scaling with optimized preprocessing
+    reached = page.scales[0]
+    for level, scale in enumerate(page.scales):
+        if level and (best_score >= 80 or deadline_expired(deadline)):
+            break
+        reached = scale
+        try:
+            print("DEBUG: Applying optimized preprocessing")
+            
+            enhanced_img = page.level(scale)
+            print(f"DEBUG: OCR at {enhanced_img.size}")
+            
+            # Optimized preprocessing pipeline
+            enhanced_img = ImageOps.autocontrast(enhanced_img, cutoff=1)
+            enhanced_img = ImageEnhance.Contrast(enhanced_img).enhance(2.8)
+            enhanced_img = ImageEnhance.Brightness(enhanced_img).enhance(1.05)
+            
+            # Noise reduction
+            enhanced_img = enhanced_img.filter(ImageFilter.MedianFilter(size=3))
+            
+            # Sharpening
+            enhanced_img = enhanced_img.filter(ImageFilter.SHARPEN)
+            enhanced_img = enhanced_img.filter(ImageFilter.UnsharpMask(radius=1, percent=150, threshold=2))
+            
+            # Try OCR with most effective configuration first
+            result = ocr_backend.recognize(enhanced_img, config='--psm 6 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789.,:/()- ',
+                                           timeout=tesseract_timeout(deadline), words=OCR_USE_CONFIDENCE)
+            text = result.text
+            
             if text.strip() and len(text) > 100:
-                score = evaluate_text_quality(text)
+                score = evaluate_text_quality(text, result.mean_confidence)
                 if score > best_score:
                     best_text = text
                     best_score = score
-                    print(f"DEBUG: Approach 1 alt scored {score:.2f}")
-                
-    except Exception as e:
-        print(f"DEBUG: Approach 1 failed: {e}")
+                    print(f"DEBUG: Approach 1 scored {score:.2f}")
+                    if on_improvement:
+                        on_improvement(best_text, best_score)
+                    
+            # If first config didn't work well, try alternative
+            if best_score < 50 and not deadline_expired(deadline):
+                result = ocr_backend.recognize(enhanced_img, config='--psm 3', timeout=tesseract_timeout(deadline),
+                                               words=OCR_USE_CONFIDENCE)
+                text = result.text
+                if text.strip() and len(text) > 100:
+                    score = evaluate_text_quality(text, result.mean_confidence)
+                    if score > best_score:
+                        best_text = text
+                        best_score = score
+                        print(f"DEBUG: Approach 1 alt scored {score:.2f}")
+                        if on_improvement:
+                            on_improvement(best_text, best_score)
+                    
+        except Exception as e:
+            print(f"DEBUG: Approach 1 failed: {e}")
     
     # Approach 2: Binary thresholding (only if approach 1 didn't produce good results)
-    if best_score < 80:
+    if best_score < 80 and not deadline_expired(deadline):
         try:
             print("DEBUG: Trying binary thresholding")
             
-            # Upscale
-            if img.width < 2800:
-                scale = 2800 / img.width
-                new_size = (int(img.width * scale), int(img.height * scale))
-                binary_img = img.resize(new_size, Image.LANCZOS)
-            else:
-                binary_img = img.copy()
+            # Largest scale reached by approach 1
+            binary_img = page.level(reached)
             
             # Apply optimal threshold
             binary_img = ImageOps.autocontrast(binary_img, cutoff=2)
@@ -445,38 +530,42 @@ def extract_text_from_image_bytes(image_bytes):
             binary_img = binary_img.convert('L')
             
             # Try OCR
-            text = pytesseract.image_to_string(binary_img, config='--psm 6')
+            result = ocr_backend.recognize(binary_img, config='--psm 6', timeout=tesseract_timeout(deadline),
+                                           words=OCR_USE_CONFIDENCE)
+            text = result.text
             if text.strip() and len(text) > 100:
-                score = evaluate_text_quality(text)
+                score = evaluate_text_quality(text, result.mean_confidence)
                 if score > best_score:
                     best_text = text
                     best_score = score
                     print(f"DEBUG: Binary approach scored {score:.2f}")
+                    if on_improvement:
+                        on_improvement(best_text, best_score)
                     
         except Exception as e:
             print(f"DEBUG: Approach 2 failed: {e}")
     
     # Approach 3: High contrast (only if still no good results)
-    if best_score < 60:
+    if best_score < 60 and not deadline_expired(deadline):
         try:
             print("DEBUG: Trying high contrast approach")
             
-            contrast_img = img.copy()
-            if contrast_img.width < 2500:
-                scale = 2500 / contrast_img.width
-                new_size = (int(contrast_img.width * scale), int(contrast_img.height * scale))
-                contrast_img = contrast_img.resize(new_size, Image.LANCZOS)
+            contrast_img = page.level(reached)
             
             contrast_img = ImageEnhance.Contrast(contrast_img).enhance(4.0)
             contrast_img = contrast_img.filter(ImageFilter.SHARPEN)
             
-            text = pytesseract.image_to_string(contrast_img, config='--psm 6')
+            result = ocr_backend.recognize(contrast_img, config='--psm 6', timeout=tesseract_timeout(deadline),
+                                           words=OCR_USE_CONFIDENCE)
+            text = result.text
             if text.strip():
-                score = evaluate_text_quality(text)
+                score = evaluate_text_quality(text, result.mean_confidence)
                 if score > best_score:
                     best_text = text
                     best_score = score
                     print(f"DEBUG: High contrast scored {score:.2f}")
+                    if on_improvement:
+                        on_improvement(best_text, best_score)
                 
         except Exception as e:
             print(f"DEBUG: Approach 3 failed: {e}")
@@ -484,20 +573,6 @@ def extract_text_from_image_bytes(image_bytes):
     print(f"DEBUG: Final best score: {best_score:.2f}, text length: {len(best_text)}")
     return best_text
 
-# Helper function to extract text from images (for scanned PDFs)
-def extract_text_from_images(pdf_bytes):
-    text = ""
-    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-        for page in pdf.pages:
-            img = page.to_image(resolution=300).original
-            # Basic preprocessing for PDFs
-            pil_img = img.convert('L')
-            pil_img = ImageOps.autocontrast(pil_img)
-            pil_img = ImageEnhance.Contrast(pil_img).enhance(2.0)
-            pil_img = pil_img.filter(ImageFilter.SHARPEN)
-            text += pytesseract.image_to_string(pil_img)
-    return text
-
 def apply_filipino_ocr_corrections(text):
     """
     Apply OCR corrections specific to Filipino NSO birth certificates.
@@ -951,11 +1026,8 @@ def _fallback_ocr(image_bytes):
         img = ImageEnhance.Contrast(img).enhance(1.8)
         img = ImageEnhance.Sharpness(img).enhance(1.5)
         
-        # Upscale for better OCR (especially important for mobile photos)
-        if img.width < 2000:
-            scale = 2000 / img.width
-            new_size = (int(img.width * scale), int(img.height * scale))
-            img = img.resize(new_size, Image.LANCZOS)
+        # Scale by the measured glyph size (especially important for mobile photos)
+        img = scale_for_ocr(img)
         
         # Apply sharpening filter
         img = img.filter(ImageFilter.SHARPEN)
@@ -970,7 +1042,7 @@ def _fallback_ocr(image_bytes):
         best_text = ""
         for config in configs:
             try:
-                text = pytesseract.image_to_string(img, config=config)
+                text = ocr_backend.image_to_string(img, config=config)
                 if len(text) > len(best_text):
                     best_text = text
             except:
@@ -978,7 +1050,7 @@ def _fallback_ocr(image_bytes):
         
         if not best_text:
             # Final fallback
-            best_text = pytesseract.image_to_string(img, config='--psm 6')
+            best_text = ocr_backend.image_to_string(img, config='--psm 6')
         
         # Apply basic corrections
         best_text = apply_filipino_ocr_corrections(best_text)
@@ -990,26 +1062,73 @@ def _fallback_ocr(image_bytes):
         logger.error(f"Fallback OCR failed: {e}")
         return ""
 
+def _preprocess_pdf_page(img):
+    """Prepare a rendered PDF page for Tesseract."""
+    pil_img = img.convert('L')  # Grayscale
+    pil_img = scale_for_ocr(pil_img)  # Glyph-size scaling
+    pil_img = ImageOps.autocontrast(pil_img)  # Auto contrast
+    pil_img = ImageEnhance.Contrast(pil_img).enhance(2.0)  # Increase contrast
+    pil_img = pil_img.filter(ImageFilter.SHARPEN)  # Sharpen image
+    # Adaptive thresholding
+    return pil_img.point(lambda x: 0 if x < 128 else 255, '1')
+
 # Helper function to extract text from images (for scanned PDFs)
+def extract_text_from_images(pdf_bytes, deadline=None):
+    # Pages are OCR'd in parallel; once the deadline runs out the pages read so far are returned
+    return "".join(ocr_pdf_pages(pdf_bytes, _preprocess_pdf_page, deadline=deadline))
 
-def extract_text_from_images(pdf_bytes):
-    text = ""
-    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-        for page in pdf.pages:
-            img = page.to_image(resolution=300).original
-            # Advanced preprocessing
-            pil_img = img.convert('L')  # Grayscale
-            pil_img = ImageOps.autocontrast(pil_img)  # Auto contrast
-            pil_img = ImageEnhance.Contrast(pil_img).enhance(2.0)  # Increase contrast
-            pil_img = pil_img.filter(ImageFilter.SHARPEN)  # Sharpen image
-            # Adaptive thresholding
-            pil_img = pil_img.point(lambda x: 0 if x < 128 else 255, '1')
-            text += pytesseract.image_to_string(pil_img)
-    return text
+def extract_text_from_pdf_pages(pdf_bytes, deadline=None):
+    """
+    Text of a PDF, taken per page from the text layer or from OCR.
+    Returns a (text, page sources) tuple, see pdf_pages.read_pdf.
+    """
+    texts, page_sources = read_pdf(pdf_bytes, evaluate_text_quality, _preprocess_pdf_page, deadline=deadline)
+    return "\n".join(texts), page_sources
 
 # Main extraction endpoint
 
 
+def _filename_type_hint(filename):
+    """
+    Part of the cache key derived from the filename, since extract_document_fields
+    also uses the filename (and its extension) to pick the document type.
+    """
+    name = (filename or '').lower()
+    if 'form137' in name or 'form 137' in name:
+        hint = 'form137'
+    elif 'birth' in name or 'certificate' in name:
+        hint = 'birth_certificate'
+    else:
+        hint = 'auto'
+    return f"{hint}.{os.path.splitext(name)[1].lstrip('.')}"
+
+
+# Types a caller can declare with the document_type form field; any other value
+# ('auto', 'form138', 'generic') leaves the detection to the filename and text
+DECLARED_TYPES = ('form137', 'birth_certificate')
+
+
+def _declared_type(document_type):
+    """The document_type form field as a type hint for _fields_from_text, or None."""
+    document_type = (document_type or '').lower()
+    return document_type if document_type in DECLARED_TYPES else None
+
+
+def _cache_key(cache, file_bytes, filename, document_type=None, full_history=False):
+    """Result cache key of an upload to the extract-pdf pipeline."""
+    type_hint = _filename_type_hint(filename)
+    declared = _declared_type(document_type)
+    if declared:
+        type_hint = f"{declared}:{type_hint}"
+    return cache.make_key(file_bytes, f"{type_hint}+full" if full_history else type_hint)
+
+
+def _form_flag(name):
+    """True when a boolean form field or query parameter of the request is set."""
+    value = request.form.get(name, request.args.get(name, ''))
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
 @app.route('/api/extract-pdf', methods=['POST'])
 def extract_pdf():
     print('DEBUG: request.files:', request.files)
@@ -1021,41 +1140,412 @@ def extract_pdf():
     file = request.files['document']
     file_bytes = file.read()
     filename = file.filename.lower()
+    deadline = deadline_from_request(request)
+    # Callers that need every page (e.g. the full grade history) opt out of the early stop
+    full_history = _form_flag('full_history')
     
+    payload, status, cached = _extract_with_cache(file_bytes, filename, deadline,
+                                                  request.form.get('document_type'), full_history)
+    response = jsonify(payload)
+    response.headers['X-Cache'] = 'HIT' if cached else 'MISS'
+    return response, status
+
+
+def _extract_with_cache(file_bytes, filename, deadline=None, document_type=None, full_history=False,
+                        progress=None, bounded=True):
+    """
+    extract_document_fields behind the result cache and admission control
+    (see _admitted for bounded).
+    Returns a (payload, HTTP status, served from cache) tuple.
+    """
+    # Repeat uploads of the same document are served from the result cache
+    cache = get_cache()
+    cache_key = _cache_key(cache, file_bytes, filename, document_type, full_history)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        print(f'DEBUG: Serving cached extraction for {filename}')
+        return cached, 200, True
+
+    with _admitted(file_bytes, filename, deadline, bounded):
+        payload, status = extract_document_fields(file_bytes, filename, deadline,
+                                                  early_stop=OCR_PDF_EARLY_STOP and not full_history,
+                                                  progress=progress, document_type=document_type)
+    # Results cut short by the deadline are not cached so a retry can do better
+    if status == 200 and not payload.get('partial'):
+        cache.set(cache_key, payload)
+    return payload, status, False
+
+
+def _run_job(file_bytes, filename, params):
+    """Job handler: the extract-pdf pipeline with the job's own (longer) time budget."""
+    payload, status, _ = _extract_with_cache(file_bytes, filename, Deadline(OCR_JOB_DEADLINE_SECONDS),
+                                             params.get('document_type'), bool(params.get('full_history')),
+                                             bounded=False)
+    return payload, status
+
+
+def _job_queue():
+    """The job queue, with this process's workers running."""
+    jobs = get_queue()
+    jobs.start_workers(_run_job)
+    return jobs
+
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """
+    Queue a document for extraction and return its job id right away.
+    Takes the same fields as /api/extract-pdf; poll GET /api/jobs/<id> for the result.
+    """
+    if 'document' not in request.files:
+        return jsonify({'error': 'No file uploaded'}), 400
+
+    file = request.files['document']
+    file_bytes = file.read()
+    filename = file.filename.lower()
+    params = {
+        'document_type': request.form.get('document_type'),
+        'full_history': _form_flag('full_history')
+    }
+    jobs = _job_queue()
+
+    # Documents already extracted are finished on submission
+    cached = get_cache().get(_cache_key(get_cache(), file_bytes, filename, params['document_type'],
+                                        params['full_history']))
+    if cached is not None:
+        job_id = jobs.add_finished(filename, cached, params=params)
+    else:
+        job_id = jobs.submit(file_bytes, filename, params)
+
+    job = jobs.get(job_id)
+    job['statusUrl'] = f"/api/jobs/{job_id}"
+    response = jsonify(job)
+    response.headers['Location'] = job['statusUrl']
+    return response, 202
+
+
+@app.route('/api/extract-batch', methods=['POST'])
+def extract_batch():
+    """
+    Extract several documents in one request: any number of uploaded files
+    and/or zip archives of them. Documents run concurrently, largest first.
+    Returns one result per document (in upload order, rejected files last)
+    with its timing.
+    Large batches that may outlive the client's timeout belong in /api/jobs.
+    """
+    uploads = [(file.filename or '', file.read()) for file in request.files.getlist('documents')
+               + request.files.getlist('document')]
+    if not uploads:
+        return jsonify({'error': 'No file uploaded'}), 400
+
+    try:
+        items, rejected = collect_items(uploads)
+    except BatchError as e:
+        return jsonify({'error': str(e)}), 400
+
+    deadline = deadline_from_request(request)
+    full_history = _form_flag('full_history')
+    # The batch is turned away as a whole when the box is overloaded; once
+    # accepted, its documents queue for slots until the batch deadline
+    get_admission().check(deadline.remaining())
+    started = time.monotonic()
+
+    def handle(file_bytes, filename):
+        try:
+            return _extract_with_cache(file_bytes, filename, deadline, None, full_history, bounded=False)
+        except AdmissionRejected as e:
+            return {'error': str(e), 'retry_after': e.retry_after}, 429, False
+
+    results = run_batch(items, handle, deadline) + rejected
+    return jsonify({
+        'count': len(results),
+        'succeeded': sum(1 for result in results if result['status'] == 200),
+        'seconds': round(time.monotonic() - started, 3),
+        'partial': deadline.tripped,
+        'results': results
+    })
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Status of an extraction job, with its result once it is done."""
+    job = _job_queue().get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job)
+
+
+# Comment lines sent while no draft is ready keep proxies from closing the stream
+SSE_KEEPALIVE_SECONDS = float(os.environ.get('OCR_SSE_KEEPALIVE_SECONDS', 15))
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _event_stream(work, seconds=None):
+    """
+    Run an extraction on a background thread and stream it as Server-Sent Events.
+
+    work(progress, deadline) must return a (payload, HTTP status, served from
+    cache) tuple and call progress with drafts ({'fields', 'confidence', ...}).
+    The first draft goes out as a 'draft' event and better ones as 'update'
+    events (drafts with the same fields and confidence are dropped); the result
+    the synchronous endpoint would have returned ends the stream as a 'final'
+    event ({'status', 'cache', 'result'}), or an 'error' event.
+    The extraction is cancelled when the client goes away.
+    """
+    events = queue.Queue()
+    closed = threading.Event()
+    deadline = Deadline(seconds, cancelled=closed.is_set)
+
+    def run():
+        try:
+            payload, status, cached = work(events.put, deadline)
+            events.put({'event': 'final', 'status': status, 'cache': 'HIT' if cached else 'MISS',
+                        'result': payload})
+        except AdmissionRejected as e:
+            events.put({'event': 'error', 'status': 429, 'error': str(e), 'retry_after': e.retry_after})
+        except Exception as e:
+            logger.error(f"Streamed extraction failed: {e}")
+            logger.error(traceback.format_exc())
+            events.put({'event': 'error', 'status': 500, 'error': str(e)})
+
+    def generate():
+        threading.Thread(target=run, name='ocr-stream', daemon=True).start()
+        last = None
+        try:
+            while True:
+                try:
+                    item = events.get(timeout=SSE_KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                event = item.pop('event', None)
+                if event is not None:
+                    yield _sse(event, item)
+                    return
+                current = (item.get('fields'), item.get('confidence'))
+                if current == last:
+                    continue
+                yield _sse('draft' if last is None else 'update', item)
+                last = current
+        finally:
+            # Also reached when the client disconnects mid-stream
+            closed.set()
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/extract-stream', methods=['POST'])
+def extract_stream():
+    """
+    /extract with progressive results: streams draft structured data as the
+    OCR search finds better text, then the /extract result (see _event_stream).
+    """
+    if not OCR_PROCESSOR_AVAILABLE or not ocr_processor:
+        return jsonify({'success': False, 'error': 'Enhanced OCR processor not available'}), 500
+    image_file = request.files.get('image')
+    image_bytes = image_file.read() if image_file else b''
+    if not image_bytes:
+        return jsonify({'success': False, 'error': 'No image file provided'}), 400
+    document_type = request.form.get('document_type', 'auto')
+    seconds = deadline_from_request(request).seconds
+    _check_admission(get_cache().make_key(image_bytes, document_type), seconds)
+
+    def work(progress, deadline):
+        def draft(update):
+            score = update['score']
+            progress({
+                'structured_data': _structured_data(update['text'], update['document_type'], update['fields']),
+                'fields': update['fields'],
+                'document_type': update['document_type'],
+                # None while only the template boxes have been read
+                'confidence': round(min(score / update['target_score'], 1.0), 3) if score is not None else None,
+            })
+
+        return _extract_image_result(image_bytes, document_type, deadline, progress=draft)
+
+    return _event_stream(work, seconds)
+
+
+@app.route('/api/extract-pdf-stream', methods=['POST'])
+def extract_pdf_stream():
+    """
+    /api/extract-pdf with progressive results: streams the fields found so far
+    after every PDF page (or better image OCR pass), then the /api/extract-pdf
+    result (see _event_stream).
+    """
+    if 'document' not in request.files:
+        return jsonify({'error': 'No file uploaded'}), 400
+    file = request.files['document']
+    file_bytes = file.read()
+    filename = file.filename.lower()
+    document_type = request.form.get('document_type')
+    full_history = _form_flag('full_history')
+    seconds = deadline_from_request(request).seconds
+    _check_admission(_cache_key(get_cache(), file_bytes, filename, document_type, full_history), seconds)
+
+    def work(progress, deadline):
+        return _extract_with_cache(file_bytes, filename, deadline, document_type, full_history, progress)
+
+    return _event_stream(work, seconds)
+
+
+def _layout_type(file_bytes, filename):
+    """
+    Document type of an uploaded image from its layout alone (no OCR), or None
+    for PDFs and pages the layout classifier is unsure about. Only a prior:
+    _fields_from_text uses it once the text confirms it.
+    """
+    if not filename.endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff')):
+        return None
+    try:
+        layout_type = layout_classifier.confident_type(Image.open(io.BytesIO(file_bytes)))
+    except Exception as e:
+        print(f"DEBUG: Layout classification failed: {e}")
+        return None
+    print(f"DEBUG: Layout type: {layout_type}")
+    return layout_type
+
+
+def _zonal_fields(file_bytes, filename, document_type, deadline=None):
+    """
+    Fields read from the form template's boxes of an uploaded image (see form_templates).
+    Returns only validated values, or an empty dict for PDFs and forms without a template.
+    """
+    if not form_templates.OCR_ZONAL or not filename.endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff')):
+        return {}
+    try:
+        page = Image.open(io.BytesIO(file_bytes))
+        zonal = form_templates.extract_fields(page, document_type, deadline=deadline, prepared=False)
+    except Exception as e:
+        print(f"DEBUG: Zonal OCR failed: {e}")
+        return {}
+    if zonal is None:
+        return {}
+    print(f"DEBUG: Zonal fields ({zonal.template.name}): {zonal.fields}")
+    return zonal.fields
+
+
+# Fields that must be filled before the remaining pages of a PDF are skipped
+# (only with OCR_PDF_EARLY_STOP). Sex and school are read from the corrected
+# text, which the OCR replacements in _fields_from_text strip down too far to
+# rely on, so Form 137 stops on the learner box fields plus the grade history:
+# the school year and grade level are often on a later page than the learner box.
+REQUIRED_FIELDS = {
+    'form137': ('learnerReferenceNumber', 'surname', 'firstName', 'dateOfBirth', 'gradeLevel', 'schoolYear'),
+    'birth_certificate': ('surname', 'firstName', 'dateOfBirth', 'placeOfBirth'),
+}
+
+
+def _required_fields_found(document_type, payload):
+    required = REQUIRED_FIELDS.get(document_type)
+    return bool(required) and all(payload.get(field) for field in required)
+
+
+def extract_document_fields(file_bytes, filename, deadline=None, early_stop=OCR_PDF_EARLY_STOP, progress=None,
+                            document_type=None):
+    """
+    Run the full extraction pipeline on an uploaded PDF or image.
+    document_type is the type the caller declared, if any; 'form137' and
+    'birth_certificate' pick the field extractor like a type in the filename.
+    When the optional deadline runs out the fields found so far are returned
+    with 'partial': True.
+    PDF pages are fed to the field extractors as they are read; with early_stop
+    the remaining pages are skipped once every field in REQUIRED_FIELDS for the
+    detected form is filled (off unless OCR_PDF_EARLY_STOP is set; callers that
+    need the full grade history pass False).
+    progress, when given, is called with draft results as they improve: a dict
+    with the 'fields' found so far and their 'confidence' (0-1). Drafts skip
+    the template OCR so they cost no extra Tesseract runs.
+    Returns a (response payload, HTTP status) tuple.
+    """
     print(f'DEBUG: Processing file: {filename}')
 
+    # The page layout tells the form apart before any OCR
+    layout_type = _layout_type(file_bytes, filename)
+
     # Detect file type
     if filename.endswith('.pdf'):
-        # Try text extraction first
-        text = extract_text_from_pdf(file_bytes)
-        # If pdfplumber returns something but it's low quality (likely scanned PDF),
-        # run image-based OCR and pick the best result.
-        if not text.strip():
-            text = extract_text_from_images(file_bytes)
-        else:
-            try:
-                score = evaluate_text_quality(text)
-            except Exception:
-                score = 0
-            print(f"DEBUG: Initial text quality score: {score:.2f}")
-            # If the score indicates noisy or garbled text, attempt image OCR
-            if score < 30:
-                print("DEBUG: Low-quality extracted text, attempting image-based OCR fallback")
-                try:
-                    img_text = extract_text_from_images(file_bytes)
-                    img_score = evaluate_text_quality(img_text)
-                    print(f"DEBUG: Image OCR score: {img_score:.2f}")
-                    # Prefer image OCR if it's measurably better
-                    if img_score > score + 10:
-                        text = img_text
-                        print("DEBUG: Using image-based OCR result")
-                except Exception as e:
-                    print(f"DEBUG: Image OCR fallback failed: {e}")
+        # Pages keep their text layer unless it is missing or low quality (scanned
+        # pages); only those pages are rasterized and OCR'd
+        texts, page_sources = [], []
+        pages = iter_pdf(file_bytes, evaluate_text_quality, _preprocess_pdf_page, deadline=deadline)
+        try:
+            for page_text, page_source in pages:
+                texts.append(page_text)
+                page_sources.append(page_source)
+                if early_stop:
+                    detected_type, payload, status = _fields_from_text("\n".join(texts), file_bytes, filename,
+                                                                       layout_type, deadline, document_type=document_type)
+                elif progress:
+                    detected_type, payload, status = _fields_from_text("\n".join(texts), file_bytes, filename,
+                                                                       layout_type, zonal=False,
+                                                                       document_type=document_type)
+                if progress and status == 200:
+                    _report_draft(progress, payload, detected_type, page_source['score'],
+                                  pages_read=len(texts))
+                if early_stop:
+                    if _required_fields_found(detected_type, payload):
+                        print(f"DEBUG: Required {detected_type} fields found on page {len(texts)}, skipping the rest")
+                        break
+        finally:
+            pages.close()
+
+        # Pages left unread after an early stop
+        page_sources += [{'page': number, 'source': 'skipped', 'score': None}
+                         for number in range(len(page_sources) + 1, page_count(file_bytes) + 1)]
+        print(f"DEBUG: PDF page sources: {page_sources}")
+
+        if not early_stop or not texts:
+            _, payload, status = _fields_from_text("\n".join(texts), file_bytes, filename,
+                                                   layout_type, deadline, document_type=document_type)
+        if status == 200:
+            payload['pageSources'] = page_sources
+        return payload, status
     elif filename.endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff')):
-        text = extract_text_from_image_bytes(file_bytes)
+        def on_improvement(best_text, best_score):
+            detected_type, payload, status = _fields_from_text(best_text, file_bytes, filename, layout_type,
+                                                               zonal=False, document_type=document_type)
+            if status == 200:
+                _report_draft(progress, payload, detected_type, best_score)
+
+        text = extract_text_from_image_bytes(file_bytes, deadline, on_improvement if progress else None)
     else:
-        return jsonify({'error': 'Unsupported file type'}), 400
+        return {'error': 'Unsupported file type'}, 400
+
+    _, payload, status = _fields_from_text(text, file_bytes, filename, layout_type, deadline,
+                                           document_type=document_type)
+    return payload, status
 
+
+def _report_draft(progress, payload, document_type, score, **details):
+    """Hand a draft payload to a progress callback; a failing callback never fails the extraction."""
+    draft = {
+        'fields': {key: value for key, value in payload.items() if key != 'rawText'},
+        'document_type': document_type,
+        # evaluate_text_quality scores of 80 and up are the ones no further approach is tried for
+        'confidence': round(min(max(score or 0.0, 0.0) / 80.0, 1.0), 3),
+    }
+    draft.update(details)
+    try:
+        progress(draft)
+    except Exception as e:
+        print(f"DEBUG: Progress callback failed: {e}")
+
+
+def _fields_from_text(text, file_bytes, filename, layout_type=None, deadline=None, zonal=True,
+                      document_type=None):
+    """
+    Detect the document type from extracted text and pull out its fields.
+    A document_type the caller declared (see DECLARED_TYPES) decides the type
+    like one in the filename; other values are ignored.
+    With zonal=False the template boxes are not OCR'd (used for drafts).
+    Returns a (document type, response payload, HTTP status) tuple; the type is
+    'form137', 'birth_certificate' or None.
+    """
     print(f'DEBUG: Raw extracted text length: {len(text)}')
     print(f'DEBUG: First 300 characters of extracted text:')
     print(repr(text[:300]))
@@ -1112,8 +1602,16 @@ def extract_pdf():
     
     lines = [l.strip() for l in text.split('\n') if l.strip()]
 
+    # The layout is only a prior: it counts once the text carries a hint of the same form
+    if not layout_classifier.confirmed(layout_type, original_extracted_text):
+        layout_type = None
+
+    declared_type = _declared_type(document_type)
+
     # Detect document type
     is_birth_certificate = (
+        declared_type == 'birth_certificate' or
+        layout_type == 'birth_certificate' or
         'birth' in filename.lower() or
         'certificate' in filename.lower() or
         re.search(r'birth\s*certificate', text, re.IGNORECASE) or
@@ -1135,7 +1633,8 @@ def extract_pdf():
         # Robust patterns to catch various OCR/formatting variants (form137, form 137-e, deped form 137, permanent record, local language heading)
         form137_patterns = r'form\W*137|permanent record|elementary school permanent record|deped\W*form\W*137|palagiang talaan|permanent record\b|form\s*137\-?e'
 
-        if (('form137' in filename_lower) or ('form 137' in filename_lower) or re.search(form137_patterns, text_for_detect, re.IGNORECASE)):
+        # A declared birth certificate is not second-guessed from its text
+        if declared_type != 'birth_certificate' and (declared_type == 'form137' or layout_type == 'form137' or ('form137' in filename_lower) or ('form 137' in filename_lower) or re.search(form137_patterns, text_for_detect, re.IGNORECASE)):
             is_form137 = True
     except Exception:
         is_form137 = False
@@ -1367,6 +1866,10 @@ def extract_pdf():
             extracted['previousSchool'] = prev_match.group(1).strip().title()
             print(f"DEBUG: Found previousSchool: {extracted['previousSchool']}")
 
+        # Fields read from the template boxes beat the regex guesses
+        if zonal:
+            extracted.update(_zonal_fields(file_bytes, filename, 'form137', deadline))
+
         # Return a mapped response immediately for Form137 so frontend can autofill
         mapped_form137 = {
             'learnerReferenceNumber': extracted.get('lrn', ''),
@@ -1384,10 +1887,11 @@ def extract_pdf():
             'schoolName': extracted.get('schoolName', ''),
             'schoolAddress': extracted.get('schoolAddress', ''),
             'previousSchool': extracted.get('previousSchool', ''),
-            'rawText': extracted.get('rawText', '')
+            'rawText': extracted.get('rawText', ''),
+            'partial': deadline is not None and deadline.tripped
         }
         print(f"DEBUG: Form137 mapped: {mapped_form137}")
-        return jsonify(mapped_form137)
+        return 'form137', mapped_form137, 200
 
     # Enhanced extraction for birth certificates
     if is_birth_certificate:
@@ -1460,6 +1964,10 @@ def extract_pdf():
                     extracted['placeOfBirth'] = place
                     break
 
+        # Fields read from the template boxes beat the regex guesses
+        if zonal:
+            extracted.update(_zonal_fields(file_bytes, filename, 'birth_certificate', deadline))
+
     # Map to frontend expected keys
     mapped = {
         'learnerReferenceNumber': extracted.get('lrn', ''),
@@ -1472,11 +1980,13 @@ def extract_pdf():
         'citizenship': extracted.get('citizenship', ''),
         'father': extracted.get('father', ''),
         'mother': extracted.get('mother', ''),
-        'rawText': extracted.get('rawText', '')
+        'registryNumber': extracted.get('registryNumber', ''),
+        'rawText': extracted.get('rawText', ''),
+        'partial': deadline is not None and deadline.tripped
     }
     
     print(f"DEBUG: Final extraction: {mapped}")
-    return jsonify(mapped)
+    return ('birth_certificate' if is_birth_certificate else None), mapped, 200
 
 @app.route('/api/extract-debug', methods=['POST'])
 def extract_debug():
@@ -1487,14 +1997,15 @@ def extract_debug():
     file = request.files['document']
     file_bytes = file.read()
     filename = file.filename.lower()
+    deadline = deadline_from_request(request)
+    layout_type = _layout_type(file_bytes, filename)
     
     # Extract text
+    page_sources = None
     if filename.endswith('.pdf'):
-        text = extract_text_from_pdf(file_bytes)
-        if not text.strip():
-            text = extract_text_from_images(file_bytes)
+        text, page_sources = extract_text_from_pdf_pages(file_bytes, deadline)
     elif filename.endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tiff')):
-        text = extract_text_from_image_bytes(file_bytes)
+        text = extract_text_from_image_bytes(file_bytes, deadline)
     else:
         return jsonify({'error': 'Unsupported file type'}), 400
     
@@ -1534,8 +2045,13 @@ def extract_debug():
     
     lines = [l.strip() for l in corrected_text.split('\n') if l.strip()]
     
+    # The layout is only a prior: it counts once the text carries a hint of the same form
+    if not layout_classifier.confirmed(layout_type, text):
+        layout_type = None
+    
     # Document type detection
     is_birth_certificate = (
+        layout_type == 'birth_certificate' or
         'birth' in filename.lower() or
         'certificate' in filename.lower() or
         re.search(r'birth\s*certificate', corrected_text, re.IGNORECASE) or
@@ -1557,6 +2073,8 @@ def extract_debug():
         'lines_count': int(len(lines)),
         'first_10_lines': [str(l) for l in lines[:10]],
         'is_birth_certificate': bool(is_birth_certificate),
+        'layout_type': layout_type,
+        'page_sources': page_sources,
         'detection_keywords': {
             'birth_in_filename': bool('birth' in filename.lower()),
             'certificate_in_filename': bool('certificate' in filename.lower()),
@@ -1569,5 +2087,14 @@ def extract_debug():
 
     return jsonify(safe_response)
 
+lazy_imports.record_startup('extractor_api')
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5001)
+    from werkzeug.serving import is_running_from_reloader
+    debug = os.environ.get('FLASK_DEBUG', '1').lower() not in ('0', 'false', 'no')
+    # Resume the jobs left queued or unfinished by the previous run in the
+    # process that serves: without the reloader this one, with it the restarted
+    # child (the watcher only restarts it)
+    if not debug or is_running_from_reloader():
+        _job_queue()
+    app.run(debug=debug, port=5001)
@@ -1,16 +1,18 @@
 import io
 import re
 import os
-import pdfplumber
-import pytesseract
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from werkzeug.exceptions import HTTPException
 from PIL import Image, ImageFilter, ImageOps, ImageEnhance
 import numpy as np
 
-# Tesseract path
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
+from pdf_pages import ocr_pdf_pages
+import lazy_imports
+import warmup
+
+# Tesseract path (pytesseract and pdfplumber are imported on first use)
+lazy_imports.set_tesseract_cmd(r'C:\Program Files\Tesseract-OCR\tesseract.exe')
 
 # Flask app and CORS
 app = Flask(__name__)
@@ -36,7 +38,7 @@ def handle_http_exception(e):
 # Helper function to extract text from PDF using pdfplumber
 def extract_text_from_pdf(pdf_bytes):
     text = ""
-    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+    with lazy_imports.pdfplumber().open(io.BytesIO(pdf_bytes)) as pdf:
         for page in pdf.pages:
             text += page.extract_text() or ""
     return text
@@ -99,7 +101,7 @@ def extract_text_from_image_bytes(image_bytes):
         enhanced_img = enhanced_img.filter(ImageFilter.UnsharpMask(radius=1, percent=150, threshold=2))
         
         # Try OCR with most effective configuration first
-        text = pytesseract.image_to_string(enhanced_img, config='--psm 6 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789.,:/()- ')
+        text = lazy_imports.pytesseract().image_to_string(enhanced_img, config='--psm 6 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789.,:/()- ')
         
         if text.strip() and len(text) > 100:
             score = evaluate_text_quality(text)
@@ -110,7 +112,7 @@ def extract_text_from_image_bytes(image_bytes):
                 
         # If first config didn't work well, try alternative
         if best_score < 50:
-            text = pytesseract.image_to_string(enhanced_img, config='--psm 3')
+            text = lazy_imports.pytesseract().image_to_string(enhanced_img, config='--psm 3')
             if text.strip() and len(text) > 100:
                 score = evaluate_text_quality(text)
                 if score > best_score:
@@ -140,7 +142,7 @@ def extract_text_from_image_bytes(image_bytes):
             binary_img = binary_img.convert('L')
             
             # Try OCR
-            text = pytesseract.image_to_string(binary_img, config='--psm 6')
+            text = lazy_imports.pytesseract().image_to_string(binary_img, config='--psm 6')
             if text.strip() and len(text) > 100:
                 score = evaluate_text_quality(text)
                 if score > best_score:
@@ -165,7 +167,7 @@ def extract_text_from_image_bytes(image_bytes):
             contrast_img = ImageEnhance.Contrast(contrast_img).enhance(4.0)
             contrast_img = contrast_img.filter(ImageFilter.SHARPEN)
             
-            text = pytesseract.image_to_string(contrast_img, config='--psm 6')
+            text = lazy_imports.pytesseract().image_to_string(contrast_img, config='--psm 6')
             if text.strip():
                 score = evaluate_text_quality(text)
                 if score > best_score:
@@ -219,19 +221,27 @@ def evaluate_text_quality(text):
     
     return max(score, 0)
 
+def _preprocess_pdf_page(img):
+    # Basic preprocessing for PDFs
+    pil_img = img.convert('L')
+    pil_img = ImageOps.autocontrast(pil_img)
+    pil_img = ImageEnhance.Contrast(pil_img).enhance(2.0)
+    return pil_img.filter(ImageFilter.SHARPEN)
+
 # Helper function to extract text from images (for scanned PDFs)
 def extract_text_from_images(pdf_bytes):
-    text = ""
-    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-        for page in pdf.pages:
-            img = page.to_image(resolution=300).original
-            # Basic preprocessing for PDFs
-            pil_img = img.convert('L')
-            pil_img = ImageOps.autocontrast(pil_img)
-            pil_img = ImageEnhance.Contrast(pil_img).enhance(2.0)
-            pil_img = pil_img.filter(ImageFilter.SHARPEN)
-            text += pytesseract.image_to_string(pil_img)
-    return text
+    # Pages are rendered and OCR'd concurrently, results come back in page order
+    return "".join(ocr_pdf_pages(pdf_bytes, _preprocess_pdf_page))
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    """Health check endpoint (503 while the worker warms up or after its warm-up failed)."""
+    ready = warmup.ready()
+    return jsonify({
+        'status': 'healthy' if ready else 'starting',
+        'warmup': warmup.status(),
+        'startup': lazy_imports.startup_report()
+    }), 200 if ready else 503
 
 @app.route('/api/extract-pdf', methods=['POST'])
 def extract_pdf():
@@ -431,5 +441,7 @@ def extract_pdf():
     print(f"DEBUG: Final extraction: {mapped}")
     return jsonify(mapped)
 
+lazy_imports.record_startup('extractor_api_optimized')
+
 if __name__ == '__main__':
     app.run(debug=True, port=5001)
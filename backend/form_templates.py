@@ -0,0 +1,388 @@
+"""
+Zonal OCR templates for fixed-layout forms.
+
+PSA/NSO birth certificates (Municipal Form 102), Form 137 (SF10) and Form 138
+(SF9) print every field at a fixed place. Instead of OCR'ing the whole page and
+hunting for labels with regular expressions, a template lists the field boxes
+in coordinates normalized to the form's outer frame. After the page has been
+straightened, each box is cropped and OCR'd as a single line with a config
+suited to the field (digits only for LRN and registry numbers, letters for
+names). The crops are small, so all fields of a page take about as long as one
+full-page pass, and they run in parallel on the shared OCR pool.
+
+Every field value is validated (a 12-digit LRN, a date with a year, a name with
+letters). A document type may have several template versions; the version
+with the most valid fields wins.
+
+The built-in boxes are laid out from the printed forms and have not been
+verified against real scans, so the validated fields only fill in what the
+full-page search misses. Skipping the full-page search (OCR_ZONAL_SKIP_FULL_PAGE)
+takes more than validation: every field must also match the strict pattern of
+its kind (STRICT_PATTERNS, or the field's own pattern) and be read with a word
+confidence of at least OCR_ZONAL_SKIP_MIN_CONFIDENCE. The boxes can be
+recalibrated or extended without code changes with a JSON file of the same shape:
+
+    {"birth_certificate": [{"name": "municipal_form_102",
+                            "fields": [{"name": "lrn", "label": "LRN",
+                                        "box": [0.08, 0.16, 0.35, 0.185],
+                                        "kind": "digits", "pattern": "\\\\d{12}"}]}]}
+
+A version with the same name as a built-in one replaces it.
+
+Configuration:
+- OCR_ZONAL: read template fields before the full-page search (default 1)
+- OCR_ZONAL_SKIP_FULL_PAGE: skip the full-page search when every field of the
+  template was read and is trusted, see ZonalResult.trusted (default 0, only
+  for templates verified against real scans)
+- OCR_ZONAL_SKIP_MIN_CONFIDENCE: word confidence every field needs before the
+  full-page search is skipped (default 85)
+- OCR_TEMPLATES_PATH: JSON file with additional or recalibrated templates
+"""
+
+import os
+import re
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+import ocr_pool
+import lazy_imports
+from deadline import Deadline, deadline_expired
+from deskew import deskew_image, otsu_threshold
+from text_metrics import estimate_text_height, ocr_scale, resize_by
+
+logger = logging.getLogger(__name__)
+
+OCR_ZONAL = os.environ.get('OCR_ZONAL', '1').lower() not in ('0', 'false', 'no')
+OCR_ZONAL_SKIP_FULL_PAGE = os.environ.get('OCR_ZONAL_SKIP_FULL_PAGE', '0').lower() not in ('0', 'false', 'no')
+OCR_ZONAL_SKIP_MIN_CONFIDENCE = float(os.environ.get('OCR_ZONAL_SKIP_MIN_CONFIDENCE', 85))
+OCR_TEMPLATES_PATH = os.environ.get('OCR_TEMPLATES_PATH', '')
+
+# The frame is searched on a copy this large
+FRAME_MAX_DIMENSION = 1000
+# The outer border must enclose at least this fraction of the page to be trusted
+FRAME_MIN_AREA = 0.4
+# Rows/columns with less ink than this fraction are margin
+MARGIN_INK_FRACTION = 0.005
+
+_LETTERS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+# Tesseract config per field kind: every box holds a single line
+FIELD_CONFIGS = {
+    'name': f'--psm 7 -c tessedit_char_whitelist={_LETTERS}ÑñÉé.,-',
+    'text': '--psm 7',
+    'digits': '--psm 7 -c tessedit_char_whitelist=0123456789-',
+    'date': f'--psm 7 -c tessedit_char_whitelist={_LETTERS}0123456789,/-',
+    'sex': f'--psm 7 -c tessedit_char_whitelist={_LETTERS}',
+}
+
+# What a cleaned value of each kind must look like before it can replace the
+# full-page search; fields with their own pattern use that instead
+_MONTH = r"[A-Za-z]{3,9}\.?"
+_YEAR = r"(?:19|20)\d{2}"
+STRICT_PATTERNS = {
+    # One to five words of letters, the first at least two letters long
+    'name': r"[A-Za-zÑñÉé]{2,}\.?(?:[ ,\-]+[A-Za-zÑñÉé]+\.?){0,4}",
+    'text': r"[A-Za-zÑñÉé0-9][A-Za-zÑñÉé0-9 .,()'/-]{4,}",
+    'digits': r"\d+(?:-\d+)*",
+    # A full date: 'January 15, 2010', '15 January 2010' or '01/15/2010'
+    'date': rf"{_MONTH} \d{{1,2}},? {_YEAR}|\d{{1,2}} {_MONTH} {_YEAR}|\d{{1,2}}[/-]\d{{1,2}}[/-]{_YEAR}",
+}
+
+# Printed captions that end up inside value boxes
+LABEL_WORDS = re.compile(r'\b(?:date\s+of\s+birth|place\s+of\s+birth|first|middle|last|name|maiden|sex|'
+                         r'day|month|year|registry\s+no|lrn)\b\.?', re.IGNORECASE)
+
+
+class FieldZone:
+    """One field of a form: its box (left, top, right, bottom) normalized to the form frame."""
+
+    def __init__(self, name: str, label: str, box: Tuple[float, float, float, float],
+                 kind: str = 'text', pattern: Optional[str] = None):
+        if kind not in FIELD_CONFIGS:
+            raise ValueError(f"Unknown field kind: {kind}")
+        self.name = name
+        self.label = label
+        self.box = tuple(box)
+        self.kind = kind
+        self.pattern = re.compile(pattern) if pattern else None
+
+    @property
+    def config(self) -> str:
+        return FIELD_CONFIGS[self.kind]
+
+    def clean(self, raw: str) -> Tuple[str, bool]:
+        """Normalize an OCR'd value and tell whether it looks like a valid value of this field."""
+        value = ' '.join(raw.split())
+        if self.kind in ('name', 'text', 'date'):
+            value = ' '.join(LABEL_WORDS.sub(' ', value).split()).strip(' .,-:')
+
+        if self.kind == 'name':
+            value = re.sub(r'[^A-Za-zÑñÉé.,\- ]', '', value).strip(' .,-')
+            valid = len(re.sub(r'[^A-Za-zÑñÉé]', '', value)) >= 2
+        elif self.kind == 'text':
+            valid = len(re.sub(r'[^A-Za-z]', '', value)) >= 3
+        elif self.kind == 'digits':
+            value = re.sub(r'[^\d-]', '', value).strip('-')
+            valid = any(char.isdigit() for char in value)
+        elif self.kind == 'date':
+            valid = re.search(r'\b(?:19|20)\d{2}\b', value) is not None
+        else:
+            word = value.upper()
+            if word.startswith(('M', 'LALAKI')):
+                value, valid = 'Male', True
+            elif word.startswith(('F', 'BABAE')):
+                value, valid = 'Female', True
+            else:
+                valid = False
+
+        if valid and self.pattern is not None:
+            valid = self.pattern.fullmatch(value) is not None
+        return value, valid
+
+    def strict(self, value: str) -> bool:
+        """Whether a cleaned value matches the field's pattern, or else the strict pattern of its kind."""
+        pattern = self.pattern.pattern if self.pattern is not None else STRICT_PATTERNS.get(self.kind)
+        return pattern is None or re.fullmatch(pattern, value) is not None
+
+
+class FormTemplate:
+    """Field boxes of one version of a form."""
+
+    def __init__(self, name: str, fields: List[FieldZone]):
+        self.name = name
+        self.fields = fields
+
+
+class ZonalResult:
+    """Field values read with one template."""
+
+    def __init__(self, document_type: str, template: FormTemplate):
+        self.document_type = document_type
+        self.template = template
+        self.values: Dict[str, str] = {}
+        self.valid: Dict[str, bool] = {}
+        self.confidences: Dict[str, float] = {}
+
+    @property
+    def fields(self) -> Dict[str, str]:
+        """Validated field values by field name."""
+        return {name: value for name, value in self.values.items() if self.valid.get(name)}
+
+    @property
+    def complete(self) -> bool:
+        """True when every field of the template was read and validated."""
+        return all(self.valid.get(field.name) for field in self.template.fields)
+
+    @property
+    def trusted(self) -> bool:
+        """
+        True when every field is valid, matches its strict pattern and was read
+        with a word confidence of at least OCR_ZONAL_SKIP_MIN_CONFIDENCE: only
+        then may the full-page search be skipped.
+        """
+        return all(self.valid.get(field.name) and field.strict(self.values[field.name])
+                   and self.confidences.get(field.name, -1.0) >= OCR_ZONAL_SKIP_MIN_CONFIDENCE
+                   for field in self.template.fields)
+
+    def text(self) -> str:
+        """The validated fields as 'Label: value' lines, parseable by the text extractors."""
+        fields = self.fields
+        return '\n'.join(f"{field.label}: {fields[field.name]}"
+                         for field in self.template.fields if field.name in fields)
+
+
+TEMPLATES: Dict[str, List[FormTemplate]] = {
+    'birth_certificate': [
+        FormTemplate('municipal_form_102', [
+            FieldZone('registryNumber', 'Registry No.', (0.62, 0.07, 0.99, 0.115), 'digits', r'\d{2,4}-?\d{1,8}'),
+            FieldZone('firstName', 'First Name', (0.08, 0.135, 0.40, 0.17), 'name'),
+            FieldZone('middleName', 'Middle Name', (0.40, 0.135, 0.68, 0.17), 'name'),
+            FieldZone('lastName', 'Last Name', (0.68, 0.135, 0.99, 0.17), 'name'),
+            FieldZone('gender', 'Sex', (0.05, 0.175, 0.30, 0.205), 'sex'),
+            FieldZone('birthDate', 'Date of Birth', (0.40, 0.175, 0.99, 0.205), 'date'),
+            FieldZone('placeOfBirth', 'Place of Birth', (0.08, 0.21, 0.99, 0.245), 'text'),
+            FieldZone('mother', 'Mother', (0.08, 0.30, 0.99, 0.335), 'name'),
+            FieldZone('father', 'Father', (0.08, 0.46, 0.99, 0.495), 'name'),
+        ]),
+    ],
+    'form137': [
+        FormTemplate('sf10_es', [
+            FieldZone('lastName', 'Last Name', (0.10, 0.135, 0.35, 0.16), 'name'),
+            FieldZone('firstName', 'First Name', (0.42, 0.135, 0.65, 0.16), 'name'),
+            FieldZone('middleName', 'Middle Name', (0.80, 0.135, 0.99, 0.16), 'name'),
+            FieldZone('lrn', 'LRN', (0.08, 0.16, 0.35, 0.185), 'digits', r'\d{12}'),
+            FieldZone('birthDate', 'Date of Birth', (0.45, 0.16, 0.68, 0.185), 'date'),
+            FieldZone('gender', 'Sex', (0.80, 0.16, 0.99, 0.185), 'sex'),
+        ]),
+    ],
+    'form138': [
+        FormTemplate('sf9_es', [
+            FieldZone('fullName', 'Name', (0.60, 0.34, 0.97, 0.38), 'name'),
+            FieldZone('lrn', 'LRN', (0.62, 0.40, 0.95, 0.44), 'digits', r'\d{12}'),
+            FieldZone('gender', 'Sex', (0.80, 0.48, 0.95, 0.52), 'sex'),
+            FieldZone('schoolYear', 'School Year', (0.62, 0.56, 0.95, 0.60), 'digits', r'\d{4}-\d{4}'),
+        ]),
+    ],
+}
+
+
+def _load_templates(path: str) -> Dict[str, List[FormTemplate]]:
+    """Built-in templates merged with the versions from a JSON file."""
+    templates = {document_type: list(versions) for document_type, versions in TEMPLATES.items()}
+    if not path:
+        return templates
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for document_type, versions in data.items():
+            for version in versions:
+                template = FormTemplate(version['name'], [
+                    FieldZone(field['name'], field.get('label', field['name']), field['box'],
+                              field.get('kind', 'text'), field.get('pattern'))
+                    for field in version['fields']
+                ])
+                existing = templates.setdefault(document_type, [])
+                existing[:] = [other for other in existing if other.name != template.name]
+                existing.append(template)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Could not load form templates from {path}: {e}")
+    return templates
+
+
+_templates = None
+
+
+def get_templates() -> Dict[str, List[FormTemplate]]:
+    """Template versions by document type (built-in plus OCR_TEMPLATES_PATH)."""
+    global _templates
+    if _templates is None:
+        _templates = _load_templates(OCR_TEMPLATES_PATH)
+    return _templates
+
+
+def has_template(document_type: str) -> bool:
+    return bool(get_templates().get(document_type))
+
+
+def find_form_frame(image: Image.Image) -> Tuple[int, int, int, int]:
+    """
+    Locate the form on a straightened page.
+
+    Returns:
+        (left, top, right, bottom) of the form's outer border when one encloses
+        most of the page, otherwise of the inked area without the margins
+    """
+    factor = min(1.0, FRAME_MAX_DIMENSION / max(image.size))
+    small = image if factor == 1.0 else image.resize(
+        (max(1, int(image.width * factor)), max(1, int(image.height * factor))), Image.BILINEAR)
+    pixels = np.asarray(small)
+    ink = pixels <= otsu_threshold(pixels)
+
+    box = None
+    # OpenCV finds the form's outer border
+    cv2 = lazy_imports.cv2()
+    if cv2 is not None:
+        contours, _ = cv2.findContours(ink.astype(np.uint8) * 255, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if contours:
+            x, y, w, h = cv2.boundingRect(max(contours, key=cv2.contourArea))
+            if w * h >= FRAME_MIN_AREA * ink.size:
+                box = (x, y, x + w, y + h)
+
+    if box is None:
+        rows = np.flatnonzero(ink.mean(axis=1) > MARGIN_INK_FRACTION)
+        columns = np.flatnonzero(ink.mean(axis=0) > MARGIN_INK_FRACTION)
+        if not len(rows) or not len(columns):
+            return 0, 0, image.width, image.height
+        box = (columns[0], rows[0], columns[-1] + 1, rows[-1] + 1)
+
+    return tuple(int(round(value / factor)) for value in box)
+
+
+def _field_confidence(ocr_result) -> Optional[float]:
+    """
+    Length-weighted mean confidence of the words read from one field box.
+    Unlike OCRResult.mean_confidence it needs no minimum word count: a box holds
+    a single value of a word or two.
+    """
+    scored = [word for word in ocr_result.words if word.confidence >= 0 and word.text.strip()]
+    if not scored:
+        return None
+    total = sum(len(word.text) for word in scored)
+    return sum(word.confidence * len(word.text) for word in scored) / total
+
+
+def _read_template(page: Image.Image, frame: Tuple[int, int, int, int], scale: float,
+                   document_type: str, template: FormTemplate,
+                   deadline: Optional[Deadline], tally) -> ZonalResult:
+    """OCR every field box of one template on the shared pool."""
+    left, top, right, bottom = frame
+    width, height = right - left, bottom - top
+
+    jobs = []
+    for field in template.fields:
+        x0, y0, x1, y1 = field.box
+        crop = page.crop((left + int(x0 * width), top + int(y0 * height),
+                          left + int(x1 * width), top + int(y1 * height)))
+        jobs.append((field, resize_by(crop, scale)))
+    # Fields sharing a config next to each other so they can share a Tesseract run
+    jobs.sort(key=lambda job: job[0].kind)
+
+    result = ZonalResult(document_type, template)
+    # Word confidences come from the same Tesseract pass; ZonalResult.trusted needs them
+    results = ocr_pool.imap_ocr(((crop, field.config) for field, crop in jobs), tally=tally,
+                                deadline=deadline, words=True)
+    try:
+        for (field, _), ocr_result in zip(jobs, results):
+            result.values[field.name], result.valid[field.name] = field.clean(ocr_result.text)
+            confidence = _field_confidence(ocr_result)
+            if confidence is not None:
+                result.confidences[field.name] = confidence
+    finally:
+        results.close()
+    return result
+
+
+def extract_fields(page: Image.Image, document_type: str, deadline: Optional[Deadline] = None,
+                   tally=None, prepared: bool = True) -> Optional[ZonalResult]:
+    """
+    Read the template fields of a form page.
+
+    Args:
+        page: The page; grayscale and straightened unless prepared is False
+        document_type: 'birth_certificate', 'form137' or 'form138'
+        deadline: Optional request deadline; no new fields are read once it runs out
+        tally: Optional object with an ``ocr_calls`` counter
+        prepared: Whether the page was already converted to grayscale and deskewed
+
+    Returns:
+        The result of the template version with the most valid fields, or None
+        when the document type has no template
+    """
+    templates = get_templates().get(document_type)
+    if not templates or deadline_expired(deadline):
+        return None
+
+    if not prepared:
+        page = deskew_image(page.convert('L'), deadline=deadline, tally=tally)
+
+    frame = find_form_frame(page)
+    # Crops are scaled like the whole page so their text reaches the target height
+    scale = ocr_scale(estimate_text_height(page), page.width)
+
+    best = None
+    for template in templates:
+        if deadline_expired(deadline):
+            break
+        result = _read_template(page, frame, scale, document_type, template, deadline, tally)
+        if best is None or len(result.fields) > len(best.fields):
+            best = result
+        if best.complete:
+            break
+
+    if best is not None:
+        logger.info(f"Zonal OCR ({best.template.name}): {len(best.fields)}/{len(best.template.fields)} fields valid")
+    return best
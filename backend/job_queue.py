@@ -0,0 +1,271 @@
+"""
+Durable extraction job queue.
+
+The synchronous endpoints hold the HTTP connection open for the whole OCR run,
+and the Node backend gives up after 30 seconds. Jobs let a client hand over a
+document, get an id back immediately and poll for the result.
+
+Jobs (including the uploaded bytes) are stored in a local SQLite database, so
+queued and unfinished jobs survive a service restart. Worker threads in the
+service process claim jobs with a lease: a job whose worker died (e.g. the
+process was restarted mid-run) is picked up again once its lease runs out, up
+to OCR_JOB_MAX_ATTEMPTS times; a worker that outlives its lease cannot record
+its outcome over the attempt that took over. Several service processes can
+share one database; claiming is a single transaction.
+
+Configuration:
+- OCR_JOBS_DB: SQLite file (default backend/ocr_jobs.sqlite3)
+- OCR_JOB_WORKERS: worker threads per service process (default 2, 0 disables them)
+- OCR_JOB_DEADLINE_SECONDS: time budget for one job (default 300)
+- OCR_JOB_MAX_ATTEMPTS: runs before a job whose worker keeps dying fails (default 3)
+- OCR_JOB_RETENTION_HOURS: finished jobs are deleted after this long (default 24)
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+OCR_JOBS_DB = os.environ.get(
+    'OCR_JOBS_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ocr_jobs.sqlite3'))
+OCR_JOB_WORKERS = int(os.environ.get('OCR_JOB_WORKERS', 2))
+OCR_JOB_DEADLINE_SECONDS = float(os.environ.get('OCR_JOB_DEADLINE_SECONDS', 300))
+OCR_JOB_MAX_ATTEMPTS = int(os.environ.get('OCR_JOB_MAX_ATTEMPTS', 3))
+OCR_JOB_RETENTION_HOURS = float(os.environ.get('OCR_JOB_RETENTION_HOURS', 24))
+
+# A running job is reclaimed when its worker has not finished it this long after the deadline
+LEASE_GRACE_SECONDS = 60
+# Idle workers check the database this often (jobs submitted by other processes)
+POLL_SECONDS = 2.0
+# How often expired jobs are purged
+PURGE_EVERY_SECONDS = 600
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    params TEXT NOT NULL,
+    document BLOB,
+    result TEXT,
+    http_status INTEGER,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at);
+"""
+
+# Handler for one job: (document bytes, filename, params) -> (result payload, HTTP status)
+JobHandler = Callable[[bytes, str, Dict], Tuple[Dict, int]]
+
+
+class JobQueue:
+    """SQLite-backed queue of extraction jobs."""
+
+    def __init__(self, path: str, lease_seconds: float = OCR_JOB_DEADLINE_SECONDS + LEASE_GRACE_SECONDS,
+                 max_attempts: int = OCR_JOB_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._wakeup = threading.Event()
+        self._workers = []
+        self._stop = threading.Event()
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # One short-lived autocommit connection per operation keeps the queue usable from any thread
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            db.row_factory = sqlite3.Row
+            db.execute('PRAGMA journal_mode=WAL')
+            yield db
+        finally:
+            db.close()
+
+    def submit(self, document: bytes, filename: str, params: Optional[Dict] = None) -> str:
+        """Queue a document; returns the job id."""
+        job_id = uuid.uuid4().hex
+        with self._connect() as db:
+            db.execute('INSERT INTO jobs (id, status, filename, params, document, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                       (job_id, QUEUED, filename, json.dumps(params or {}), sqlite3.Binary(document), time.time()))
+        self._wakeup.set()
+        return job_id
+
+    def add_finished(self, filename: str, result: Dict, http_status: int = 200,
+                     params: Optional[Dict] = None) -> str:
+        """Record a job that is already done (e.g. served from the result cache); returns its id."""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as db:
+            db.execute('INSERT INTO jobs (id, status, filename, params, result, http_status, created_at, started_at, '
+                       'finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                       (job_id, DONE, filename, json.dumps(params or {}), json.dumps(result), http_status,
+                        now, now, now))
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Public view of a job, or None for unknown ids."""
+        with self._connect() as db:
+            row = db.execute('SELECT id, status, filename, result, http_status, error, attempts, created_at, '
+                             'started_at, finished_at FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            position = None
+            if row is not None and row['status'] == QUEUED:
+                position = db.execute('SELECT COUNT(*) FROM jobs WHERE status = ? AND created_at < ?',
+                                      (QUEUED, row['created_at'])).fetchone()[0]
+        if row is None:
+            return None
+
+        job = {
+            'jobId': row['id'],
+            'status': row['status'],
+            'filename': row['filename'],
+            'attempts': row['attempts'],
+            'createdAt': row['created_at'],
+            'startedAt': row['started_at'],
+            'finishedAt': row['finished_at'],
+        }
+        if position is not None:
+            job['queuePosition'] = position
+        if row['status'] == DONE:
+            job['result'] = json.loads(row['result'])
+            job['httpStatus'] = row['http_status']
+        elif row['status'] == FAILED:
+            job['error'] = row['error']
+        return job
+
+    def claim(self) -> Optional[Dict]:
+        """
+        Take the oldest runnable job: queued, or running with an expired lease
+        (its worker died). Jobs out of attempts are failed instead.
+        The returned job's 'attempts' is the number of this claim, which
+        finish and fail need to record its outcome.
+        """
+        now = time.time()
+        with self._connect() as db:
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                db.execute('UPDATE jobs SET status = ?, error = ?, document = NULL, finished_at = ? '
+                           'WHERE status = ? AND lease_until < ? AND attempts >= ?',
+                           (FAILED, 'Worker did not finish the job', now, RUNNING, now, self.max_attempts))
+                row = db.execute('SELECT id, filename, params, document, attempts FROM jobs '
+                                 'WHERE status = ? OR (status = ? AND lease_until < ?) '
+                                 'ORDER BY created_at LIMIT 1', (QUEUED, RUNNING, now)).fetchone()
+                if row is not None:
+                    db.execute('UPDATE jobs SET status = ?, attempts = attempts + 1, started_at = ?, lease_until = ? '
+                               'WHERE id = ?', (RUNNING, now, now + self.lease_seconds, row['id']))
+                db.execute('COMMIT')
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+        if row is None:
+            return None
+        return dict(row, attempts=row['attempts'] + 1)
+
+    def finish(self, job_id: str, attempt: int, result: Dict, http_status: int) -> bool:
+        """Record the result of a claimed attempt; False when the job was reclaimed meanwhile."""
+        with self._connect() as db:
+            updated = db.execute('UPDATE jobs SET status = ?, result = ?, http_status = ?, document = NULL, '
+                                 'finished_at = ? WHERE id = ? AND status = ? AND attempts = ?',
+                                 (DONE, json.dumps(result), http_status, time.time(), job_id, RUNNING,
+                                  attempt)).rowcount
+        return self._recorded(job_id, attempt, updated)
+
+    def fail(self, job_id: str, attempt: int, error: str) -> bool:
+        """Record the failure of a claimed attempt; False when the job was reclaimed meanwhile."""
+        with self._connect() as db:
+            updated = db.execute('UPDATE jobs SET status = ?, error = ?, document = NULL, finished_at = ? '
+                                 'WHERE id = ? AND status = ? AND attempts = ?',
+                                 (FAILED, error, time.time(), job_id, RUNNING, attempt)).rowcount
+        return self._recorded(job_id, attempt, updated)
+
+    @staticmethod
+    def _recorded(job_id: str, attempt: int, updated: int) -> bool:
+        # A worker that outlived its lease must not overwrite the attempt that took over
+        if not updated:
+            logger.warning(f"Job {job_id} attempt {attempt} is no longer running (lease expired and the job "
+                           f"was reclaimed or failed); its outcome is dropped")
+        return bool(updated)
+
+    def purge(self, retention_hours: float = OCR_JOB_RETENTION_HOURS) -> int:
+        """Delete finished jobs older than the retention period; returns how many."""
+        cutoff = time.time() - retention_hours * 3600
+        with self._connect() as db:
+            return db.execute('DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?',
+                              (DONE, FAILED, cutoff)).rowcount
+
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs per status."""
+        with self._connect() as db:
+            return {row['status']: row['n'] for row in
+                    db.execute('SELECT status, COUNT(*) AS n FROM jobs GROUP BY status')}
+
+    def start_workers(self, handler: JobHandler, count: int = OCR_JOB_WORKERS) -> None:
+        """Start the worker threads (once per process)."""
+        if self._workers or count <= 0:
+            return
+        for number in range(count):
+            worker = threading.Thread(target=self._work, args=(handler,), name=f'ocr-job-worker-{number}', daemon=True)
+            worker.start()
+            self._workers.append(worker)
+        logger.info(f"Started {count} OCR job workers on {self.path}")
+
+    def stop_workers(self) -> None:
+        self._stop.set()
+        self._wakeup.set()
+
+    def _work(self, handler: JobHandler) -> None:
+        last_purge = 0.0
+        while not self._stop.is_set():
+            if time.time() - last_purge > PURGE_EVERY_SECONDS:
+                last_purge = time.time()
+                try:
+                    self.purge()
+                except sqlite3.Error as e:
+                    logger.warning(f"Purging old jobs failed: {e}")
+
+            try:
+                job = self.claim()
+            except sqlite3.Error as e:
+                logger.error(f"Claiming a job failed: {e}")
+                job = None
+            if job is None:
+                self._wakeup.wait(POLL_SECONDS)
+                self._wakeup.clear()
+                continue
+
+            logger.info(f"Running job {job['id']} ({job['filename']}), attempt {job['attempts']}")
+            try:
+                result, http_status = handler(bytes(job['document']), job['filename'], json.loads(job['params']))
+                self.finish(job['id'], job['attempts'], result, http_status)
+            except Exception as e:
+                logger.exception(f"Job {job['id']} failed")
+                self.fail(job['id'], job['attempts'], str(e))
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue() -> JobQueue:
+    """Return the process-wide job queue."""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = JobQueue(OCR_JOBS_DB)
+    return _queue
@@ -0,0 +1,290 @@
+"""
+Layout fingerprint document classifier.
+
+Decides between PSA/NSO birth certificates, Form 137 and Form 138 from the page
+image alone, before any Tesseract call. A downscaled, binarized copy of the
+page is reduced to a small fingerprint of layout features:
+
+- aspect ratio (Form 138 report cards are landscape)
+- number of horizontal and vertical ruling lines
+- where the horizontal rulings sit (top, middle and bottom third of the page)
+  and where the vertical ones sit (left and right half)
+- how much of the page is covered by a box grid (cells crossed by both kinds
+  of rulings), which separates the grade tables of Form 137 from the
+  single-column boxes of a birth certificate
+- overall ink density
+
+The fingerprint is compared to reference fingerprints per document type. Coarse
+prototypes of each form are built in; fingerprints of real scans can be
+recorded into a reference file and take part in the matching:
+
+    python layout_classifier.py add form137 scan1.jpg scan2.jpg
+    python layout_classifier.py classify upload.jpg
+
+The prototypes are typed in from the printed forms, not measured, and a ruled
+page of any kind can land near one of them. confident_type therefore only
+reports a type once fingerprints of real scans of it have been recorded, and
+callers use it as a prior that the page text must confirm (see confirmed),
+never instead of reading the header.
+
+Configuration:
+- OCR_LAYOUT_REFERENCES: JSON file of recorded fingerprints
+  (default backend/layout_fingerprints.json)
+- OCR_LAYOUT_MIN_CONFIDENCE: confidence needed to use the layout as a prior (default 0.5)
+"""
+
+import os
+import re
+import sys
+import json
+import logging
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from PIL import Image
+
+import lazy_imports
+from deskew import otsu_threshold
+
+logger = logging.getLogger(__name__)
+
+OCR_LAYOUT_REFERENCES = os.environ.get(
+    'OCR_LAYOUT_REFERENCES', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'layout_fingerprints.json'))
+OCR_LAYOUT_MIN_CONFIDENCE = float(os.environ.get('OCR_LAYOUT_MIN_CONFIDENCE', 0.5))
+
+# Fingerprints are taken from a copy this large
+LAYOUT_MAX_DIMENSION = 800
+# A ruling line is at least this fraction of the page width (height) long
+MIN_LINE_FRACTION = 1 / 12
+# Line counts are normalized by these
+MAX_HORIZONTAL_LINES = 60
+MAX_VERTICAL_LINES = 30
+# Side of the grid used for the box coverage feature
+GRID_CELLS = 8
+# A page further than this from every reference is not a known form
+MAX_DISTANCE = 1.0
+
+FEATURES = ('aspect', 'horizontal_lines', 'vertical_lines',
+            'rulings_top', 'rulings_middle', 'rulings_bottom',
+            'rulings_left', 'rulings_right', 'grid_coverage', 'ink_density')
+
+# The aspect ratio and the ruling counts separate the forms best
+FEATURE_WEIGHTS = np.array([4.0, 1.5, 1.5, 1.0, 1.0, 1.0, 0.5, 0.5, 1.0, 0.5])
+
+# Coarse prototypes from the printed layouts of the current form versions
+PROTOTYPES = {
+    # Municipal Form 102 on legal or security paper: boxes down the whole page
+    'birth_certificate': [0.8, 0.6, 0.4, 0.35, 0.35, 0.3, 0.5, 0.5, 0.6, 0.08],
+    # SF10 on long bond paper: learner box on top, grade tables below
+    'form137': [0.77, 0.75, 0.8, 0.2, 0.4, 0.4, 0.5, 0.5, 0.75, 0.07],
+    # SF9 printed landscape, two panels
+    'form138': [0.38, 0.4, 0.5, 0.3, 0.4, 0.3, 0.5, 0.5, 0.6, 0.06],
+}
+
+# Text that confirms a layout type: weaker than the header indicators used to
+# detect a type from text alone, because the layout has already narrowed it down
+TEXT_HINTS = {
+    'birth_certificate': r'birth|civil\s*regist|statistics\s*authority|\bpsa\b|\bnso\b|form\s*102',
+    'form137': r'form\s*137|permanent\s*record|school\s*form\s*10|\bsf\s*10\b|learner|\blrn\b|'
+               r'department\s*of\s*education|deped',
+    'form138': r'form\s*138|report\s*card|school\s*form\s*9|\bsf\s*9\b|progress\s*report|'
+               r'department\s*of\s*education|deped',
+}
+
+
+def _binarize(image: Image.Image) -> np.ndarray:
+    gray = image if image.mode == 'L' else image.convert('L')
+    factor = min(1.0, LAYOUT_MAX_DIMENSION / max(gray.size))
+    if factor < 1.0:
+        gray = gray.resize((max(1, int(gray.width * factor)), max(1, int(gray.height * factor))), Image.BILINEAR)
+    pixels = np.asarray(gray)
+    return (pixels <= otsu_threshold(pixels)).astype(np.uint8)
+
+
+def _ruling_masks(ink: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Masks of the horizontal and vertical ruling lines of a binary page."""
+    height, width = ink.shape
+    # OpenCV for morphological ruling-line detection
+    cv2 = lazy_imports.cv2()
+    if cv2 is not None:
+        horizontal = cv2.morphologyEx(ink, cv2.MORPH_OPEN,
+                                      cv2.getStructuringElement(cv2.MORPH_RECT, (max(2, int(width * MIN_LINE_FRACTION)), 1)))
+        vertical = cv2.morphologyEx(ink, cv2.MORPH_OPEN,
+                                    cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(2, int(height * MIN_LINE_FRACTION)))))
+        return horizontal.astype(bool), vertical.astype(bool)
+
+    # Without OpenCV: rows/columns that are mostly ink
+    horizontal = np.zeros_like(ink, dtype=bool)
+    vertical = np.zeros_like(ink, dtype=bool)
+    horizontal[ink.mean(axis=1) > 0.3] = True
+    vertical[:, ink.mean(axis=0) > 0.3] = True
+    return horizontal & ink.astype(bool), vertical & ink.astype(bool)
+
+
+def _line_positions(profile: np.ndarray, min_length: float) -> np.ndarray:
+    """Centers (0-1) of the runs of profile entries at least min_length long."""
+    on = profile >= min_length
+    edges = np.diff(np.concatenate(([0], on.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return (starts + ends) / 2 / max(len(profile), 1)
+
+
+def _shares(positions: np.ndarray, bins: int) -> List[float]:
+    """Fraction of the positions in each of the equal bins of 0-1."""
+    if not len(positions):
+        return [1.0 / bins] * bins
+    counts = np.bincount(np.minimum((positions * bins).astype(int), bins - 1), minlength=bins)
+    return list(counts / counts.sum())
+
+
+def fingerprint(image: Image.Image) -> np.ndarray:
+    """
+    Layout fingerprint of a page, see FEATURES.
+
+    Args:
+        image: The page (any mode and size)
+
+    Returns:
+        Feature vector with values roughly between 0 and 1
+    """
+    ink = _binarize(image)
+    height, width = ink.shape
+    horizontal, vertical = _ruling_masks(ink)
+
+    rows = _line_positions(horizontal.sum(axis=1), width * MIN_LINE_FRACTION)
+    columns = _line_positions(vertical.sum(axis=0), height * MIN_LINE_FRACTION)
+
+    # Cells crossed by both a horizontal and a vertical ruling
+    cell_h, cell_w = max(1, height // GRID_CELLS), max(1, width // GRID_CELLS)
+    crop_h, crop_w = cell_h * GRID_CELLS, cell_w * GRID_CELLS
+    has_h = horizontal[:crop_h, :crop_w].reshape(GRID_CELLS, cell_h, GRID_CELLS, cell_w).any(axis=(1, 3))
+    has_v = vertical[:crop_h, :crop_w].reshape(GRID_CELLS, cell_h, GRID_CELLS, cell_w).any(axis=(1, 3))
+
+    return np.array([
+        min(height / width, 2.0) / 2,
+        min(len(rows), MAX_HORIZONTAL_LINES) / MAX_HORIZONTAL_LINES,
+        min(len(columns), MAX_VERTICAL_LINES) / MAX_VERTICAL_LINES,
+        *_shares(rows, 3),
+        *_shares(columns, 2),
+        float((has_h & has_v).mean()),
+        float(ink.mean()),
+    ])
+
+
+def load_references(path: Optional[str] = None) -> Dict[str, List[List[float]]]:
+    """Recorded fingerprints by document type (from OCR_LAYOUT_REFERENCES by default)."""
+    if path is None:
+        path = OCR_LAYOUT_REFERENCES
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not load layout fingerprints from {path}: {e}")
+        return {}
+
+
+_references = None
+_recorded_types: Set[str] = set()
+
+
+def _all_references() -> List[Tuple[str, np.ndarray]]:
+    global _references, _recorded_types
+    if _references is None:
+        references = [(document_type, np.array(vector)) for document_type, vector in PROTOTYPES.items()]
+        recorded = {document_type: vectors for document_type, vectors in load_references().items() if vectors}
+        for document_type, vectors in recorded.items():
+            references.extend((document_type, np.array(vector)) for vector in vectors)
+        _recorded_types = set(recorded)
+        _references = references
+    return _references
+
+
+def recorded_types() -> Set[str]:
+    """Document types with fingerprints of real scans recorded."""
+    _all_references()
+    return _recorded_types
+
+
+def classify(image: Image.Image) -> Tuple[Optional[str], float]:
+    """
+    Classify a page by its layout alone.
+
+    Args:
+        image: The page
+
+    Returns:
+        Tuple of (document type or None when the page matches no known form,
+        confidence between 0 and 1: how much closer the best type is than the
+        runner-up)
+    """
+    vector = fingerprint(image)
+    best: Dict[str, float] = {}
+    for document_type, reference in _all_references():
+        distance = float(np.sqrt((FEATURE_WEIGHTS * (vector - reference) ** 2).sum()))
+        best[document_type] = min(distance, best.get(document_type, distance))
+
+    ranked = sorted(best.items(), key=lambda item: item[1])
+    document_type, distance = ranked[0]
+    if distance > MAX_DISTANCE:
+        return None, 0.0
+    runner_up = ranked[1][1] if len(ranked) > 1 else MAX_DISTANCE
+    confidence = 1.0 - distance / runner_up if runner_up > 0 else 0.0
+    return document_type, round(max(confidence, 0.0), 3)
+
+
+def confident_type(image: Image.Image) -> Optional[str]:
+    """
+    The layout's document type when its confidence reaches OCR_LAYOUT_MIN_CONFIDENCE
+    and fingerprints of real scans of that type are recorded; None otherwise.
+    A prior only: the page text must still confirm it.
+    """
+    try:
+        document_type, confidence = classify(image)
+    except Exception as e:
+        logger.warning(f"Layout classification failed: {e}")
+        return None
+    if document_type is None or confidence < OCR_LAYOUT_MIN_CONFIDENCE:
+        return None
+    if document_type not in recorded_types():
+        logger.debug(f"Layout looks like {document_type} ({confidence:.2f}), but no scans of it are recorded")
+        return None
+    return document_type
+
+
+def confirmed(document_type: Optional[str], text: str) -> bool:
+    """True when OCR'd text carries a hint of the given layout type (see TEXT_HINTS)."""
+    pattern = TEXT_HINTS.get(document_type or '')
+    return pattern is not None and re.search(pattern, text or '', re.IGNORECASE) is not None
+
+
+def add_references(document_type: str, paths: List[str], path: Optional[str] = None) -> int:
+    """Record the fingerprints of sample scans as references; returns the number added."""
+    global _references
+    if path is None:
+        path = OCR_LAYOUT_REFERENCES
+    references = load_references(path)
+    vectors = references.setdefault(document_type, [])
+    for image_path in paths:
+        with Image.open(image_path) as image:
+            vectors.append([round(float(value), 4) for value in fingerprint(image)])
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(references, f, indent=1, sort_keys=True)
+    # Picked up by the next classification
+    _references = None
+    return len(paths)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) >= 4 and sys.argv[1] == 'add':
+        count = add_references(sys.argv[2], sys.argv[3:])
+        print(f"Recorded {count} {sys.argv[2]} fingerprint(s) in {OCR_LAYOUT_REFERENCES}")
+    elif len(sys.argv) >= 3 and sys.argv[1] == 'classify':
+        for image_path in sys.argv[2:]:
+            with Image.open(image_path) as page:
+                print(image_path, *classify(page))
+    else:
+        print("Usage: python layout_classifier.py add <document_type> <image>... | classify <image>...")
+        sys.exit(2)
@@ -0,0 +1,198 @@
+"""
+Deferred imports of the heavy OCR dependencies.
+
+OpenCV, pdfplumber, pytesseract (which pulls in pandas when it is installed),
+tesserocr and Google Cloud Vision take most of a service's start-up time, yet
+a /health probe never needs them and a text-layer PDF never touches OpenCV.
+The service modules reach them through the accessors below, which import a
+module on first use and remember how long that took.
+
+Optional dependencies (cv2, tesserocr, vision) return None when they cannot be
+imported; required ones (pdfplumber, pytesseract) raise the ImportError.
+
+record_startup() notes how long a process took to become ready to serve;
+startup_report() returns that next to the import times of the deferred
+modules, and is served on /health so start-up regressions are visible.
+serve.py calls preload() in the gunicorn master, so forked workers inherit the
+modules they will use instead of importing them on their first request.
+
+Running this module imports a service in a fresh interpreter and fails when
+it takes longer than the budget:
+
+    python lazy_imports.py [extractor_api] [--budget 1.0]
+
+Configuration:
+- OCR_STARTUP_BUDGET_SECONDS: default budget of the check above (default 1.0)
+"""
+
+import os
+import sys
+import time
+import json
+import logging
+import importlib
+import threading
+from types import ModuleType
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+OCR_STARTUP_BUDGET_SECONDS = float(os.environ.get('OCR_STARTUP_BUDGET_SECONDS', 1.0))
+
+_MISSING = object()
+
+_modules: Dict[str, object] = {}
+_import_seconds: Dict[str, float] = {}
+_import_lock = threading.RLock()
+_startup: Dict = {}
+
+# Set by set_tesseract_cmd before pytesseract is imported, applied when it is
+_tesseract_cmd: Optional[str] = None
+
+
+def _load(name: str, optional: bool) -> Optional[ModuleType]:
+    module = _modules.get(name)
+    if module is None:
+        with _import_lock:
+            module = _modules.get(name)
+            if module is None:
+                started = time.perf_counter()
+                try:
+                    module = importlib.import_module(name)
+                except ImportError as e:
+                    logger.info(f"{name} not available: {e}")
+                    module = _MISSING
+                _import_seconds[name] = round(time.perf_counter() - started, 4)
+                if name == 'pytesseract' and module is not _MISSING and _tesseract_cmd:
+                    module.pytesseract.tesseract_cmd = _tesseract_cmd
+                _modules[name] = module
+    if module is _MISSING:
+        if not optional:
+            raise ImportError(f"{name} is not installed")
+        return None
+    return module
+
+
+def cv2() -> Optional[ModuleType]:
+    """OpenCV, or None (callers fall back to PIL/numpy)."""
+    return _load('cv2', optional=True)
+
+
+def pdfplumber() -> ModuleType:
+    return _load('pdfplumber', optional=False)
+
+
+def pytesseract() -> ModuleType:
+    """pytesseract, with the command set by set_tesseract_cmd applied."""
+    return _load('pytesseract', optional=False)
+
+
+def tesserocr() -> Optional[ModuleType]:
+    """tesserocr, or None (ocr_backend falls back to pytesseract)."""
+    return _load('tesserocr', optional=True)
+
+
+def vision() -> Optional[ModuleType]:
+    """google.cloud.vision, or None."""
+    return _load('google.cloud.vision', optional=True)
+
+
+def set_tesseract_cmd(path: str) -> None:
+    """Set the tesseract binary pytesseract runs, without importing pytesseract."""
+    global _tesseract_cmd
+    with _import_lock:
+        _tesseract_cmd = path
+        module = _modules.get('pytesseract')
+        if module is not None and module is not _MISSING:
+            module.pytesseract.tesseract_cmd = path
+
+
+def tesseract_cmd() -> str:
+    """The tesseract binary pytesseract runs."""
+    module = _modules.get('pytesseract')
+    if module is not None and module is not _MISSING:
+        return module.pytesseract.tesseract_cmd
+    return _tesseract_cmd or 'tesseract'
+
+
+def preload() -> None:
+    """
+    Import the deferred modules now (before forking workers).
+
+    Google Cloud Vision is only imported when GOOGLE_APPLICATION_CREDENTIALS
+    is set, since the services never call it otherwise.
+    """
+    accessors = [cv2, pdfplumber, pytesseract, tesserocr]
+    if os.environ.get('GOOGLE_APPLICATION_CREDENTIALS') is not None:
+        accessors.append(vision)
+    for accessor in accessors:
+        try:
+            accessor()
+        except ImportError as e:
+            logger.warning(f"Preloading failed: {e}")
+
+
+def _process_age() -> Optional[float]:
+    """Seconds since this process started (interpreter start-up included), None without /proc."""
+    try:
+        with open('/proc/self/stat') as stat:
+            # The command name may contain spaces; the fields after it are fixed
+            started_ticks = int(stat.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as uptime:
+            uptime_seconds = float(uptime.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return uptime_seconds - started_ticks / os.sysconf('SC_CLK_TCK')
+
+
+def record_startup(service: str) -> Dict:
+    """Record that the service is ready to serve; logs and returns the startup report."""
+    age = _process_age()
+    _startup.clear()
+    _startup.update({
+        'service': service,
+        'pid': os.getpid(),
+        'ready_seconds': round(age, 3) if age is not None else None,
+    })
+    report = startup_report()
+    logger.info(f"Startup: {report}")
+    return report
+
+
+def startup_report() -> Dict:
+    """How long this process took to become ready and what the deferred imports cost so far."""
+    report = dict(_startup)
+    report['deferred_imports'] = {name: {'seconds': seconds, 'available': _modules.get(name) is not _MISSING}
+                                  for name, seconds in _import_seconds.items()}
+    return report
+
+
+def main(argv=None) -> int:
+    import argparse
+    import subprocess
+
+    parser = argparse.ArgumentParser(description='Measure the cold start of an OCR service module.')
+    parser.add_argument('service', nargs='?', default='extractor_api')
+    parser.add_argument('--budget', type=float, default=OCR_STARTUP_BUDGET_SECONDS,
+                        help='seconds the import may take (default %(default)s)')
+    args = parser.parse_args(argv)
+
+    code = (f'import time; started = time.perf_counter(); import {args.service}; '
+            'seconds = time.perf_counter() - started; import json, lazy_imports; '
+            'print(json.dumps(dict(lazy_imports.startup_report(), import_seconds=round(seconds, 3))))')
+    completed = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    if completed.returncode != 0:
+        print(completed.stderr, file=sys.stderr)
+        return completed.returncode
+    report = json.loads(completed.stdout.strip().splitlines()[-1])
+    print(json.dumps(report, indent=2))
+    total = report.get('ready_seconds') or report['import_seconds']
+    if total > args.budget:
+        print(f"{args.service} took {total:.3f}s to start, over the {args.budget:.3f}s budget", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,358 @@
+"""
+OCR engine backends.
+
+Two interchangeable engines sit behind the same ``image_to_string`` call:
+
+- 'tesserocr': keeps one Tesseract API object per worker (process + thread)
+  with the language model loaded, and hands it PIL images / numpy arrays
+  directly. Per-call cost is pure recognition time.
+- 'pytesseract': spawns the tesseract binary for every call, reloading the
+  traineddata and round-tripping a temp PNG through disk. Always available
+  and used as the fallback. ``images_to_strings`` amortizes that cost by
+  recognizing a whole list of images with one config in a single run.
+
+``images_to_data`` / ``recognize(words=True)`` return OCRResult objects that
+also carry every word's confidence and bounding box from the same pass.
+
+Configuration:
+- OCR_BACKEND: 'auto' (default, tesserocr when installed), 'tesserocr' or 'pytesseract'
+- OCR_LANG: Tesseract language (default 'eng')
+- TESSDATA_PREFIX: tessdata directory for tesserocr (otherwise its built-in default)
+- OCR_BATCH_TMPDIR: directory for batched runs' images (default /dev/shm when
+  available, so the images never touch disk)
+"""
+
+import os
+import shlex
+import logging
+import tempfile
+import threading
+import subprocess
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+import lazy_imports
+
+logger = logging.getLogger(__name__)
+
+OCR_BACKEND = os.environ.get('OCR_BACKEND', 'auto').lower()
+OCR_LANG = os.environ.get('OCR_LANG', 'eng')
+# Fewer scored words than this give no usable mean confidence
+MIN_CONFIDENCE_WORDS = 5
+
+OCR_BATCH_TMPDIR = os.environ.get('OCR_BATCH_TMPDIR') or ('/dev/shm' if os.access('/dev/shm', os.W_OK) else None)
+
+ImageInput = Union[Image.Image, np.ndarray]
+
+
+def parse_tesseract_config(config: str) -> Tuple[Optional[int], Dict[str, str]]:
+    """
+    Split a pytesseract-style config string into a page segmentation mode and variables.
+
+    '--psm 6 -c tessedit_char_whitelist=ABC' -> (6, {'tessedit_char_whitelist': 'ABC'})
+    """
+    psm = None
+    variables = {}
+    tokens = shlex.split(config or '')
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token == '--psm' and i + 1 < len(tokens):
+            psm = int(tokens[i + 1])
+            i += 2
+        elif token == '-c' and i + 1 < len(tokens) and '=' in tokens[i + 1]:
+            name, value = tokens[i + 1].split('=', 1)
+            variables[name] = value
+            i += 2
+        else:
+            logger.debug(f"Ignoring unsupported Tesseract option: {token}")
+            i += 1
+    return psm, variables
+
+
+class OCRWord:
+    """A recognized word with Tesseract's confidence (0-100) and its (left, top, width, height) box."""
+
+    def __init__(self, text: str, confidence: float, box: Tuple[int, int, int, int]):
+        self.text = text
+        self.confidence = confidence
+        self.box = box
+
+
+class OCRResult:
+    """Text of one OCR pass, with word-level results when they were requested."""
+
+    def __init__(self, text: str = '', words: Optional[List[OCRWord]] = None):
+        self.text = text
+        self.words = words or []
+
+    @property
+    def mean_confidence(self) -> Optional[float]:
+        """Mean word confidence weighted by word length, None with too few words to judge."""
+        scored = [word for word in self.words if word.confidence >= 0]
+        if len(scored) < MIN_CONFIDENCE_WORDS:
+            return None
+        total = sum(len(word.text) for word in scored)
+        return sum(word.confidence * len(word.text) for word in scored) / total
+
+
+def _parse_tsv(tsv: str) -> Dict[int, List[OCRWord]]:
+    """Words of Tesseract TSV output grouped by page number (1-based)."""
+    pages = {}
+    for line in tsv.splitlines():
+        fields = line.split('\t')
+        # Level 5 rows are words: level, page, block, par, line, word, left, top, width, height, conf, text
+        if len(fields) < 12 or fields[0] != '5' or not fields[11].strip():
+            continue
+        try:
+            word = OCRWord(fields[11].strip(), float(fields[10]), tuple(int(value) for value in fields[6:10]))
+        except ValueError:
+            continue
+        pages.setdefault(int(fields[1]), []).append(word)
+    return pages
+
+
+def _to_pil(image: ImageInput) -> Image.Image:
+    if isinstance(image, np.ndarray):
+        return Image.fromarray(image)
+    return image
+
+
+class PytesseractBackend:
+    """One tesseract subprocess per call."""
+
+    name = 'pytesseract'
+
+    def image_to_string(self, image: ImageInput, config: str = '', timeout: float = 0) -> str:
+        # pytesseract kills the tesseract process and raises RuntimeError on timeout
+        return lazy_imports.pytesseract().image_to_string(image, lang=OCR_LANG, config=config, timeout=timeout)
+
+    def images_to_strings(self, images: List[ImageInput], config: str = '', timeout: float = 0) -> List[str]:
+        """Recognize several images in one tesseract run (one process start, one model load)."""
+        if len(images) == 1:
+            return [self.image_to_string(images[0], config=config, timeout=timeout)]
+        return [result.text for result in self._run(images, config, timeout, words=False)]
+
+    def images_to_data(self, images: List[ImageInput], config: str = '', timeout: float = 0) -> List[OCRResult]:
+        """Text and word confidences of several images from one tesseract run."""
+        return self._run(images, config, timeout, words=True)
+
+    def _run(self, images: List[ImageInput], config: str, timeout: float, words: bool) -> List[OCRResult]:
+        """
+        Run the tesseract binary once over a list of images.
+
+        The text output has one form-feed separated page per image, the TSV output
+        numbers its rows by page. Falls back to one run per image when the page
+        count does not match.
+        """
+        with tempfile.TemporaryDirectory(prefix='ocr-batch-', dir=OCR_BATCH_TMPDIR) as tmp:
+            paths = []
+            for i, image in enumerate(images):
+                path = os.path.join(tmp, f'{i}.png')
+                # The files only live for this run, so skip most of the compression work
+                _to_pil(image).save(path, compress_level=1)
+                paths.append(path)
+            input_path = paths[0]
+            if len(paths) > 1:
+                input_path = os.path.join(tmp, 'images.txt')
+                with open(input_path, 'w', encoding='utf-8') as f:
+                    f.write('\n'.join(paths) + '\n')
+
+            output_base = os.path.join(tmp, 'out')
+            command = [lazy_imports.tesseract_cmd(), input_path, output_base, '-l', OCR_LANG]
+            command += shlex.split(config or '')
+            command += ['txt', 'tsv'] if words else ['txt']
+            try:
+                result = subprocess.run(command, capture_output=True, timeout=timeout or None)
+            except subprocess.TimeoutExpired:
+                raise RuntimeError('Tesseract process timeout')
+            if result.returncode != 0:
+                raise lazy_imports.pytesseract().TesseractError(result.returncode, result.stderr.decode('utf-8', 'replace'))
+
+            with open(output_base + '.txt', 'r', encoding='utf-8', errors='replace') as f:
+                text = f.read()
+            page_words = {}
+            if words:
+                with open(output_base + '.tsv', 'r', encoding='utf-8', errors='replace') as f:
+                    page_words = _parse_tsv(f.read())
+
+        # Pages are separated by form feeds; Tesseract 4 also ends the last page with one
+        pages = text.split('\f')
+        if len(pages) == len(images) + 1 and not pages[-1].strip():
+            pages.pop()
+        if len(pages) != len(images):
+            logger.warning(f"Batched OCR returned {len(pages)} pages for {len(images)} images, "
+                           f"recognizing them one by one")
+            return [self._run([image], config, timeout, words)[0] for image in images]
+        return [OCRResult(page, page_words.get(number, [])) for number, page in enumerate(pages, start=1)]
+
+    def detect_orientation(self, image: ImageInput, timeout: float = 0) -> Tuple[int, float]:
+        pytesseract = lazy_imports.pytesseract()
+        osd = pytesseract.image_to_osd(image, config='--psm 0', output_type=pytesseract.Output.DICT,
+                                       timeout=timeout)
+        return int(osd['rotate']) % 360, float(osd['orientation_conf'])
+
+
+class TesserocrBackend:
+    """Persistent in-process Tesseract engine, one per worker process and thread."""
+
+    name = 'tesserocr'
+
+    def __init__(self, lang: str = OCR_LANG, tessdata_path: Optional[str] = None):
+        self.lang = lang
+        self.tessdata_path = tessdata_path or os.environ.get('TESSDATA_PREFIX')
+        self._local = threading.local()
+
+    def _api(self):
+        # Engines are not shared across fork()ed pool workers or threads
+        api = getattr(self._local, 'api', None)
+        if api is None or self._local.pid != os.getpid():
+            kwargs = {'lang': self.lang}
+            if self.tessdata_path:
+                kwargs['path'] = self.tessdata_path
+            api = lazy_imports.tesserocr().PyTessBaseAPI(**kwargs)
+            self._local.api = api
+            self._local.pid = os.getpid()
+            logger.info(f"Loaded persistent Tesseract engine ({self.lang}) in process {os.getpid()}")
+        return api
+
+    def image_to_string(self, image: ImageInput, config: str = '', timeout: float = 0) -> str:
+        return self._recognize(image, config, timeout, words=False).text
+
+    def images_to_data(self, images: List[ImageInput], config: str = '', timeout: float = 0) -> List[OCRResult]:
+        return [self._recognize(image, config, timeout, words=True) for image in images]
+
+    def _recognize(self, image: ImageInput, config: str, timeout: float, words: bool) -> OCRResult:
+        psm, variables = parse_tesseract_config(config)
+        api = self._api()
+
+        # Variables persist on the engine, so restore them after the call
+        previous = {name: api.GetVariableAsString(name) or '' for name in variables}
+        try:
+            api.SetPageSegMode(psm if psm is not None else lazy_imports.tesserocr().PSM.AUTO)
+            for name, value in variables.items():
+                api.SetVariable(name, value)
+            api.SetImage(_to_pil(image))
+            # Recognize takes its timeout in milliseconds and returns False when it ran out
+            if not api.Recognize(int(timeout * 1000)):
+                raise RuntimeError('Tesseract process timeout')
+            return OCRResult(api.GetUTF8Text(), self._words(api) if words else None)
+        finally:
+            for name, value in previous.items():
+                api.SetVariable(name, value)
+            api.Clear()
+
+    def images_to_strings(self, images: List[ImageInput], config: str = '', timeout: float = 0) -> List[str]:
+        # The engine is already loaded, so there is nothing to amortize
+        return [self.image_to_string(image, config=config, timeout=timeout) for image in images]
+
+    @staticmethod
+    def _words(api) -> List[OCRWord]:
+        """Word-level results of the last Recognize call."""
+        words = []
+        iterator = api.GetIterator()
+        if iterator is None:
+            return words
+        tesserocr = lazy_imports.tesserocr()
+        level = tesserocr.RIL.WORD
+        for word in tesserocr.iterate_level(iterator, level):
+            text = word.GetUTF8Text(level)
+            if not text or not text.strip():
+                continue
+            left, top, right, bottom = word.BoundingBox(level)
+            words.append(OCRWord(text.strip(), word.Confidence(level), (left, top, right - left, bottom - top)))
+        return words
+
+    def detect_orientation(self, image: ImageInput, timeout: float = 0) -> Tuple[int, float]:
+        api = self._api()
+        try:
+            api.SetPageSegMode(lazy_imports.tesserocr().PSM.OSD_ONLY)
+            api.SetImage(_to_pil(image))
+            osd = api.DetectOrientationScript()
+        finally:
+            api.Clear()
+        if not osd:
+            raise RuntimeError('Orientation detection failed (is osd.traineddata installed?)')
+        # orient_deg is the page's counter-clockwise rotation; report the clockwise fix like Tesseract's "Rotate:"
+        return (360 - int(osd['orient_deg'])) % 360, float(osd['orient_conf'])
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Return the configured OCR backend, falling back to pytesseract."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = _create_backend(OCR_BACKEND)
+                logger.info(f"Using OCR backend: {_backend.name}")
+    return _backend
+
+
+def _create_backend(name: str):
+    if name in ('auto', 'tesserocr') and lazy_imports.tesserocr() is not None:
+        try:
+            backend = TesserocrBackend()
+            backend._api()
+            return backend
+        except Exception as e:
+            logger.warning(f"tesserocr engine failed to start, falling back to pytesseract: {e}")
+    elif name == 'tesserocr':
+        logger.warning("OCR_BACKEND=tesserocr but tesserocr is not installed, falling back to pytesseract")
+    return PytesseractBackend()
+
+
+def image_to_string(image: ImageInput, config: str = '', timeout: float = 0) -> str:
+    """
+    Run OCR on a PIL image or numpy array with the configured backend.
+
+    A non-zero timeout (seconds) bounds the call; RuntimeError is raised when it runs out.
+    """
+    return get_backend().image_to_string(image, config=config, timeout=timeout)
+
+
+def images_to_strings(images: List[ImageInput], config: str = '', timeout: float = 0) -> List[str]:
+    """
+    Run OCR with one config on several images, returning one text per image.
+
+    With the pytesseract backend all images are recognized by a single tesseract
+    process. A non-zero timeout bounds the whole batch.
+    """
+    return get_backend().images_to_strings(images, config=config, timeout=timeout)
+
+
+def images_to_data(images: List[ImageInput], config: str = '', timeout: float = 0) -> List[OCRResult]:
+    """
+    Like images_to_strings, but each result also carries the words with their
+    confidences and bounding boxes, from the same Tesseract pass.
+    """
+    return get_backend().images_to_data(images, config=config, timeout=timeout)
+
+
+def recognize(image: ImageInput, config: str = '', timeout: float = 0, words: bool = False) -> OCRResult:
+    """OCR a single image, including word-level results when ``words`` is set."""
+    if words:
+        return images_to_data([image], config=config, timeout=timeout)[0]
+    return OCRResult(image_to_string(image, config=config, timeout=timeout))
+
+
+def spawns_process() -> bool:
+    """True when every OCR call starts a tesseract process (the pytesseract backend)."""
+    # The backend actually in use: tesserocr may be installed but have failed to start
+    return get_backend().name == 'pytesseract'
+
+
+def detect_orientation(image: ImageInput, timeout: float = 0) -> Tuple[int, float]:
+    """
+    Run Tesseract orientation detection (OSD) with the configured backend.
+
+    Returns:
+        Tuple of (degrees to rotate the image clockwise to make it upright,
+        orientation confidence)
+    """
+    return get_backend().detect_orientation(image, timeout=timeout)
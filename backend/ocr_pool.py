@@ -0,0 +1,201 @@
+"""
+Shared process pool for running Tesseract over many (image, config) pairs.
+
+The OCR processors try dozens of preprocessed images against several Tesseract
+configurations. Each pair is independent, so they are fanned out over a process
+pool that is created once per service process and reused by every request.
+Results are always yielded in submission order, so candidate selection picks
+the same winner as a sequential run.
+
+Configuration:
+- OCR_POOL_WORKERS: number of worker processes (defaults to the CPU count,
+  0 or 1 runs everything in-process)
+- OCR_POOL_WINDOW: how many jobs may be in flight at once (defaults to twice
+  the worker count), which bounds the work wasted when a search stops early
+- OCR_BATCH_SIZE: with the pytesseract backend, up to this many consecutive
+  jobs sharing a config are recognized by one tesseract run (default 8, 1
+  disables batching)
+"""
+
+import os
+import atexit
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from PIL import Image
+
+import ocr_backend
+import lazy_imports
+from ocr_backend import OCRResult
+from deadline import Deadline, deadline_expired, tesseract_timeout
+
+logger = logging.getLogger(__name__)
+
+OCR_POOL_WORKERS = int(os.environ.get('OCR_POOL_WORKERS', os.cpu_count() or 1))
+OCR_POOL_WINDOW = int(os.environ.get('OCR_POOL_WINDOW', max(OCR_POOL_WORKERS, 1) * 2))
+OCR_BATCH_SIZE = int(os.environ.get('OCR_BATCH_SIZE', 8))
+
+# How often a wait for a pool result wakes up to check the request deadline
+_DEADLINE_POLL_SECONDS = 0.25
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _ocr_task(images: List[Image.Image], config: str, tesseract_cmd: str, timeout: float = 0,
+              words: bool = False, prepare: Optional[Callable[[Image.Image], Image.Image]] = None) -> List[OCRResult]:
+    """Run Tesseract with one config over a batch of images. Executed inside a pool worker."""
+    lazy_imports.set_tesseract_cmd(tesseract_cmd)
+    try:
+        if prepare is not None:
+            images = [prepare(image) for image in images]
+        if words:
+            return ocr_backend.images_to_data(images, config=config, timeout=timeout)
+        if len(images) == 1:
+            return [OCRResult(ocr_backend.image_to_string(images[0], config=config, timeout=timeout))]
+        return [OCRResult(text) for text in ocr_backend.images_to_strings(images, config=config, timeout=timeout)]
+    except Exception as e:
+        logger.warning(f"OCR config {config[:20]}... failed: {e}")
+        return [OCRResult() for _ in images]
+
+
+def batch_size() -> int:
+    """Jobs per Tesseract run; only the per-call subprocess engine gains from batching."""
+    return max(OCR_BATCH_SIZE, 1) if ocr_backend.spawns_process() else 1
+
+
+def _batches(jobs: Iterable[Tuple[Image.Image, str]], size: int) -> Iterator[Tuple[List[Image.Image], str]]:
+    """Group runs of consecutive jobs that share a config into batches of at most size images."""
+    images, config = [], None
+    for image, job_config in jobs:
+        if images and (job_config != config or len(images) >= size):
+            yield images, config
+            images = []
+        images.append(image)
+        config = job_config
+    if images:
+        yield images, config
+
+
+def get_executor() -> Optional[ProcessPoolExecutor]:
+    """Return the shared pool, creating it on first use. None when running in-process."""
+    global _executor
+    if OCR_POOL_WORKERS <= 1:
+        return None
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(max_workers=OCR_POOL_WORKERS)
+                logger.info(f"Started OCR process pool with {OCR_POOL_WORKERS} workers")
+    return _executor
+
+
+def worker_pids() -> List[int]:
+    """Process ids of the pool workers (empty while the pool is not running)."""
+    executor = _executor
+    if executor is None:
+        return []
+    return list(getattr(executor, '_processes', None) or {})
+
+
+def shutdown() -> None:
+    """Stop the shared pool (it is recreated on next use)."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+atexit.register(shutdown)
+
+
+def imap_ocr(jobs: Iterable[Tuple[Image.Image, str]], tally=None,
+             deadline: Optional[Deadline] = None, words: bool = False,
+             window: Optional[int] = None, batch: Optional[int] = None,
+             prepare: Optional[Callable[[Image.Image], Image.Image]] = None) -> Iterator[OCRResult]:
+    """
+    Run Tesseract over (image, config) pairs and yield the results in job order.
+
+    Jobs are submitted lazily so at most OCR_POOL_WINDOW are in flight. Closing
+    the iterator early (e.g. breaking out of the loop once a candidate is good
+    enough) cancels everything that has not started yet. Consecutive jobs with
+    the same config are batched into one Tesseract run (see batch_size), so
+    callers should put such jobs next to each other.
+
+    Args:
+        jobs: (image, config) pairs
+        tally: Optional object with an ``ocr_calls`` counter, incremented for
+            every Tesseract call that actually runs
+        deadline: Optional request deadline. Once it expires no more jobs are
+            started, the iterator stops and queued jobs are cancelled; jobs that
+            are already running are bounded by a Tesseract timeout of the time left
+        words: Also collect word confidences and boxes (from the same Tesseract pass)
+        window: Batches in flight at once (default OCR_POOL_WINDOW); jobs are
+            only pulled from ``jobs`` when there is room
+        batch: Maximum jobs per Tesseract run (default batch_size())
+        prepare: Optional module-level function applied to every image inside
+            the worker before recognition, which keeps expensive preprocessing
+            off the calling thread
+    """
+    tesseract_cmd = lazy_imports.tesseract_cmd()
+    executor = get_executor()
+    batches = _batches(jobs, batch or batch_size())
+    window = window or OCR_POOL_WINDOW
+
+    if executor is None:
+        for images, config in batches:
+            if deadline_expired(deadline):
+                return
+            if tally is not None:
+                tally.ocr_calls += len(images)
+            yield from _ocr_task(images, config, tesseract_cmd, tesseract_timeout(deadline), words, prepare)
+        return
+
+    # Futures of submitted batches with their image counts
+    pending = []
+    try:
+        while True:
+            while len(pending) < window:
+                if deadline_expired(deadline):
+                    break
+                batch = next(batches, None)
+                if batch is None:
+                    break
+                images, config = batch
+                pending.append((executor.submit(_ocr_task, images, config, tesseract_cmd,
+                                                tesseract_timeout(deadline), words, prepare), len(images)))
+                if tally is not None:
+                    tally.ocr_calls += len(images)
+            if not pending:
+                return
+            try:
+                results = _wait(pending[0][0], deadline)
+                if results is None:
+                    return
+                pending.pop(0)
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM); drop the pool so the next request gets a fresh one
+                logger.error("OCR process pool broke, restarting it on next use")
+                shutdown()
+                raise
+            yield from results
+    finally:
+        for future, count in pending:
+            if future.cancel() and tally is not None:
+                tally.ocr_calls -= count
+
+
+def _wait(future, deadline: Optional[Deadline]) -> Optional[List[OCRResult]]:
+    """Result of a pool job, or None when the deadline expires first."""
+    if deadline is None:
+        return future.result()
+    while True:
+        try:
+            return future.result(timeout=_DEADLINE_POLL_SECONDS)
+        except FutureTimeoutError:
+            if deadline.expired():
+                return None
@@ -16,33 +16,184 @@ Features:
 import os
 import io
 import re
+import contextlib
 import logging
-from typing import Tuple, List, Dict, Optional, Union
-import pytesseract
+import threading
+import time
+from typing import Callable, Tuple, List, Dict, Optional, Sequence, Union
 from PIL import Image, ImageFilter, ImageOps, ImageEnhance
 import numpy as np
 
+import deskew
+import form_templates
+import lazy_imports
+import layout_classifier
+import ocr_backend
+import ocr_pool
+import pdf_pages
+from pyramid import ResolutionPyramid
+from text_metrics import estimate_text_height, ocr_scale, resize_by
+from confidence import OCR_USE_CONFIDENCE, blend_score
+from deadline import Deadline, deadline_expired, tesseract_timeout
+from strategy_stats import StrategyStats, combination_key, combination_strategy, get_stats
+
 # Setup logging
 logger = logging.getLogger(__name__)
 
-# Try to import OpenCV for advanced image processing
-try:
-    import cv2
-    CV2_AVAILABLE = True
-    logger.info("OpenCV available for advanced image processing")
-except ImportError:
-    CV2_AVAILABLE = False
-    logger.warning("OpenCV not available, using PIL-only preprocessing")
+# OpenCV (advanced image processing, PIL-only preprocessing without it) and
+# Google Cloud Vision (tried first when credentials are configured) are imported
+# on first use through lazy_imports
+GOOGLE_VISION_CONFIGURED = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS') is not None
+
+# Candidate search mode for BaseDocumentProcessor.process_image:
+# 'incremental' stops as soon as a candidate reaches the processor's good-enough score,
+# 'exhaustive' runs every preprocessing strategy and OCR config like before.
+OCR_SEARCH_MODE = os.environ.get('OCR_SEARCH_MODE', 'incremental').lower()
+
+# Document type detection OCRs the top of the page only: the header strip first,
+# then a wider band when no indicator is confident enough. Fractions of the page height.
+DETECTION_REGIONS = (0.22, 0.5)
+DETECTION_MAX_WIDTH = 1200
+OCR_DETECT_MIN_CONFIDENCE = float(os.environ.get('OCR_DETECT_MIN_CONFIDENCE', 0.5))
+
+# Pipeline profiles of DocumentOCRProcessor: 'full' runs the whole candidate
+# search; 'serverless' (process_document) keeps latency bounded with
+# header-only type detection, no orientation detection and a small fixed
+# candidate set at a single scale, under a hard budget below the function timeout.
+PROFILES = ('full', 'serverless')
+OCR_SERVERLESS_BUDGET_SECONDS = float(os.environ.get('OCR_SERVERLESS_BUDGET_SECONDS', 8))
+OCR_TESSERACT_CMD = os.environ.get('OCR_TESSERACT_CMD', 'tesseract')
+SERVERLESS_PDF_RESOLUTION = 200
+# (preprocessing strategy, variant, Tesseract config), OCR'd in this order
+SERVERLESS_CANDIDATES = (
+    ('standard_preprocessing', 0, '--psm 6'),
+    ('standard_preprocessing', 0, '--psm 4'),
+    # Brightness 1.0, contrast 2.2
+    ('mobile_photo_preprocessing', 4, '--psm 6'),
+)
 
-# Try to import Google Cloud Vision for enhanced OCR
-try:
-    from google.cloud import vision
-    GOOGLE_VISION_AVAILABLE = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS') is not None
-    if GOOGLE_VISION_AVAILABLE:
-        logger.info("Google Cloud Vision available")
-except ImportError:
-    GOOGLE_VISION_AVAILABLE = False
-    logger.info("Google Cloud Vision not available")
+# Header indicators and their weights; a document type's confidence is the sum of
+# its matched weights (capped at 1.0)
+DOCUMENT_TYPE_INDICATORS = {
+    'birth_certificate': [
+        (r'certificate\s+of\s+live\s+birth', 1.0),
+        (r'birth\s+certificate', 0.9),
+        (r'philippine\s+statistics\s+authority', 0.6),
+        (r'civil\s+regist', 0.5),
+        (r'\bnso\b', 0.3),
+        (r'\bpsa\b', 0.3),
+        # Also printed on DepEd forms, so it only tips the balance
+        (r'republic\s+of\s+the\s+philippines', 0.15),
+    ],
+    'form137': [
+        (r'form\s*137', 1.0),
+        (r'permanent\s+record', 0.9),
+        (r'school\s+form\s+10|\bsf\s*10\b', 0.9),
+        (r'department\s+of\s+education', 0.2),
+    ],
+    'form138': [
+        (r'form\s*138', 1.0),
+        (r'report\s+card', 0.9),
+        (r'school\s+form\s+9|\bsf\s*9\b', 0.9),
+        (r'progress\s+report', 0.6),
+        (r'department\s+of\s+education', 0.2),
+    ],
+}
+
+
+def _parse_early_exit_scores(value: str) -> Dict[str, float]:
+    """Parse 'birth_certificate=120,form137=90' style overrides of the good-enough scores."""
+    scores = {}
+    for item in value.split(','):
+        if '=' not in item:
+            continue
+        document_type, score = item.split('=', 1)
+        try:
+            scores[document_type.strip()] = float(score)
+        except ValueError:
+            logger.warning(f"Ignoring invalid early exit score: {item}")
+    return scores
+
+
+class OCRSearch:
+    """
+    Book-keeping for a single candidate search.
+    
+    Candidates are scored as they arrive, blending in Tesseract's mean word
+    confidence when it is known, so the processor can stop as soon as one
+    reaches the good-enough score. Also counts the Tesseract calls spent on the image,
+    remembers which (strategy, variant, config) produced each text and uses the
+    historical win statistics to order and prune the candidates. An optional
+    request deadline stops the search when the time budget runs out, and an
+    optional callback is told about every new best candidate (for progressive
+    results).
+    """
+    
+    def __init__(self, score_fn=None, target_score: Optional[float] = None,
+                 document_type: str = 'generic', stats: Optional[StrategyStats] = None,
+                 explore: bool = False, deadline: Optional[Deadline] = None,
+                 on_improvement: Optional[Callable[[str, float], None]] = None):
+        self.score_fn = score_fn
+        self.target_score = target_score
+        self.document_type = document_type
+        self.stats = stats
+        self.explore = explore
+        self.deadline = deadline
+        self.on_improvement = on_improvement
+        self.ocr_calls = 0
+        self.candidates = 0
+        self.best_score: Optional[float] = None
+        self.best_source: Optional[str] = None
+        self.sources: Dict[str, str] = {}
+        self.confidences: Dict[str, float] = {}
+        self.winner: Optional[str] = None
+    
+    def order_strategies(self, names: List[str]) -> List[str]:
+        """Preprocessing strategies ordered by historical wins."""
+        if self.stats is None:
+            return names
+        return self.stats.order_strategies(self.document_type, names)
+    
+    def plan(self, strategy: str, pairs: List[Tuple[int, str]]) -> List[Tuple[int, str]]:
+        """(variant, config) pairs of a strategy, historical winners first and losers pruned."""
+        if self.stats is None:
+            return pairs
+        return self.stats.plan(self.document_type, strategy, pairs, explore=self.explore)
+    
+    def offer(self, text: str, source: Optional[str] = None, confidence: Optional[float] = None) -> None:
+        """Score a new candidate text produced by the given combination, with its mean word confidence."""
+        self.candidates += 1
+        if source is not None:
+            self.sources.setdefault(text, source)
+        if confidence is not None:
+            self.confidences.setdefault(text, confidence)
+        if self.score_fn is None:
+            return
+        score = blend_score(self.score_fn(text), confidence)
+        if self.best_score is None or score > self.best_score:
+            self.best_score = score
+            self.best_source = source
+            if self.on_improvement is not None:
+                try:
+                    self.on_improvement(text, score)
+                except Exception as e:
+                    logger.warning(f"Candidate callback failed: {e}")
+    
+    @property
+    def done(self) -> bool:
+        """True once a candidate has reached the target score."""
+        return (self.target_score is not None and self.best_score is not None
+                and self.best_score >= self.target_score)
+    
+    @property
+    def stopped(self) -> bool:
+        """True when no more OCR work should be started (good enough or out of time)."""
+        return self.done or (self.deadline is not None and self.deadline.expired())
+    
+    @property
+    def partial(self) -> bool:
+        """True when the deadline cut the search short."""
+        return self.deadline is not None and self.deadline.tripped
 
 
 class DocumentOCRProcessor:
@@ -53,63 +204,184 @@ class DocumentOCRProcessor:
     preprocessing for different document types.
     """
     
-    def __init__(self, tesseract_path: str = r'C:\Program Files\Tesseract-OCR\tesseract.exe'):
+    def __init__(self, tesseract_path: str = r'C:\Program Files\Tesseract-OCR\tesseract.exe',
+                 search_mode: Optional[str] = None,
+                 early_exit_scores: Optional[Dict[str, float]] = None,
+                 profile: str = 'full'):
         """
         Initialize the OCR processor.
         
         Args:
             tesseract_path: Path to the Tesseract executable
+            search_mode: 'incremental' or 'exhaustive' (defaults to OCR_SEARCH_MODE)
+            early_exit_scores: Per-document-type good-enough scores overriding the
+                processor defaults (also read from OCR_EARLY_EXIT_SCORES)
+            profile: 'full' or 'serverless' (see PROFILES)
         """
-        pytesseract.pytesseract.tesseract_cmd = tesseract_path
-        self.document_processors = {
-            'birth_certificate': BirthCertificateProcessor(),
-            'form137': Form137Processor(),
-            'form138': Form138Processor(),
-            'generic': GenericDocumentProcessor()
-        }
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown OCR profile: {profile}")
+        lazy_imports.set_tesseract_cmd(tesseract_path)
+        self.profile = profile
+        self.search_mode = (search_mode or OCR_SEARCH_MODE).lower()
+        # Per-type processors are built on first use (see get_processor)
+        self.document_processors: Dict[str, 'BaseDocumentProcessor'] = {}
+        self._processors_lock = threading.Lock()
+        
+        self.early_exit_scores = _parse_early_exit_scores(os.environ.get('OCR_EARLY_EXIT_SCORES', ''))
+        self.early_exit_scores.update(early_exit_scores or {})
+    
+    def get_processor(self, document_type: str) -> 'BaseDocumentProcessor':
+        """The processor for a document type (the generic one for unknown types), built on first use."""
+        if document_type not in PROCESSOR_CLASSES:
+            document_type = 'generic'
+        processor = self.document_processors.get(document_type)
+        if processor is None:
+            with self._processors_lock:
+                processor = self.document_processors.get(document_type)
+                if processor is None:
+                    processor = PROCESSOR_CLASSES[document_type]()
+                    if document_type in self.early_exit_scores:
+                        processor.early_exit_score = self.early_exit_scores[document_type]
+                    self.document_processors[document_type] = processor
+        return processor
     
-    def extract_text_from_image(self, image_bytes: bytes, document_type: str = 'auto') -> str:
+    def extract_text_from_image(self, image_bytes: bytes, document_type: str = 'auto',
+                                deadline: Optional[Deadline] = None) -> str:
         """
         Extract text from image bytes with document-specific preprocessing.
         
         Args:
             image_bytes: The image data as bytes
             document_type: Type of document ('birth_certificate', 'form137', 'form138', 'generic', 'auto')
+            deadline: Optional request deadline; the best text so far is returned when it runs out
             
         Returns:
             Extracted text as string
         """
+        return self.extract_document(image_bytes, document_type, deadline)['text']
+    
+    def extract_document(self, image_bytes: bytes, document_type: str = 'auto',
+                         deadline: Optional[Deadline] = None,
+                         progress: Optional[Callable[[Dict], None]] = None,
+                         synthetic: bool = False) -> Dict:
+        """
+        Extract text from image bytes and report how the candidate search went.
+        
+        Args:
+            image_bytes: The image data as bytes
+            document_type: Type of document ('birth_certificate', 'form137', 'form138', 'generic', 'auto')
+            deadline: Optional request deadline; the best text so far is returned when it runs out
+            progress: Optional callback for drafts. Called with {'text', 'score',
+                'target_score', 'fields', 'document_type'} when the template fields
+                are read and for every better candidate the search finds
+            synthetic: The image is a generated test page (the worker warm-up):
+                Google Cloud Vision is not called and the winning combination is
+                not recorded
+            
+        Returns:
+            Dictionary with the extracted 'text', the resolved 'document_type',
+            the number of Tesseract calls spent ('ocr_calls'), whether the search
+            stopped early ('early_exit'), the best candidate score ('score'),
+            whether the deadline cut the search short ('partial') and, for
+            auto-detection, the detection confidence ('detection_confidence').
+            Forms with a zonal template also report the validated template
+            fields ('fields') and the template version ('template'); the
+            full-page search is skipped when every field was read.
+        """
+        result = {
+            'text': '',
+            'document_type': document_type,
+            'ocr_calls': 0,
+            'early_exit': False,
+            'score': None,
+            'partial': False
+        }
+        
         try:
             # Load image
             image = Image.open(io.BytesIO(image_bytes))
             
             # Auto-detect document type if requested
+            serverless = self.profile == 'serverless'
             if document_type == 'auto':
-                document_type = self._detect_document_type(image)
-                logger.info(f"Auto-detected document type: {document_type}")
+                document_type, confidence, detection_calls = self._detect_document_type(image, deadline,
+                                                                                        header_only=serverless)
+                result['ocr_calls'] += detection_calls
+                result['document_type'] = document_type
+                result['detection_confidence'] = confidence
+                logger.info(f"Auto-detected document type: {document_type} (confidence {confidence:.2f})")
             
             # Get appropriate processor
-            processor = self.document_processors.get(document_type, self.document_processors['generic'])
+            processor = self.get_processor(document_type)
             
-            # Try Google Cloud Vision first if available
-            if GOOGLE_VISION_AVAILABLE:
+            # Try Google Cloud Vision first if available (its latency is not bounded by the deadline)
+            if not serverless and not synthetic and GOOGLE_VISION_CONFIGURED and lazy_imports.vision() is not None:
                 try:
                     text = self._extract_with_google_vision(image_bytes)
                     if text and len(text.strip()) > 50:
                         logger.info("Successfully extracted text using Google Cloud Vision")
-                        return text
+                        result['text'] = text
+                        return result
                 except Exception as e:
                     logger.warning(f"Google Cloud Vision failed: {e}")
             
+            def report(text: str, score: Optional[float]) -> None:
+                progress({'text': text, 'score': score, 'target_score': processor.early_exit_score,
+                          'fields': result.get('fields', {}), 'document_type': document_type})
+            
             # Use Tesseract with advanced preprocessing
-            return processor.process_image(image)
+            # The serverless profile neither consults nor updates the win statistics
+            search = processor.new_search(incremental=self.search_mode == 'incremental', deadline=deadline,
+                                          on_improvement=report if progress else None, learn=not serverless)
+            page = processor._prepare_image(image, search, detect_rotation=not serverless)
+            
+            # Fixed-layout forms: read the field boxes first, they are far cheaper than full pages
+            if form_templates.OCR_ZONAL and form_templates.has_template(document_type):
+                try:
+                    zonal = form_templates.extract_fields(page, document_type, deadline=deadline, tally=search)
+                except Exception as e:
+                    logger.warning(f"Zonal OCR failed: {e}")
+                    zonal = None
+                if zonal is not None:
+                    result['fields'] = zonal.fields
+                    result['template'] = zonal.template.name
+                    if progress:
+                        report(zonal.text(), None)
+                    # Only fields that are strict and confidently read may stand in for the full page
+                    if zonal.trusted and form_templates.OCR_ZONAL_SKIP_FULL_PAGE:
+                        result['text'] = zonal.text()
+                        result['ocr_calls'] += search.ocr_calls
+                        result['early_exit'] = True
+                        confidences = list(zonal.confidences.values())
+                        result['score'] = blend_score(search.score_fn(result['text']),
+                                                      sum(confidences) / len(confidences) if confidences else None)
+                        # The deadline may have tripped while the last boxes were read
+                        result['partial'] = search.partial
+                        logger.info(f"{document_type}: all template fields trusted, skipping the full-page search")
+                        return result
+            
+            if serverless:
+                result['text'] = processor._run_candidates(page, search, SERVERLESS_CANDIDATES)
+            else:
+                result['text'] = processor._run_strategies(page, search)
+            result['ocr_calls'] += search.ocr_calls
+            result['early_exit'] = search.done
+            result['score'] = search.best_score
+            result['partial'] = search.partial
+            # A search cut short says little about which combination wins
+            if not search.partial and not serverless and not synthetic:
+                get_stats().record(document_type, search.winner)
+            logger.info(f"{document_type}: {search.ocr_calls} OCR calls, "
+                        f"{search.candidates} candidates, early exit: {search.done}, partial: {search.partial}")
+            return result
             
         except Exception as e:
             logger.error(f"OCR extraction failed: {e}")
-            return ""
+            return result
     
     def _extract_with_google_vision(self, image_bytes: bytes) -> str:
         """Extract text using Google Cloud Vision API."""
+        vision = lazy_imports.vision()
         client = vision.ImageAnnotatorClient()
         image = vision.Image(content=image_bytes)
         response = client.text_detection(image=image)
@@ -122,50 +394,93 @@ class DocumentOCRProcessor:
             return texts[0].description
         return ""
     
-    def _detect_document_type(self, image: Image.Image) -> str:
+    def _detect_document_type(self, image: Image.Image, deadline: Optional[Deadline] = None,
+                              header_only: bool = False) -> Tuple[str, float, int]:
         """
-        Detect document type based on quick OCR scan.
+        Detect document type from a quick OCR scan of the page header, with the page layout as a prior.
+        
+        The title lines that identify a document sit at the top of the page, so
+        only a header strip, scaled by its glyph size and at most
+        DETECTION_MAX_WIDTH wide, is OCR'd. A wider band is tried only when no
+        indicator reaches OCR_DETECT_MIN_CONFIDENCE. The layout fingerprint
+        (ruling lines, aspect ratio, box grid; see layout_classifier.confident_type)
+        never replaces the header: its type is taken once the header carries a
+        hint of the same form, even a weak one, and no other form is named clearly.
         
         Args:
             image: PIL Image object
+            deadline: Optional request deadline bounding the scan
+            header_only: Skip the layout prior and the wider band: a single
+                OCR pass over the header strip
             
         Returns:
-            Detected document type
+            Tuple of (detected document type, confidence between 0 and 1,
+            number of Tesseract calls spent)
         """
-        # Do a quick OCR scan with minimal preprocessing
-        gray_image = image.convert('L')
-        if gray_image.width < 1000:
-            scale = 1000 / gray_image.width
-            new_size = (int(gray_image.width * scale), int(gray_image.height * scale))
-            gray_image = gray_image.resize(new_size, Image.LANCZOS)
+        layout_type = None if header_only else layout_classifier.confident_type(image)
         
-        try:
-            quick_text = pytesseract.image_to_string(gray_image, config='--psm 6').lower()
-            
-            # Check for birth certificate indicators
-            birth_cert_keywords = ['birth certificate', 'certificate of live birth', 'republic of the philippines', 
-                                 'civil registrar', 'nso', 'psa', 'philippine statistics authority']
-            if any(keyword in quick_text for keyword in birth_cert_keywords):
-                return 'birth_certificate'
-            
-            # Check for Form 137 indicators
-            if 'form 137' in quick_text or 'permanent record' in quick_text:
-                return 'form137'
+        best_type, best_confidence, ocr_calls = 'generic', 0.0, 0
+        
+        for fraction in DETECTION_REGIONS[:1] if header_only else DETECTION_REGIONS:
+            if ocr_calls and deadline is not None and deadline.expired():
+                break
             
-            # Check for Form 138 indicators
-            if 'form 138' in quick_text or 'report card' in quick_text:
-                return 'form138'
+            region = image.crop((0, 0, image.width, max(1, int(image.height * fraction)))).convert('L')
+            # Scale by glyph size, but keep the strip small enough to stay a quick pass
+            factor = ocr_scale(estimate_text_height(region), region.width)
+            region = resize_by(region, min(factor, DETECTION_MAX_WIDTH / region.width))
             
-            return 'generic'
+            try:
+                ocr_calls += 1
+                quick_text = ocr_backend.image_to_string(region, config='--psm 6',
+                                                         timeout=tesseract_timeout(deadline)).lower()
+            except Exception as e:
+                logger.warning(f"Document type detection failed: {e}")
+                break
             
-        except Exception as e:
-            logger.warning(f"Document type detection failed: {e}")
-            return 'generic'
+            document_type, confidence = classify_header_text(quick_text)
+            if confidence > best_confidence:
+                best_type, best_confidence = document_type, confidence
+            if (layout_type is not None and layout_classifier.confirmed(layout_type, quick_text)
+                    and (best_type == layout_type or best_confidence < OCR_DETECT_MIN_CONFIDENCE)):
+                logger.info(f"Document type from layout, confirmed by the header: {layout_type}")
+                # A confirmed layout counts as reaching the detection bar
+                return layout_type, max(best_confidence if best_type == layout_type else 0.0,
+                                        OCR_DETECT_MIN_CONFIDENCE), ocr_calls
+            if best_confidence >= OCR_DETECT_MIN_CONFIDENCE:
+                break
+        
+        return best_type, best_confidence, ocr_calls
+
+
+def classify_header_text(text: str) -> Tuple[str, float]:
+    """
+    Classify OCR'd header text by the weighted indicators of each document type.
+    
+    Args:
+        text: Lowercased OCR text of the page header
+        
+    Returns:
+        Tuple of (document type, confidence between 0 and 1); ('generic', 0.0)
+        when nothing matches
+    """
+    best_type, best_confidence = 'generic', 0.0
+    for document_type, indicators in DOCUMENT_TYPE_INDICATORS.items():
+        confidence = min(sum(weight for pattern, weight in indicators if re.search(pattern, text)), 1.0)
+        if confidence > best_confidence:
+            best_type, best_confidence = document_type, confidence
+    return best_type, best_confidence
 
 
 class BaseDocumentProcessor:
     """Base class for document-specific processors."""
     
+    # Key for the strategy win statistics
+    document_type = 'generic'
+    
+    # Score at which an incremental search stops looking for a better candidate
+    early_exit_score = 80.0
+    
     def __init__(self):
         self.ocr_configs = [
             '--psm 6 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789.,:/()- ',
@@ -177,18 +492,38 @@ class BaseDocumentProcessor:
             '--psm 1',  # Automatic page segmentation with OSD
         ]
     
-    def process_image(self, image: Image.Image) -> str:
+    def new_search(self, incremental: bool = True, deadline: Optional[Deadline] = None,
+                   on_improvement: Optional[Callable[[str, float], None]] = None,
+                   learn: bool = True) -> OCRSearch:
+        """
+        Create the search state for one image, stopping early only when incremental.
+        Without ``learn`` the candidates are neither ordered nor pruned by the win statistics.
+        """
+        stats = get_stats() if learn else None
+        return OCRSearch(self._candidate_score, self.early_exit_score if incremental else None,
+                         document_type=self.document_type, stats=stats,
+                         explore=stats is not None and stats.should_explore(self.document_type),
+                         deadline=deadline, on_improvement=on_improvement)
+    
+    def process_image(self, image: Image.Image, search: Optional[OCRSearch] = None) -> str:
         """
         Process image and extract text using multiple preprocessing approaches.
         
         Args:
             image: PIL Image object
+            search: Candidate search state; stops early once a candidate is good enough
+                or its request deadline runs out
             
         Returns:
             Best extracted text
         """
-        extracted_texts = []
+        if search is None:
+            search = self.new_search()
         
+        return self._run_strategies(self._prepare_image(image, search), search)
+    
+    def _prepare_image(self, image: Image.Image, search: OCRSearch, detect_rotation: bool = True) -> Image.Image:
+        """Convert the page to grayscale and straighten it with a single rotation (skew only without detect_rotation)."""
         # Convert to grayscale if needed
         if image.mode != 'L':
             if image.mode == 'RGBA':
@@ -199,7 +534,16 @@ class BaseDocumentProcessor:
             else:
                 image = image.convert('L')
         
-        # Apply preprocessing strategies
+        # Orientation (one OSD call) and projection-profile skew correction
+        try:
+            image = deskew.deskew_image(image, deadline=search.deadline, tally=search,
+                                        detect_rotation=detect_rotation)
+        except Exception as e:
+            logger.warning(f"Deskew failed: {e}")
+        return image
+    
+    def _strategies(self) -> List:
+        """Preprocessing strategies of this processor, each mapping a page to candidate images."""
         preprocessing_strategies = [
             self._standard_preprocessing,
             self._aggressive_preprocessing,
@@ -207,42 +551,95 @@ class BaseDocumentProcessor:
             self._low_quality_preprocessing
         ]
         
-        if CV2_AVAILABLE:
+        if lazy_imports.cv2() is not None:
             preprocessing_strategies.extend([
                 self._opencv_preprocessing,
                 self._adaptive_threshold_preprocessing
             ])
         
-        for strategy in preprocessing_strategies:
+        return preprocessing_strategies
+    
+    def _run_strategies(self, image: Image.Image, search: OCRSearch) -> str:
+        """
+        OCR a prepared page with every preprocessing strategy and pick the best text.
+        
+        Every strategy sees the page scaled by its measured glyph size. In the
+        'pyramid' scale mode all strategies run at the smallest legible scale first.
+        The next scale is tried only while the best candidate scores below the
+        processor's good-enough score, and only with the strategy that produced that
+        candidate. In the 'fixed' mode there is a single scale.
+        """
+        extracted_texts = []
+        
+        # Historically winning strategies first
+        strategies_by_name = {strategy.__name__.lstrip('_'): strategy for strategy in self._strategies()}
+        names = search.order_strategies(list(strategies_by_name))
+        
+        page = ResolutionPyramid.for_mode(image)
+        for level, scale in enumerate(page.scales):
+            if level:
+                if not self._needs_escalation(search):
+                    break
+                # Only the strategy behind the best candidate so far is retried larger
+                if search.best_source:
+                    names = [combination_strategy(search.best_source)]
+            for name in names:
+                extracted_texts.extend(self._run_strategy(name, strategies_by_name[name], page.level(scale), search))
+        
+        return self._select_result(extracted_texts, search)
+    
+    def _run_candidates(self, image: Image.Image, search: OCRSearch,
+                        candidates: Sequence[Tuple[str, int, str]]) -> str:
+        """
+        OCR a prepared page with a fixed list of (strategy, variant, config) candidates.
+        
+        The serverless profile's search: a single scale that brings the text to the
+        target height, no ordering by win statistics and no escalation. Stops once a
+        candidate is good enough or the deadline runs out.
+        """
+        page = ResolutionPyramid.single(image)
+        page = page.level(page.scales[0])
+        variants: Dict[str, List[Image.Image]] = {}
+        texts = []
+        for name, variant, config in candidates:
+            if search.stopped:
+                break
             try:
-                processed_images = strategy(image)
-                for processed_img in processed_images:
-                    texts = self._extract_with_multiple_configs(processed_img)
-                    extracted_texts.extend(texts)
+                if name not in variants:
+                    variants[name] = getattr(self, '_' + name)(page)
+                images = variants[name][variant:variant + 1]
             except Exception as e:
-                logger.warning(f"Preprocessing strategy failed: {e}")
+                logger.warning(f"Preprocessing strategy {name} failed: {e}")
                 continue
-        
-        # Try rotation correction
+            texts.extend(self._ocr_grid(images, search, configs=[config], strategy=name))
+        return self._select_result(texts, search)
+    
+    def _run_strategy(self, name: str, strategy, image: Image.Image, search: OCRSearch) -> List[str]:
+        """Preprocess the page with one strategy and OCR its candidate images."""
+        if search.stopped:
+            return []
         try:
-            rotated_texts = self._rotation_correction(image)
-            extracted_texts.extend(rotated_texts)
+            return self._ocr_grid(strategy(image), search, strategy=name)
         except Exception as e:
-            logger.warning(f"Rotation correction failed: {e}")
-        
-        # Select best result
-        return self._select_best_text(extracted_texts)
+            logger.warning(f"Preprocessing strategy {name} failed: {e}")
+            return []
+    
+    def _needs_escalation(self, search: OCRSearch) -> bool:
+        """True while the best candidate is below the good-enough score and there is time left."""
+        if search.stopped:
+            return False
+        return search.best_score is None or search.best_score < self.early_exit_score
+    
+    def _select_result(self, texts: List[str], search: OCRSearch) -> str:
+        """Pick the final text among the candidates and record which combination produced it."""
+        best_text = self._select_best_text(texts, search.confidences)
+        search.winner = search.sources.get(best_text)
+        return best_text
     
     def _standard_preprocessing(self, image: Image.Image) -> List[Image.Image]:
         """Standard preprocessing for clear, well-lit documents."""
         processed = image.copy()
         
-        # Upscale if too small
-        if processed.width < 2000:
-            scale = 2000 / processed.width
-            new_size = (int(processed.width * scale), int(processed.height * scale))
-            processed = processed.resize(new_size, Image.LANCZOS)
-        
         # Auto contrast
         processed = ImageOps.autocontrast(processed, cutoff=2)
         
@@ -262,12 +659,7 @@ class BaseDocumentProcessor:
         """Aggressive preprocessing for poor quality or faded documents."""
         results = []
         
-        # Extreme upscaling
         processed = image.copy()
-        if processed.width < 3000:
-            scale = 3000 / processed.width
-            new_size = (int(processed.width * scale), int(processed.height * scale))
-            processed = processed.resize(new_size, Image.LANCZOS)
         
         # Heavy denoising
         for _ in range(2):
@@ -298,12 +690,6 @@ class BaseDocumentProcessor:
         results = []
         processed = image.copy()
         
-        # Moderate upscaling for mobile photos
-        if processed.width < 2400:
-            scale = 2400 / processed.width
-            new_size = (int(processed.width * scale), int(processed.height * scale))
-            processed = processed.resize(new_size, Image.LANCZOS)
-        
         # Histogram equalization for better contrast
         processed = ImageOps.autocontrast(processed, cutoff=3)
         
@@ -356,7 +742,8 @@ class BaseDocumentProcessor:
     
     def _opencv_preprocessing(self, image: Image.Image) -> List[Image.Image]:
         """Advanced preprocessing using OpenCV."""
-        if not CV2_AVAILABLE:
+        cv2 = lazy_imports.cv2()
+        if cv2 is None:
             return []
         
         results = []
@@ -377,7 +764,8 @@ class BaseDocumentProcessor:
     
     def _adaptive_threshold_preprocessing(self, image: Image.Image) -> List[Image.Image]:
         """Adaptive thresholding using OpenCV."""
-        if not CV2_AVAILABLE:
+        cv2 = lazy_imports.cv2()
+        if cv2 is None:
             return []
         
         results = []
@@ -402,84 +790,95 @@ class BaseDocumentProcessor:
         
         return results
     
-    def _rotation_correction(self, image: Image.Image) -> List[str]:
-        """Try different rotations to correct skewed documents."""
+    def _extract_with_multiple_configs(self, image: Image.Image, search: Optional[OCRSearch] = None) -> List[str]:
+        """Extract text using multiple OCR configurations."""
+        return self._ocr_grid([image], search, strategy='single')
+    
+    def _ocr_grid(self, images: List[Image.Image], search: Optional[OCRSearch] = None,
+                  configs: Optional[List[str]] = None, min_length: int = 15,
+                  strategy: str = '') -> List[str]:
+        """
+        OCR every image with every config on the shared process pool.
+        
+        The (variant, config) pairs are ordered and pruned by the search's win
+        statistics. Texts come back in that order regardless of pool size, so the
+        selection picks the same winner as a sequential run. Stops consuming as
+        soon as the search is done. When Tesseract runs are batched, pairs sharing
+        a config are moved next to each other (in order of their config's first
+        appearance) so they go through one run.
+        """
         texts = []
-        angles = [0, -1, 1, -2, 2, -3, 3, -5, 5, 90, 180, 270]
-        
-        for angle in angles:
-            try:
-                if angle == 0:
-                    rotated = image
-                else:
-                    rotated = image.rotate(angle, expand=True, fillcolor=255)
-                
-                # Quick preprocessing for rotated image
-                processed = self._standard_preprocessing(rotated)[0]
-                
-                # Quick OCR
-                text = pytesseract.image_to_string(processed, config='--psm 6')
-                if text.strip() and len(text) > 30:
+        if search is not None and search.stopped:
+            return texts
+        
+        pairs = [(variant, config) for variant in range(len(images)) for config in (configs or self.ocr_configs)]
+        if search is not None:
+            pairs = search.plan(strategy, pairs)
+        if ocr_pool.batch_size() > 1:
+            config_order = {}
+            for _, config in pairs:
+                config_order.setdefault(config, len(config_order))
+            pairs.sort(key=lambda pair: config_order[pair[1]])
+        
+        jobs = ((images[variant], config) for variant, config in pairs)
+        results = ocr_pool.imap_ocr(jobs, tally=search, deadline=search.deadline if search is not None else None,
+                                    words=OCR_USE_CONFIDENCE and search is not None)
+        try:
+            for (variant, config), result in zip(pairs, results):
+                text = result.text
+                if text.strip() and len(text) > min_length:
                     texts.append(text)
-                    
-            except Exception as e:
-                logger.warning(f"Rotation {angle}° failed: {e}")
-                continue
+                    if search is not None:
+                        search.offer(text, combination_key(strategy, variant, config), result.mean_confidence)
+                        if search.stopped:
+                            break
+        finally:
+            results.close()
         
         return texts
     
-    def _extract_with_multiple_configs(self, image: Image.Image) -> List[str]:
-        """Extract text using multiple OCR configurations."""
-        texts = []
+    def score_text(self, text: str) -> float:
+        """Score extracted text based on quality indicators."""
+        score = 0.0
         
-        for config in self.ocr_configs:
-            try:
-                text = pytesseract.image_to_string(image, config=config)
-                if text.strip() and len(text) > 15:
-                    texts.append(text)
-            except Exception as e:
-                logger.warning(f"OCR config {config[:20]}... failed: {e}")
-                continue
+        # Length score (longer is generally better)
+        score += min(len(text) / 1000, 1.0) * 30
         
-        return texts
+        # Proper name patterns
+        proper_names = len(re.findall(r'\b[A-Z][a-z]+\b', text))
+        score += proper_names * 2
+        
+        # Date patterns
+        date_patterns = len(re.findall(r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b|\b[A-Z][a-z]+ \d{1,2}, \d{4}\b', text))
+        score += date_patterns * 10
+        
+        # Penalize excessive noise
+        noise_chars = len(re.findall(r'[^\w\s.,:/()-]', text))
+        score -= noise_chars * 0.5
+        
+        # Penalize fragmented text
+        single_chars = len(re.findall(r'\b\w\b', text))
+        score -= single_chars * 1
+        
+        return score
+    
+    def _candidate_score(self, text: str) -> float:
+        """Score used by the incremental search; matches the final selection."""
+        return self.score_text(text)
     
-    def _select_best_text(self, texts: List[str]) -> str:
+    def _select_best_text(self, texts: List[str], confidences: Optional[Dict[str, float]] = None) -> str:
         """Select the best text from multiple extractions."""
         if not texts:
             return ""
+        confidences = confidences or {}
         
         # Filter out very short texts
         valid_texts = [text for text in texts if len(text.strip()) > 50]
         if not valid_texts:
             valid_texts = texts
         
-        # Score texts based on quality indicators
-        def score_text(text: str) -> float:
-            score = 0.0
-            
-            # Length score (longer is generally better)
-            score += min(len(text) / 1000, 1.0) * 30
-            
-            # Proper name patterns
-            proper_names = len(re.findall(r'\b[A-Z][a-z]+\b', text))
-            score += proper_names * 2
-            
-            # Date patterns
-            date_patterns = len(re.findall(r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b|\b[A-Z][a-z]+ \d{1,2}, \d{4}\b', text))
-            score += date_patterns * 10
-            
-            # Penalize excessive noise
-            noise_chars = len(re.findall(r'[^\w\s.,:/()-]', text))
-            score -= noise_chars * 0.5
-            
-            # Penalize fragmented text
-            single_chars = len(re.findall(r'\b\w\b', text))
-            score -= single_chars * 1
-            
-            return score
-        
         # Select best text
-        scored_texts = [(score_text(text), text) for text in valid_texts]
+        scored_texts = [(blend_score(self.score_text(text), confidences.get(text)), text) for text in valid_texts]
         best_score, best_text = max(scored_texts, key=lambda x: x[0])
         
         logger.info(f"Selected best text with score {best_score:.2f} from {len(texts)} extractions")
@@ -489,6 +888,12 @@ class BaseDocumentProcessor:
 class BirthCertificateProcessor(BaseDocumentProcessor):
     """Specialized processor for Philippine NSO/PSA birth certificates with advanced preprocessing."""
     
+    document_type = 'birth_certificate'
+    
+    # Scored with score_nso_text: a clean scan has several indicators, fields and a date
+    early_exit_score = 120.0
+    
+    
     def __init__(self):
         super().__init__()
         # Birth certificate specific OCR configurations
@@ -529,34 +934,32 @@ class BirthCertificateProcessor(BaseDocumentProcessor):
             }
         }
     
-    def process_image(self, image: Image.Image) -> str:
-        """Enhanced processing for Philippine NSO birth certificates."""
-        # Apply NSO-specific preprocessing first
-        if CV2_AVAILABLE:
-            nso_processed = self._nso_specific_preprocessing(image)
+    def _strategies(self) -> List:
+        """Base strategies plus the NSO-specific preprocessing."""
+        strategies = super()._strategies()
+        if lazy_imports.cv2() is not None:
+            strategies.append(self._nso_specific_preprocessing)
         else:
-            nso_processed = self._pil_nso_preprocessing(image)
-        
-        # Get base processing results
-        base_results = super().process_image(image)
-        
-        # Process the NSO-enhanced images
-        nso_results = []
-        for processed_img in nso_processed:
-            texts = self._extract_with_multiple_configs(processed_img)
-            nso_results.extend(texts)
-        
-        # Combine all results
-        all_texts = [base_results] + nso_results
-        
-        # Apply NSO-specific corrections
-        corrected_texts = [self._apply_nso_corrections(text) for text in all_texts if text.strip()]
-        
-        # Select best result
-        return self._select_best_nso_text(corrected_texts)
+            strategies.append(self._pil_nso_preprocessing)
+        return strategies
+    
+    def _select_result(self, texts: List[str], search: OCRSearch) -> str:
+        """Apply the NSO corrections to every candidate and pick the best corrected text."""
+        # Remember which combination (and confidence) each corrected text came from
+        candidates = [(self._apply_nso_corrections(text), search.sources.get(text)) for text in texts if text.strip()]
+        corrected_texts = [corrected for corrected, _ in candidates]
+        confidences = {}
+        for text in texts:
+            if text in search.confidences:
+                confidences.setdefault(self._apply_nso_corrections(text), search.confidences[text])
+        
+        best_text = self._select_best_nso_text(corrected_texts, confidences)
+        search.winner = next((source for corrected, source in candidates if corrected == best_text), None)
+        return best_text
     
     def _nso_specific_preprocessing(self, image: Image.Image) -> List[Image.Image]:
         """Advanced NSO birth certificate preprocessing using OpenCV."""
+        cv2 = lazy_imports.cv2()
         results = []
         
         # Convert to numpy array
@@ -610,19 +1013,13 @@ class BirthCertificateProcessor(BaseDocumentProcessor):
             kernel_connect = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 1))
             connected = cv2.morphologyEx(clean, cv2.MORPH_CLOSE, kernel_connect)
             
-            # Intelligent upscaling
-            if connected.shape[1] < 3000:
-                scale = 3000 / connected.shape[1]
-                new_size = (int(connected.shape[1] * scale), int(connected.shape[0] * scale))
-                upscaled = cv2.resize(connected, new_size, interpolation=cv2.INTER_LANCZOS4)
-                results.append(Image.fromarray(upscaled))
-            else:
-                results.append(Image.fromarray(connected))
+            results.append(Image.fromarray(connected))
         
         return results
     
     def _correct_perspective_nso(self, gray):
         """Perspective correction optimized for NSO birth certificates."""
+        cv2 = lazy_imports.cv2()
         edges = cv2.Canny(gray, 50, 150, apertureSize=3)
         contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
         
@@ -681,12 +1078,6 @@ class BirthCertificateProcessor(BaseDocumentProcessor):
         # Enhanced mobile photo preprocessing
         processed = image.convert('L')
         
-        # Upscale significantly for mobile photos
-        if processed.width < 3000:
-            scale = 3000 / processed.width
-            new_size = (int(processed.width * scale), int(processed.height * scale))
-            processed = processed.resize(new_size, Image.LANCZOS)
-        
         # Heavy denoising for mobile photos
         for _ in range(3):
             processed = processed.filter(ImageFilter.MedianFilter(size=5))
@@ -788,118 +1179,126 @@ class BirthCertificateProcessor(BaseDocumentProcessor):
         
         return corrected.strip()
     
-    def _select_best_nso_text(self, texts: List[str]) -> str:
+    def score_nso_text(self, text: str) -> float:
+        """Score corrected text for NSO/PSA birth certificate content."""
+        score = 0.0
+        
+        # Base length score
+        score += min(len(text) / 1000, 1.0) * 20
+        
+        # NSO-specific indicators
+        nso_indicators = [
+            'republic of the philippines', 'philippine statistics authority',
+            'national statistics office', 'certificate of live birth',
+            'birth certificate', 'civil registrar', 'psa', 'nso'
+        ]
+        indicator_count = sum(1 for indicator in nso_indicators if indicator.lower() in text.lower())
+        score += indicator_count * 15
+        
+        # Birth certificate fields
+        fields = ['name', 'birth', 'date', 'place', 'father', 'mother', 'sex', 'citizenship']
+        field_count = sum(1 for field in fields if field.lower() in text.lower())
+        score += field_count * 5
+        
+        # Date patterns (crucial for birth certificates)
+        date_patterns = len(re.findall(r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b|\b[A-Z][a-z]+ \d{1,2}, \d{4}\b', text))
+        score += date_patterns * 25
+        
+        # Philippine locations
+        locations = ['philippines', 'manila', 'quezon', 'cebu', 'davao', 'benguet', 'baguio', 'la trinidad']
+        location_count = sum(1 for loc in locations if loc.lower() in text.lower())
+        score += location_count * 8
+        
+        # Proper names (likely person names)
+        proper_names = len(re.findall(r'\b[A-Z][a-z]+\b', text))
+        score += min(proper_names, 10) * 3
+        
+        # Penalize excessive noise
+        noise_chars = len(re.findall(r'[^\w\s.,:/()-]', text))
+        score -= noise_chars * 0.2
+        
+        # Penalize fragmented text
+        single_chars = len(re.findall(r'\b\w\b', text))
+        score -= single_chars * 0.5
+        
+        # Bonus for specific NSO patterns we know
+        if 'november 25, 2004' in text.lower():
+            score += 20
+        if 'benguet general hospital' in text.lower():
+            score += 15
+        if 'la trinidad' in text.lower():
+            score += 10
+        
+        return score
+    
+    def _candidate_score(self, text: str) -> float:
+        """The final selection ranks NSO-corrected text, so the search does too."""
+        return self.score_nso_text(self._apply_nso_corrections(text))
+    
+    def _select_best_nso_text(self, texts: List[str], confidences: Optional[Dict[str, float]] = None) -> str:
         """Enhanced text selection specifically for NSO birth certificates."""
         if not texts:
             return ""
-        
-        def score_nso_text(text: str) -> float:
-            score = 0.0
-            
-            # Base length score
-            score += min(len(text) / 1000, 1.0) * 20
-            
-            # NSO-specific indicators
-            nso_indicators = [
-                'republic of the philippines', 'philippine statistics authority',
-                'national statistics office', 'certificate of live birth',
-                'birth certificate', 'civil registrar', 'psa', 'nso'
-            ]
-            indicator_count = sum(1 for indicator in nso_indicators if indicator.lower() in text.lower())
-            score += indicator_count * 15
-            
-            # Birth certificate fields
-            fields = ['name', 'birth', 'date', 'place', 'father', 'mother', 'sex', 'citizenship']
-            field_count = sum(1 for field in fields if field.lower() in text.lower())
-            score += field_count * 5
-            
-            # Date patterns (crucial for birth certificates)
-            date_patterns = len(re.findall(r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b|\b[A-Z][a-z]+ \d{1,2}, \d{4}\b', text))
-            score += date_patterns * 25
-            
-            # Philippine locations
-            locations = ['philippines', 'manila', 'quezon', 'cebu', 'davao', 'benguet', 'baguio', 'la trinidad']
-            location_count = sum(1 for loc in locations if loc.lower() in text.lower())
-            score += location_count * 8
-            
-            # Proper names (likely person names)
-            proper_names = len(re.findall(r'\b[A-Z][a-z]+\b', text))
-            score += min(proper_names, 10) * 3
-            
-            # Penalize excessive noise
-            noise_chars = len(re.findall(r'[^\w\s.,:/()-]', text))
-            score -= noise_chars * 0.2
-            
-            # Penalize fragmented text
-            single_chars = len(re.findall(r'\b\w\b', text))
-            score -= single_chars * 0.5
-            
-            # Bonus for specific NSO patterns we know
-            if 'november 25, 2004' in text.lower():
-                score += 20
-            if 'benguet general hospital' in text.lower():
-                score += 15
-            if 'la trinidad' in text.lower():
-                score += 10
-            
-            return score
+        confidences = confidences or {}
         
         # Score all texts
         valid_texts = [text for text in texts if len(text.strip()) > 50]
         if not valid_texts:
             valid_texts = texts
         
-        scored_texts = [(score_nso_text(text), text) for text in valid_texts]
+        scored_texts = [(blend_score(self.score_nso_text(text), confidences.get(text)), text) for text in valid_texts]
         best_score, best_text = max(scored_texts, key=lambda x: x[0])
         
         logger.info(f"NSO Birth Certificate: Selected text with score {best_score:.2f} from {len(texts)} extractions")
         return best_text
     
-    def _select_best_text(self, texts: List[str]) -> str:
+    def score_text(self, text: str) -> float:
+        """Score extracted text for birth certificate content."""
+        score = 0.0
+        
+        # Base length score
+        score += min(len(text) / 1000, 1.0) * 30
+        
+        # Birth certificate specific keywords
+        birth_cert_keywords = [
+            'birth', 'certificate', 'republic', 'philippines', 'civil', 'registrar',
+            'child', 'father', 'mother', 'hospital', 'date', 'place', 'sex',
+            'citizenship', 'name', 'born', 'residence', 'occupation'
+        ]
+        keyword_count = sum(1 for keyword in birth_cert_keywords if keyword.lower() in text.lower())
+        score += keyword_count * 5
+        
+        # Names and proper nouns
+        proper_names = len(re.findall(r'\b[A-Z][a-z]+\b', text))
+        score += proper_names * 2
+        
+        # Date patterns
+        date_patterns = len(re.findall(r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b|\b[A-Z][a-z]+ \d{1,2}, \d{4}\b', text))
+        score += date_patterns * 15
+        
+        # Philippine location indicators
+        location_indicators = ['philippines', 'manila', 'quezon', 'cebu', 'davao', 'benguet', 'baguio']
+        location_count = sum(1 for loc in location_indicators if loc.lower() in text.lower())
+        score += location_count * 3
+        
+        # Penalize noise
+        noise_chars = len(re.findall(r'[^\w\s.,:/()-]', text))
+        score -= noise_chars * 0.3
+        
+        return score
+    
+    def _select_best_text(self, texts: List[str], confidences: Optional[Dict[str, float]] = None) -> str:
         """Enhanced text selection for birth certificates."""
         if not texts:
             return ""
-        
-        def score_birth_cert_text(text: str) -> float:
-            score = 0.0
-            
-            # Base length score
-            score += min(len(text) / 1000, 1.0) * 30
-            
-            # Birth certificate specific keywords
-            birth_cert_keywords = [
-                'birth', 'certificate', 'republic', 'philippines', 'civil', 'registrar',
-                'child', 'father', 'mother', 'hospital', 'date', 'place', 'sex',
-                'citizenship', 'name', 'born', 'residence', 'occupation'
-            ]
-            keyword_count = sum(1 for keyword in birth_cert_keywords if keyword.lower() in text.lower())
-            score += keyword_count * 5
-            
-            # Names and proper nouns
-            proper_names = len(re.findall(r'\b[A-Z][a-z]+\b', text))
-            score += proper_names * 2
-            
-            # Date patterns
-            date_patterns = len(re.findall(r'\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b|\b[A-Z][a-z]+ \d{1,2}, \d{4}\b', text))
-            score += date_patterns * 15
-            
-            # Philippine location indicators
-            location_indicators = ['philippines', 'manila', 'quezon', 'cebu', 'davao', 'benguet', 'baguio']
-            location_count = sum(1 for loc in location_indicators if loc.lower() in text.lower())
-            score += location_count * 3
-            
-            # Penalize noise
-            noise_chars = len(re.findall(r'[^\w\s.,:/()-]', text))
-            score -= noise_chars * 0.3
-            
-            return score
+        confidences = confidences or {}
         
         # Score and select best text
         valid_texts = [text for text in texts if len(text.strip()) > 50]
         if not valid_texts:
             valid_texts = texts
         
-        scored_texts = [(score_birth_cert_text(text), text) for text in valid_texts]
+        scored_texts = [(blend_score(self.score_text(text), confidences.get(text)), text) for text in valid_texts]
         best_score, best_text = max(scored_texts, key=lambda x: x[0])
         
         logger.info(f"Birth certificate: Selected text with score {best_score:.2f}")
@@ -909,36 +1308,41 @@ class BirthCertificateProcessor(BaseDocumentProcessor):
 class Form137Processor(BaseDocumentProcessor):
     """Specialized processor for Form 137 (Permanent Record)."""
     
-    def _select_best_text(self, texts: List[str]) -> str:
+    document_type = 'form137'
+    early_exit_score = 90.0
+    
+    def score_text(self, text: str) -> float:
+        """Score extracted text for Form 137 content."""
+        score = 0.0
+        
+        # Base length score
+        score += min(len(text) / 1000, 1.0) * 30
+        
+        # Form 137 specific keywords
+        form137_keywords = [
+            'form 137', 'permanent record', 'learner', 'lrn', 'school',
+            'grade', 'section', 'student', 'name', 'address'
+        ]
+        keyword_count = sum(1 for keyword in form137_keywords if keyword.lower() in text.lower())
+        score += keyword_count * 8
+        
+        # LRN pattern (important for Form 137)
+        lrn_patterns = len(re.findall(r'\b\d{12}\b|\bLRN\b', text, re.IGNORECASE))
+        score += lrn_patterns * 20
+        
+        return score
+    
+    def _select_best_text(self, texts: List[str], confidences: Optional[Dict[str, float]] = None) -> str:
         """Enhanced text selection for Form 137."""
         if not texts:
             return ""
-        
-        def score_form137_text(text: str) -> float:
-            score = 0.0
-            
-            # Base length score
-            score += min(len(text) / 1000, 1.0) * 30
-            
-            # Form 137 specific keywords
-            form137_keywords = [
-                'form 137', 'permanent record', 'learner', 'lrn', 'school',
-                'grade', 'section', 'student', 'name', 'address'
-            ]
-            keyword_count = sum(1 for keyword in form137_keywords if keyword.lower() in text.lower())
-            score += keyword_count * 8
-            
-            # LRN pattern (important for Form 137)
-            lrn_patterns = len(re.findall(r'\b\d{12}\b|\bLRN\b', text, re.IGNORECASE))
-            score += lrn_patterns * 20
-            
-            return score
+        confidences = confidences or {}
         
         valid_texts = [text for text in texts if len(text.strip()) > 30]
         if not valid_texts:
             valid_texts = texts
         
-        scored_texts = [(score_form137_text(text), text) for text in valid_texts]
+        scored_texts = [(blend_score(self.score_text(text), confidences.get(text)), text) for text in valid_texts]
         best_score, best_text = max(scored_texts, key=lambda x: x[0])
         
         logger.info(f"Form 137: Selected text with score {best_score:.2f}")
@@ -948,36 +1352,41 @@ class Form137Processor(BaseDocumentProcessor):
 class Form138Processor(BaseDocumentProcessor):
     """Specialized processor for Form 138 (Report Card)."""
     
-    def _select_best_text(self, texts: List[str]) -> str:
+    document_type = 'form138'
+    early_exit_score = 90.0
+    
+    def score_text(self, text: str) -> float:
+        """Score extracted text for Form 138 content."""
+        score = 0.0
+        
+        # Base length score
+        score += min(len(text) / 1000, 1.0) * 30
+        
+        # Form 138 specific keywords
+        form138_keywords = [
+            'form 138', 'report card', 'grades', 'subjects', 'quarter',
+            'school year', 'student', 'name', 'section'
+        ]
+        keyword_count = sum(1 for keyword in form138_keywords if keyword.lower() in text.lower())
+        score += keyword_count * 8
+        
+        # Grade patterns
+        grade_patterns = len(re.findall(r'\b\d{1,2}\.\d{1,2}\b|\b[A-F][+-]?\b', text))
+        score += grade_patterns * 5
+        
+        return score
+    
+    def _select_best_text(self, texts: List[str], confidences: Optional[Dict[str, float]] = None) -> str:
         """Enhanced text selection for Form 138."""
         if not texts:
             return ""
-        
-        def score_form138_text(text: str) -> float:
-            score = 0.0
-            
-            # Base length score
-            score += min(len(text) / 1000, 1.0) * 30
-            
-            # Form 138 specific keywords
-            form138_keywords = [
-                'form 138', 'report card', 'grades', 'subjects', 'quarter',
-                'school year', 'student', 'name', 'section'
-            ]
-            keyword_count = sum(1 for keyword in form138_keywords if keyword.lower() in text.lower())
-            score += keyword_count * 8
-            
-            # Grade patterns
-            grade_patterns = len(re.findall(r'\b\d{1,2}\.\d{1,2}\b|\b[A-F][+-]?\b', text))
-            score += grade_patterns * 5
-            
-            return score
+        confidences = confidences or {}
         
         valid_texts = [text for text in texts if len(text.strip()) > 30]
         if not valid_texts:
             valid_texts = texts
         
-        scored_texts = [(score_form138_text(text), text) for text in valid_texts]
+        scored_texts = [(blend_score(self.score_text(text), confidences.get(text)), text) for text in valid_texts]
         best_score, best_text = max(scored_texts, key=lambda x: x[0])
         
         logger.info(f"Form 138: Selected text with score {best_score:.2f}")
@@ -989,6 +1398,15 @@ class GenericDocumentProcessor(BaseDocumentProcessor):
     pass
 
 
+# Processor class per document type, instantiated lazily by DocumentOCRProcessor.get_processor
+PROCESSOR_CLASSES = {
+    'birth_certificate': BirthCertificateProcessor,
+    'form137': Form137Processor,
+    'form138': Form138Processor,
+    'generic': GenericDocumentProcessor
+}
+
+
 # Utility functions for text post-processing
 def apply_ocr_corrections(text: str, document_type: str = 'generic') -> str:
     """
@@ -1298,3 +1716,92 @@ def extract_generic_data(text: str) -> Dict[str, str]:
     """Extract generic data from text."""
     # Implementation for generic document data extraction
     return {}
+
+
+_serverless_processor: Optional[DocumentOCRProcessor] = None
+_serverless_lock = threading.Lock()
+
+
+def _read_document(document) -> bytes:
+    """Bytes of an upload given as bytes, a path or a file-like object (e.g. a werkzeug FileStorage)."""
+    if isinstance(document, (bytes, bytearray)):
+        return bytes(document)
+    if isinstance(document, (str, os.PathLike)):
+        with open(document, 'rb') as f:
+            return f.read()
+    return document.read()
+
+
+def process_document(document, document_type: str = 'auto', filename: Optional[str] = None,
+                     budget_seconds: Optional[float] = None) -> Dict:
+    """
+    Extract the text and fields of one document with the serverless profile.
+    
+    The entry point of the serverless function (api/ocr.py), and a plain function
+    for running the same pipeline locally. PDFs with a text layer are read without
+    OCR; scanned PDFs are OCR'd from their first page only.
+    
+    Args:
+        document: Raw bytes, a path or a file-like object
+        document_type: Type of document ('birth_certificate', 'form137', 'form138', 'generic', 'auto')
+        filename: Name of the upload (used with the file header to recognize PDFs)
+        budget_seconds: Hard time budget (default OCR_SERVERLESS_BUDGET_SECONDS); the
+            best text so far is returned when it runs out
+        
+    Returns:
+        Dictionary with the corrected 'text', the 'structured_data', the resolved
+        'document_type', the 'source' ('text_layer' or 'ocr'), the Tesseract calls
+        spent ('ocr_calls'), whether the budget cut the work short ('partial') and
+        the 'elapsed_seconds'
+    """
+    global _serverless_processor
+    started = time.monotonic()
+    deadline = Deadline(budget_seconds or OCR_SERVERLESS_BUDGET_SECONDS)
+    if filename is None:
+        filename = getattr(document, 'filename', None) or ''
+    data = _read_document(document)
+    
+    result = {'text': '', 'document_type': document_type, 'source': 'ocr', 'ocr_calls': 0, 'partial': False}
+    fields = {}
+    image_bytes = data
+    if data[:5] == b'%PDF-' or filename.lower().endswith('.pdf'):
+        image_bytes = None
+        text = '\n'.join(pdf_pages.text_layers(data)).strip()
+        if len(text) > 50:
+            result['text'] = text
+            result['source'] = 'text_layer'
+            if document_type == 'auto':
+                result['document_type'] = classify_header_text(text.lower())[0]
+        else:
+            # Closed right away so pdfplumber releases the document
+            with contextlib.closing(pdf_pages.render_pages(data, SERVERLESS_PDF_RESOLUTION, deadline=deadline,
+                                                           pages=[0])) as pages:
+                page = next(pages, None)
+            if page is not None:
+                buffer = io.BytesIO()
+                page.save(buffer, format='PNG', compress_level=1)
+                image_bytes = buffer.getvalue()
+    
+    if image_bytes is not None and not deadline_expired(deadline):
+        if _serverless_processor is None:
+            with _serverless_lock:
+                if _serverless_processor is None:
+                    _serverless_processor = DocumentOCRProcessor(tesseract_path=OCR_TESSERACT_CMD, profile='serverless')
+        extracted = _serverless_processor.extract_document(image_bytes, document_type, deadline)
+        result['text'] = extracted['text']
+        result['document_type'] = extracted['document_type']
+        result['ocr_calls'] = extracted['ocr_calls']
+        fields = extracted.get('fields') or {}
+    
+    document_type = result['document_type'] if result['document_type'] != 'auto' else 'generic'
+    result['document_type'] = document_type
+    structured_data = extract_structured_data(result['text'], document_type)
+    # Fields read from the form's template boxes beat the regex guesses
+    structured_data.update(fields)
+    result['structured_data'] = structured_data
+    result['text'] = apply_ocr_corrections(result['text'], document_type)
+    result['partial'] = deadline.tripped
+    result['elapsed_seconds'] = round(time.monotonic() - started, 3)
+    logger.info(f"process_document: {document_type} from {result['source']}, {result['ocr_calls']} OCR calls, "
+                f"{result['elapsed_seconds']}s, partial: {result['partial']}")
+    return result
@@ -0,0 +1,294 @@
+"""
+Page-parallel OCR for scanned PDFs.
+
+Form 137 permanent records are often several scanned pages. Instead of
+rendering and OCR'ing one page after the other, pages are rendered lazily in
+the request thread and each page is preprocessed and OCR'd by the shared
+process pool (see ocr_pool) as soon as it is rendered, so rendering the next
+page overlaps with recognizing the previous ones. Results are reassembled in
+page order.
+
+At most OCR_PDF_PAGES_IN_FLIGHT rendered pages exist at once: the next page is
+only rendered once an earlier one has been OCR'd.
+
+Text layers are judged page by page (iter_pdf): a typed cover page keeps its
+text layer and only the scanned or garbled pages behind it are rasterized and
+OCR'd. The merged result records the source of every page. Pages are yielded
+as they are read, so callers can stop once they have the fields they need and
+the remaining pages are never rendered.
+
+Pages are rendered at an adaptive DPI (page_resolution): never above the
+resolution of the scan embedded in the page, since that only adds pixels and
+no information, and never so high that the long side exceeds
+OCR_PDF_MAX_DIMENSION (a Legal-size page at 300 DPI is 4200 pixels tall). With
+OCR_PDF_DRAFT_RESOLUTION set, scanned pages are first OCR'd at that lower DPI
+and only re-rendered at the full DPI when the draft text scores poorly.
+
+Configuration:
+- OCR_PDF_RESOLUTION: highest DPI pages are rendered at (default 300)
+- OCR_PDF_MIN_RESOLUTION: lowest DPI chosen from a page's embedded scan (default 150)
+- OCR_PDF_MAX_DIMENSION: longest rendered side in pixels (default 3500)
+- OCR_PDF_DRAFT_RESOLUTION: DPI of the first pass, escalated on a poor score
+  (default 200, 0 renders at the full DPI right away)
+- OCR_PDF_PAGES_IN_FLIGHT: rendered pages held in memory at once (defaults to
+  the OCR pool worker count)
+- OCR_PDF_TEXT_MIN_SCORE: text layers scoring below this are OCR'd (default 30)
+- OCR_PDF_EARLY_STOP: stop reading pages once the required fields are found
+  (default 0; when enabled, requests can still opt out with full_history)
+"""
+
+import io
+import os
+import logging
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from PIL import Image
+
+import lazy_imports
+from ocr_pool import OCR_POOL_WORKERS, imap_ocr
+from deadline import Deadline, deadline_expired
+
+logger = logging.getLogger(__name__)
+
+OCR_PDF_RESOLUTION = int(os.environ.get('OCR_PDF_RESOLUTION', 300))
+OCR_PDF_MIN_RESOLUTION = int(os.environ.get('OCR_PDF_MIN_RESOLUTION', 150))
+OCR_PDF_MAX_DIMENSION = int(os.environ.get('OCR_PDF_MAX_DIMENSION', 3500))
+OCR_PDF_DRAFT_RESOLUTION = int(os.environ.get('OCR_PDF_DRAFT_RESOLUTION', 200))
+OCR_PDF_PAGES_IN_FLIGHT = int(os.environ.get('OCR_PDF_PAGES_IN_FLIGHT', max(OCR_POOL_WORKERS, 1)))
+OCR_PDF_TEXT_MIN_SCORE = float(os.environ.get('OCR_PDF_TEXT_MIN_SCORE', 30))
+OCR_PDF_EARLY_STOP = os.environ.get('OCR_PDF_EARLY_STOP', '0').lower() not in ('0', 'false', 'no')
+
+# OCR replaces a weak (non-empty) text layer only when it scores this much better
+OCR_SCORE_MARGIN = 10
+# An embedded image covering this much of the page is taken to be the page scan
+SCAN_MIN_COVERAGE = 0.5
+POINTS_PER_INCH = 72
+
+
+def native_resolution(page) -> Optional[float]:
+    """DPI of the scan embedded in a pdfplumber page, or None for pages without one."""
+    page_area = float(page.width * page.height)
+    best = None
+    for image in page.images:
+        width = (image['x1'] - image['x0']) / POINTS_PER_INCH
+        height = (image['bottom'] - image['top']) / POINTS_PER_INCH
+        if width <= 0 or height <= 0 or width * height * POINTS_PER_INCH ** 2 < page_area * SCAN_MIN_COVERAGE:
+            continue
+        source_width, source_height = image['srcsize']
+        dpi = max(source_width / width, source_height / height)
+        best = max(best or 0.0, dpi)
+    return best
+
+
+def page_resolution(page, max_resolution: int = OCR_PDF_RESOLUTION) -> int:
+    """
+    DPI to render a pdfplumber page at.
+
+    Args:
+        page: The page
+        max_resolution: Upper bound for the DPI
+
+    Returns:
+        max_resolution, lowered so the long side stays within OCR_PDF_MAX_DIMENSION
+        and to the resolution of the embedded scan (but not below
+        OCR_PDF_MIN_RESOLUTION for the scan)
+    """
+    long_side = max(page.width, page.height) / POINTS_PER_INCH
+    resolution = min(max_resolution, OCR_PDF_MAX_DIMENSION / long_side) if long_side > 0 else max_resolution
+    native = native_resolution(page)
+    if native:
+        resolution = min(resolution, max(native, OCR_PDF_MIN_RESOLUTION))
+    return max(int(round(resolution)), 1)
+
+
+def page_resolutions(pdf_bytes: bytes, max_resolution: int = OCR_PDF_RESOLUTION) -> List[int]:
+    """page_resolution of every page of a PDF."""
+    with lazy_imports.pdfplumber().open(io.BytesIO(pdf_bytes)) as pdf:
+        return [page_resolution(page, max_resolution) for page in pdf.pages]
+
+
+def page_pixels(pdf_bytes: bytes, max_resolution: int = OCR_PDF_RESOLUTION) -> List[int]:
+    """Pixel count of every page of a PDF when rendered at its page_resolution."""
+    with lazy_imports.pdfplumber().open(io.BytesIO(pdf_bytes)) as pdf:
+        pixels = []
+        for page in pdf.pages:
+            scale = page_resolution(page, max_resolution) / POINTS_PER_INCH
+            pixels.append(int(page.width * scale) * int(page.height * scale))
+        return pixels
+
+
+def render_pages(pdf_bytes: bytes, max_resolution: int = OCR_PDF_RESOLUTION,
+                 deadline: Optional[Deadline] = None,
+                 pages: Optional[Sequence[int]] = None) -> Iterator[Image.Image]:
+    """
+    Render the pages of a PDF in grayscale one at a time, stopping once the deadline expires.
+
+    Args:
+        pdf_bytes: The PDF
+        max_resolution: Highest DPI to render at, see page_resolution
+        deadline: Optional request deadline
+        pages: Zero-based numbers of the pages to render (default all)
+    """
+    with lazy_imports.pdfplumber().open(io.BytesIO(pdf_bytes)) as pdf:
+        selected = pdf.pages if pages is None else [pdf.pages[number] for number in pages]
+        for page in selected:
+            if deadline_expired(deadline):
+                return
+            resolution = page_resolution(page, max_resolution)
+            # Grayscale is all OCR needs and a third of the size to hand to a worker
+            image = page.to_image(resolution=resolution).original.convert('L')
+            logger.info(f"Rendered PDF page {page.page_number} at {resolution} DPI ({image.width}x{image.height})")
+            yield image
+            # Drop the parsed page objects pdfplumber keeps per page
+            page.flush_cache()
+
+
+def iter_ocr_pdf_pages(pdf_bytes: bytes, preprocess: Callable[[Image.Image], Image.Image],
+                       config: str = '', deadline: Optional[Deadline] = None,
+                       pages_in_flight: int = OCR_PDF_PAGES_IN_FLIGHT,
+                       pages: Optional[Sequence[int]] = None,
+                       max_resolution: int = OCR_PDF_RESOLUTION) -> Iterator[str]:
+    """
+    OCR the pages of a scanned PDF concurrently, yielding each page's text in page order.
+
+    Pages are only rendered as the window allows, so closing the iterator early
+    leaves the remaining pages unrendered (and cancels queued ones).
+
+    Args:
+        pdf_bytes: The PDF
+        preprocess: Turns a rendered page into the image handed to Tesseract;
+            runs in the pool workers, so it must be a module-level function
+        config: Tesseract config for every page
+        deadline: Optional request deadline; pages not started before it
+            expires are skipped
+        pages_in_flight: Maximum number of rendered pages held at once
+        pages: Zero-based numbers of the pages to OCR (default all)
+        max_resolution: Highest DPI to render at, see page_resolution
+    """
+    def jobs() -> Iterator[Tuple[Image.Image, str]]:
+        for page in render_pages(pdf_bytes, max_resolution, deadline=deadline, pages=pages):
+            yield page, config
+
+    # One page per job so pages are recognized in parallel rather than batched
+    # into a single Tesseract run
+    results = imap_ocr(jobs(), deadline=deadline, window=max(pages_in_flight, 1), batch=1, prepare=preprocess)
+    try:
+        for result in results:
+            yield result.text
+    finally:
+        results.close()
+
+
+def ocr_pdf_pages(pdf_bytes: bytes, preprocess: Callable[[Image.Image], Image.Image],
+                  config: str = '', deadline: Optional[Deadline] = None,
+                  pages_in_flight: int = OCR_PDF_PAGES_IN_FLIGHT,
+                  pages: Optional[Sequence[int]] = None,
+                  max_resolution: int = OCR_PDF_RESOLUTION) -> List[str]:
+    """
+    OCR every page of a scanned PDF concurrently.
+
+    Returns:
+        Text of each page that was read, in page order (see iter_ocr_pdf_pages
+        for the arguments)
+    """
+    return list(iter_ocr_pdf_pages(pdf_bytes, preprocess, config, deadline, pages_in_flight, pages, max_resolution))
+
+
+def page_count(pdf_bytes: bytes) -> int:
+    """Number of pages of a PDF."""
+    with lazy_imports.pdfplumber().open(io.BytesIO(pdf_bytes)) as pdf:
+        return len(pdf.pages)
+
+
+def text_layers(pdf_bytes: bytes) -> List[str]:
+    """Embedded text of every page of a PDF ('' for pages without a text layer)."""
+    with lazy_imports.pdfplumber().open(io.BytesIO(pdf_bytes)) as pdf:
+        return [page.extract_text() or "" for page in pdf.pages]
+
+
+def iter_pdf(pdf_bytes: bytes, score: Callable[[str], float],
+             preprocess: Callable[[Image.Image], Image.Image],
+             deadline: Optional[Deadline] = None,
+             min_score: float = OCR_PDF_TEXT_MIN_SCORE,
+             draft_resolution: int = OCR_PDF_DRAFT_RESOLUTION) -> Iterator[Tuple[str, Dict]]:
+    """
+    Read a PDF page by page from its text layer, OCR'ing only the pages whose
+    text layer is missing or scores below min_score.
+
+    Pages are OCR'd at draft_resolution first; a page whose draft text scores
+    below min_score is rendered and OCR'd again at its full resolution.
+
+    Pages are yielded in order as soon as they are read, so a caller that has
+    what it needs can stop early: closing the iterator stops rendering and
+    OCR'ing the remaining pages.
+
+    Args:
+        pdf_bytes: The PDF
+        score: Text quality score (e.g. evaluate_text_quality)
+        preprocess: Page preprocessing for OCR, see iter_ocr_pdf_pages
+        deadline: Optional request deadline; pages that could not be OCR'd in
+            time keep their text layer
+        min_score: Text layers (and draft OCR texts) scoring below this are
+            (re-)OCR'd
+        draft_resolution: DPI of the first OCR pass (0 for none)
+
+    Yields:
+        (page text, {'page', 'source', 'score'}) with source 'text' or 'ocr'
+    """
+    texts = text_layers(pdf_bytes)
+    scores = [score(text) if text.strip() else 0.0 for text in texts]
+
+    weak = [number for number, text in enumerate(texts) if not text.strip() or scores[number] < min_score]
+    if weak:
+        logger.info(f"OCR'ing PDF pages {[number + 1 for number in weak]} of {len(texts)}")
+    weak_pages = set(weak)
+
+    # Only pages whose full DPI is above the draft DPI get a draft pass
+    full_resolutions = page_resolutions(pdf_bytes) if weak and draft_resolution > 0 else []
+    draft = bool(full_resolutions) and any(full_resolutions[number] > draft_resolution for number in weak)
+    ocr_texts = iter_ocr_pdf_pages(pdf_bytes, preprocess, deadline=deadline, pages=weak,
+                                   max_resolution=draft_resolution if draft else OCR_PDF_RESOLUTION)
+
+    try:
+        for number, text in enumerate(texts):
+            page_score, source = scores[number], 'text'
+            # OCR results arrive in page order; none left means the deadline ran out
+            ocr_text = next(ocr_texts, None) if number in weak_pages else None
+            if ocr_text is not None:
+                ocr_score = score(ocr_text)
+                if draft and ocr_score < min_score and full_resolutions[number] > draft_resolution:
+                    ocr_text, ocr_score = _escalate(pdf_bytes, number, preprocess, score, deadline,
+                                                    ocr_text, ocr_score)
+                # An empty text layer always yields; a garbled one only to clearly better OCR
+                if not text.strip() or ocr_score > page_score + OCR_SCORE_MARGIN:
+                    text, page_score, source = ocr_text, ocr_score, 'ocr'
+            yield text, {'page': number + 1, 'source': source, 'score': round(page_score, 2)}
+    finally:
+        ocr_texts.close()
+
+
+def _escalate(pdf_bytes: bytes, number: int, preprocess: Callable[[Image.Image], Image.Image],
+              score: Callable[[str], float], deadline: Optional[Deadline],
+              draft_text: str, draft_score: float) -> Tuple[str, float]:
+    """OCR a page again at its full resolution after a poor draft; returns the better text and score."""
+    logger.info(f"PDF page {number + 1} draft OCR scored {draft_score:.1f}, rendering at full resolution")
+    texts = ocr_pdf_pages(pdf_bytes, preprocess, deadline=deadline, pages=[number])
+    if texts:
+        full_score = score(texts[0])
+        if full_score > draft_score:
+            return texts[0], full_score
+    return draft_text, draft_score
+
+
+def read_pdf(pdf_bytes: bytes, score: Callable[[str], float],
+             preprocess: Callable[[Image.Image], Image.Image],
+             deadline: Optional[Deadline] = None,
+             min_score: float = OCR_PDF_TEXT_MIN_SCORE) -> Tuple[List[str], List[Dict]]:
+    """
+    Read every page of a PDF, see iter_pdf.
+
+    Returns:
+        Tuple of (text of every page, one {'page', 'source', 'score'} entry per page)
+    """
+    pages = list(iter_pdf(pdf_bytes, score, preprocess, deadline, min_score))
+    return [text for text, _ in pages], [source for _, source in pages]
@@ -0,0 +1,78 @@
+"""
+Resolution pyramid for OCR.
+
+Upscaling a page to 2000-3500px before every Tesseract pass multiplies its
+cost by the pixel count, and most phone photos are already legible at native
+size. In 'pyramid' mode the page is first OCR'd at the smallest scale where its
+measured text height is adequate, and larger scales are tried only when the
+best candidate's quality score falls short.
+
+The page is prepared (grayscale, deskew) and measured once; every level is
+resized from that prepared page and cached, so an escalation never redoes the
+earlier stages.
+
+Configuration:
+- OCR_SCALE_MODE: 'pyramid' (default) or 'fixed' (a single level that brings
+  the text to OCR_TARGET_TEXT_HEIGHT, see text_metrics)
+- OCR_MIN_TEXT_HEIGHT: character height in pixels considered legible (default 20)
+- OCR_PYRAMID_STEP: scale factor between levels (default 1.5)
+- OCR_PYRAMID_LEVELS: maximum number of levels (default 3)
+"""
+
+import os
+import logging
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+from text_metrics import OCR_MAX_SCALED_WIDTH, estimate_text_height, ocr_scale, resize_by
+
+logger = logging.getLogger(__name__)
+
+OCR_SCALE_MODE = os.environ.get('OCR_SCALE_MODE', 'pyramid').lower()
+OCR_MIN_TEXT_HEIGHT = float(os.environ.get('OCR_MIN_TEXT_HEIGHT', 20))
+OCR_PYRAMID_STEP = float(os.environ.get('OCR_PYRAMID_STEP', 1.5))
+OCR_PYRAMID_LEVELS = int(os.environ.get('OCR_PYRAMID_LEVELS', 3))
+
+
+class ResolutionPyramid:
+    """Lazily built, cached scaled copies of one prepared page."""
+
+    def __init__(self, image: Image.Image, scales: List[float], text_height: Optional[float] = None):
+        self.image = image
+        self.scales = scales
+        self.text_height = text_height
+        self._levels: Dict[float, Image.Image] = {}
+
+    @classmethod
+    def for_page(cls, image: Image.Image) -> 'ResolutionPyramid':
+        """Build the pyramid for a page from its measured text height."""
+        text_height = estimate_text_height(image)
+        # Smallest scale at which the text is legible (shrinking pages with large glyphs)
+        scales = [ocr_scale(text_height, image.width, OCR_MIN_TEXT_HEIGHT)]
+        max_scale = max(1.0, OCR_MAX_SCALED_WIDTH / image.width)
+        while len(scales) < OCR_PYRAMID_LEVELS and scales[-1] < max_scale:
+            scales.append(min(scales[-1] * OCR_PYRAMID_STEP, max_scale))
+
+        logger.info(f"Resolution pyramid: text height {text_height and round(text_height, 1)}px, "
+                    f"scales {[round(scale, 2) for scale in scales]}")
+        return cls(image, scales, text_height)
+
+    @classmethod
+    def single(cls, image: Image.Image) -> 'ResolutionPyramid':
+        """A one-level pyramid at the scale that brings the text to the target height."""
+        text_height = estimate_text_height(image)
+        return cls(image, [ocr_scale(text_height, image.width)], text_height)
+
+    @classmethod
+    def for_mode(cls, image: Image.Image) -> 'ResolutionPyramid':
+        """Pyramid for the configured OCR_SCALE_MODE."""
+        if OCR_SCALE_MODE == 'pyramid':
+            return cls.for_page(image)
+        return cls.single(image)
+
+    def level(self, scale: float) -> Image.Image:
+        """The page at the given scale, resized once and cached."""
+        if scale not in self._levels:
+            self._levels[scale] = resize_by(self.image, scale)
+        return self._levels[scale]
@@ -0,0 +1,183 @@
+"""
+Content-addressed cache for extraction results.
+
+Parents and registrars re-upload the same scan many times (retries, edits, the
+Node backend retrying after its timeout). Results are keyed by a hash of the
+uploaded bytes, the requested document type and the pipeline version, so a
+repeat upload skips OCR entirely. The pipeline version also covers the
+OCR_TEMPLATES_PATH file, so recalibrated template boxes invalidate old results
+without a code change.
+
+Two tiers:
+- in-memory LRU, evicted by the serialized size of the stored results
+- optional on-disk JSON store that survives restarts
+
+Configuration:
+- OCR_CACHE_MAX_MB: memory tier budget in megabytes (default 64, 0 disables it)
+- OCR_CACHE_DIR: directory for the disk tier (disabled when unset)
+"""
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever OCR or field extraction output changes so stale results are not served
+# 2.2.0: deskew/OSD, confidence blending, zonal template fields, per-page PDF routing
+# 2.2.1: layout orientation cue no longer turns upright pages sideways
+PIPELINE_VERSION = '2.2.1'
+
+OCR_CACHE_MAX_MB = float(os.environ.get('OCR_CACHE_MAX_MB', 64))
+OCR_CACHE_DIR = os.environ.get('OCR_CACHE_DIR', '')
+
+
+def _templates_fingerprint() -> str:
+    """Short hash of the OCR_TEMPLATES_PATH file ('' when none is configured)."""
+    path = os.environ.get('OCR_TEMPLATES_PATH', '')
+    if not path:
+        return ''
+    try:
+        with open(path, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()[:8]
+    except OSError:
+        # form_templates falls back to the built-in templates
+        return ''
+
+
+def pipeline_version() -> str:
+    """PIPELINE_VERSION plus the fingerprint of the configured template file."""
+    fingerprint = _templates_fingerprint()
+    return f"{PIPELINE_VERSION}+{fingerprint}" if fingerprint else PIPELINE_VERSION
+
+
+class ResultCache:
+    """Two-tier (memory LRU + optional disk) cache of JSON-serializable results."""
+
+    def __init__(self, max_bytes: int, disk_dir: Optional[str] = None):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir or None
+        self._entries = OrderedDict()  # key -> (payload, size)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.pipeline_version = pipeline_version()
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def make_key(self, data: bytes, document_type: str = '') -> str:
+        """Key for an upload: content hash + document type + pipeline version."""
+        digest = hashlib.sha256(data).hexdigest()
+        return f"{digest}-{document_type or 'auto'}-{self.pipeline_version}"
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(entry[0])
+
+        payload = self._read_disk(key)
+        if payload is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # Promote disk hits into memory
+        self._put_memory(key, payload)
+        with self._lock:
+            self.hits += 1
+        return json.loads(payload)
+
+    def contains(self, key: str) -> bool:
+        """True when a result is cached under key (not counted as a hit or miss)."""
+        with self._lock:
+            if key in self._entries:
+                return True
+        return bool(self.disk_dir) and os.path.exists(self._disk_path(key))
+
+    def set(self, key: str, value: Dict) -> None:
+        try:
+            payload = json.dumps(value)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Result not cacheable: {e}")
+            return
+        self._put_memory(key, payload)
+        self._write_disk(key, payload)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'disk_dir': self.disk_dir,
+                'pipeline_version': self.pipeline_version
+            }
+
+    def _put_memory(self, key: str, payload: str) -> None:
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._entries[key] = (payload, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[str]:
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key), 'r', encoding='utf-8') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Result cache read failed: {e}")
+            return None
+
+    def _write_disk(self, key: str, payload: str) -> None:
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file first so readers never see a partial entry
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Result cache write failed: {e}")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ResultCache:
+    """Return the process-wide result cache."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache(int(OCR_CACHE_MAX_MB * 1024 * 1024), OCR_CACHE_DIR)
+    return _cache
@@ -0,0 +1,157 @@
+"""
+Production entry point for the OCR extraction services.
+
+    python serve.py [extractor_api | extractor_api_optimized | enhanced_extractor]
+
+Runs the Flask app (extractor_api by default) under gunicorn instead of the
+single-process debug server. The app module, the DocumentOCRProcessor and the
+dependencies lazy_imports otherwise defers (OpenCV, pdfplumber, Tesseract
+bindings) are loaded once in the master before it forks, so the workers share
+those pages copy-on-write. Each worker then runs the OCR warm-up
+(warmup.py) before it accepts connections, and starts the job queue workers.
+
+Workers are recycled after SERVE_MAX_REQUESTS requests, or as soon as the
+worker and its OCR pool processes together use more than SERVE_MAX_RSS_MB, to
+contain the memory PIL and OpenCV never hand back.
+
+Configuration:
+- SERVE_BIND: address to listen on (default 0.0.0.0:5001, :5002 for
+  enhanced_extractor)
+- SERVE_WORKERS: gunicorn worker processes (default half the CPU count, at least 2)
+- SERVE_THREADS: request threads per worker (default twice the CPUs per
+  worker, at least 2); uploads, event streams and job polls mostly wait
+- SERVE_TIMEOUT: seconds a busy worker may go silent before it is killed (default 120)
+- SERVE_MAX_REQUESTS: recycle a worker after this many requests (default 500,
+  0 disables), plus up to 10% jitter so workers do not restart together
+- SERVE_MAX_RSS_MB: recycle a worker above this resident size (default 1536, 0 disables)
+- OCR_POOL_WORKERS: defaults to the CPUs per worker, so the pools of all
+  workers together use every core once
+"""
+
+import os
+import gc
+import sys
+import logging
+import importlib
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+APPS = {
+    'extractor_api': 5001,
+    'extractor_api_optimized': 5001,
+    'enhanced_extractor': 5002,
+}
+
+CPU_COUNT = os.cpu_count() or 1
+
+SERVE_WORKERS = int(os.environ.get('SERVE_WORKERS', max(CPU_COUNT // 2, 2)))
+CPUS_PER_WORKER = max(CPU_COUNT // SERVE_WORKERS, 1)
+SERVE_THREADS = int(os.environ.get('SERVE_THREADS', max(CPUS_PER_WORKER * 2, 2)))
+SERVE_TIMEOUT = int(os.environ.get('SERVE_TIMEOUT', 120))
+SERVE_MAX_REQUESTS = int(os.environ.get('SERVE_MAX_REQUESTS', 500))
+SERVE_MAX_RSS_MB = float(os.environ.get('SERVE_MAX_RSS_MB', 1536))
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def rss_bytes(pids: Iterable[int]) -> Optional[int]:
+    """Resident set size summed over the processes, None where /proc is not available."""
+    total = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/statm') as statm:
+                total += int(statm.read().split()[1]) * _PAGE_SIZE
+        except FileNotFoundError:
+            if pid == os.getpid():
+                return None
+            # A pool worker that already exited
+        except (OSError, ValueError, IndexError):
+            return None
+    return total
+
+
+def load_app(name: str):
+    """Import the service in the master: the processor, OpenCV and Tesseract bindings load before the fork."""
+    # The pool size is read when ocr_pool is imported
+    os.environ.setdefault('OCR_POOL_WORKERS', str(CPUS_PER_WORKER))
+    module = importlib.import_module(name)
+    import lazy_imports
+    lazy_imports.preload()
+    # Keep the collector from touching (and so copying) the preloaded objects in every worker
+    gc.freeze()
+    return module
+
+
+def post_worker_init(worker) -> None:
+    """Warm up, then start the job queue, before the worker accepts connections."""
+    import lazy_imports
+    import warmup
+    # Time from the fork to here; the warm-up reports its own duration
+    lazy_imports.record_startup(worker.app.module_name)
+    module = sys.modules.get(worker.app.module_name)
+    if warmup.OCR_WARMUP:
+        warmup.warm_up(getattr(module, 'ocr_processor', None))
+    start_jobs = getattr(module, '_job_queue', None)
+    if start_jobs is not None:
+        start_jobs()
+
+
+def post_request(worker, req, environ, resp) -> None:
+    """Retire the worker once it and its OCR pool grew past the RSS ceiling."""
+    if SERVE_MAX_RSS_MB <= 0 or not worker.alive:
+        return
+    import ocr_pool
+    rss = rss_bytes([os.getpid()] + ocr_pool.worker_pids())
+    if rss is not None and rss > SERVE_MAX_RSS_MB * 1024 * 1024:
+        logger.warning(f"Worker {os.getpid()} uses {rss / 1024 / 1024:.0f} MB "
+                       f"(limit {SERVE_MAX_RSS_MB:.0f} MB), recycling it")
+        # The worker finishes its in-flight requests and the arbiter starts a fresh one
+        worker.alive = False
+
+
+def worker_exit(server, worker) -> None:
+    import ocr_pool
+    ocr_pool.shutdown()
+
+
+def main(argv=None) -> None:
+    from gunicorn.app.base import BaseApplication
+
+    argv = sys.argv[1:] if argv is None else argv
+    name = argv[0] if argv else 'extractor_api'
+    if name not in APPS:
+        sys.exit(f"Unknown service {name!r}, expected one of: {', '.join(APPS)}")
+
+    class Service(BaseApplication):
+        module_name = name
+
+        def load_config(self):
+            options = {
+                'bind': os.environ.get('SERVE_BIND', f'0.0.0.0:{APPS[name]}'),
+                'workers': SERVE_WORKERS,
+                'worker_class': 'gthread',
+                'threads': SERVE_THREADS,
+                'timeout': SERVE_TIMEOUT,
+                'graceful_timeout': SERVE_TIMEOUT,
+                'max_requests': SERVE_MAX_REQUESTS,
+                'max_requests_jitter': SERVE_MAX_REQUESTS // 10,
+                'preload_app': True,
+                'post_worker_init': post_worker_init,
+                'post_request': post_request,
+                'worker_exit': worker_exit,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return load_app(name).app
+
+    logging.basicConfig(level=logging.INFO)
+    logger.info(f"Serving {name} with {SERVE_WORKERS} workers x {SERVE_THREADS} threads, "
+                f"{os.environ.get('OCR_POOL_WORKERS', CPUS_PER_WORKER)} OCR pool processes each")
+    Service().run()
+
+
+if __name__ == '__main__':
+    main()
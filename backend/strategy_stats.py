@@ -0,0 +1,185 @@
+"""
+Win statistics for OCR candidate combinations.
+
+Every processed image records which (preprocessing strategy, variant, Tesseract
+config) produced the selected text for its document type. The table is persisted
+to a local JSON file and used to try historically winning combinations first and
+to skip combinations that (almost) never win.
+
+Configuration:
+- OCR_STATS_PATH: JSON file for the table (default backend/ocr_strategy_stats.json,
+  empty disables recording)
+- OCR_STATS_MIN_SAMPLES: documents of a type required before pruning starts (default 50)
+- OCR_STATS_PRUNE_BELOW: win rate under which a combination is skipped (default 0.01)
+- OCR_STATS_EXPLORE_EVERY: every Nth document of a type runs unpruned so rarely
+  winning combinations can recover (default 20)
+"""
+
+import os
+import json
+import logging
+import tempfile
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+OCR_STATS_PATH = os.environ.get(
+    'OCR_STATS_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ocr_strategy_stats.json'))
+OCR_STATS_MIN_SAMPLES = int(os.environ.get('OCR_STATS_MIN_SAMPLES', 50))
+OCR_STATS_PRUNE_BELOW = float(os.environ.get('OCR_STATS_PRUNE_BELOW', 0.01))
+OCR_STATS_EXPLORE_EVERY = int(os.environ.get('OCR_STATS_EXPLORE_EVERY', 20))
+
+
+def combination_key(strategy: str, variant: int, config: str) -> str:
+    """Stable string key for a (strategy, variant, config) combination."""
+    return f"{strategy}|{variant}|{config}"
+
+
+def combination_strategy(key: str) -> str:
+    """Strategy name of a combination key."""
+    return key.split('|', 1)[0]
+
+
+class StrategyStats:
+    """Per-document-type win counts, persisted as JSON."""
+
+    def __init__(self, path: Optional[str] = None, min_samples: int = OCR_STATS_MIN_SAMPLES,
+                 prune_below: float = OCR_STATS_PRUNE_BELOW, explore_every: int = OCR_STATS_EXPLORE_EVERY):
+        self.path = path or None
+        self.min_samples = min_samples
+        self.prune_below = prune_below
+        self.explore_every = explore_every
+        self._lock = threading.Lock()
+        # {document_type: {'runs': int, 'wins': {key: int}}}
+        self._table = self._load()
+        # Counts recorded by this process since the last save, merged on save so
+        # several service processes can share one file
+        self._pending = {}
+
+    def _load(self) -> Dict:
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load strategy stats from {self.path}: {e}")
+            return {}
+
+    def runs(self, document_type: str) -> int:
+        with self._lock:
+            return self._table.get(document_type, {}).get('runs', 0)
+
+    def should_explore(self, document_type: str) -> bool:
+        """True for the documents that run the full, unpruned candidate set."""
+        runs = self.runs(document_type)
+        return runs < self.min_samples or (self.explore_every > 0 and runs % self.explore_every == 0)
+
+    def record(self, document_type: str, winner: Optional[str]) -> None:
+        """Record one processed document and the combination that won it (if known)."""
+        if not self.path:
+            return
+        with self._lock:
+            for table in (self._table, self._pending):
+                entry = table.setdefault(document_type, {'runs': 0, 'wins': {}})
+                entry['runs'] += 1
+                if winner:
+                    entry['wins'][winner] = entry['wins'].get(winner, 0) + 1
+        self.save()
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            merged = self._load()
+            for document_type, delta in pending.items():
+                entry = merged.setdefault(document_type, {'runs': 0, 'wins': {}})
+                entry['runs'] += delta['runs']
+                for key, count in delta['wins'].items():
+                    entry['wins'][key] = entry['wins'].get(key, 0) + count
+            try:
+                directory = os.path.dirname(self.path) or '.'
+                fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(merged, f, indent=1, sort_keys=True)
+                os.replace(tmp_path, self.path)
+                self._table = merged
+            except OSError as e:
+                logger.warning(f"Could not save strategy stats to {self.path}: {e}")
+
+    def win_rate(self, document_type: str, key: str) -> float:
+        with self._lock:
+            entry = self._table.get(document_type)
+            if not entry or not entry['runs']:
+                return 0.0
+            return entry['wins'].get(key, 0) / entry['runs']
+
+    def order_strategies(self, document_type: str, strategies: List[str]) -> List[str]:
+        """Strategies sorted by total wins, ties keep their original order."""
+        with self._lock:
+            wins = self._table.get(document_type, {}).get('wins', {})
+            totals = {name: 0 for name in strategies}
+            for key, count in wins.items():
+                name = combination_strategy(key)
+                if name in totals:
+                    totals[name] += count
+        return sorted(strategies, key=lambda name: -totals[name])
+
+    def plan(self, document_type: str, strategy: str, pairs: List[Tuple[int, str]],
+             explore: bool = False) -> List[Tuple[int, str]]:
+        """
+        Order a strategy's (variant, config) pairs by win count and drop rarely winning ones.
+
+        Pruning only starts after min_samples documents of the type and is skipped when
+        exploring. At least the best pair is always kept.
+        """
+        with self._lock:
+            entry = self._table.get(document_type, {'runs': 0, 'wins': {}})
+            runs = entry['runs']
+            wins = {pair: entry['wins'].get(combination_key(strategy, *pair), 0) for pair in pairs}
+
+        ordered = sorted(pairs, key=lambda pair: -wins[pair])
+        if explore or runs < self.min_samples or self.prune_below <= 0:
+            return ordered
+
+        kept = [pair for pair in ordered if wins[pair] / runs >= self.prune_below]
+        return kept or ordered[:1]
+
+    def table(self) -> Dict:
+        """Win-rate table per document type, most frequent winners first."""
+        with self._lock:
+            snapshot = json.loads(json.dumps(self._table))
+
+        report = {}
+        for document_type, entry in snapshot.items():
+            runs = entry['runs']
+            rows = []
+            for key, count in sorted(entry['wins'].items(), key=lambda item: -item[1]):
+                strategy, variant, config = key.split('|', 2)
+                win_rate = count / runs if runs else 0.0
+                rows.append({
+                    'strategy': strategy,
+                    'variant': int(variant),
+                    'config': config,
+                    'wins': count,
+                    'win_rate': round(win_rate, 4),
+                    'pruned': runs >= self.min_samples and win_rate < self.prune_below
+                })
+            report[document_type] = {'runs': runs, 'combinations': rows}
+        return report
+
+
+_stats = None
+_stats_lock = threading.Lock()
+
+
+def get_stats() -> StrategyStats:
+    """Return the process-wide strategy statistics."""
+    global _stats
+    if _stats is None:
+        with _stats_lock:
+            if _stats is None:
+                _stats = StrategyStats(OCR_STATS_PATH)
+    return _stats
@@ -0,0 +1,179 @@
+"""
+Concurrency, queueing and rejection checks for admission.py.
+
+    python test_admission.py    (or: python -m pytest test_admission.py)
+"""
+
+import io
+import time
+import threading
+
+from PIL import Image
+
+import admission
+from admission import AdmissionController, AdmissionRejected, document_cost
+
+
+class Holder:
+    """Holds an extraction slot on a background thread until released"""
+
+    def __init__(self, controller, cost=1.0, **kwargs):
+        self.admitted = threading.Event()
+        self.release = threading.Event()
+        self.waited = None
+        self.error = None
+        self.thread = threading.Thread(target=self._run, args=(controller, cost, kwargs), daemon=True)
+        self.thread.start()
+
+    def _run(self, controller, cost, kwargs):
+        try:
+            with controller.admit(cost, **kwargs) as waited:
+                self.waited = waited
+                self.admitted.set()
+                self.release.wait(5)
+        except AdmissionRejected as e:
+            self.error = e
+
+    def done(self):
+        self.release.set()
+        self.thread.join(5)
+
+
+def rejection(controller, cost=1.0, **kwargs):
+    try:
+        with controller.admit(cost, **kwargs):
+            pass
+    except AdmissionRejected as e:
+        return e
+    raise AssertionError('the extraction was admitted')
+
+
+def png(width, height):
+    buffer = io.BytesIO()
+    Image.new('L', (width, height), 255).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def test_disabled_admits_everything():
+    controller = AdmissionController(concurrency=0)
+    with controller.admit(1000.0) as waited, controller.admit(1000.0):
+        assert waited == 0.0
+    controller.check()
+
+
+def test_queue_full():
+    controller = AdmissionController(concurrency=1, queue_depth=0, max_wait=60)
+    holder = Holder(controller)
+    try:
+        assert holder.admitted.wait(5)
+        error = rejection(controller)
+        assert error.reason == 'queue full' and error.retry_after >= 1
+        try:
+            controller.check()
+        except AdmissionRejected:
+            pass
+        else:
+            raise AssertionError('check() let a request through a full queue')
+        # Background jobs are not bounded by the queue depth
+        waiter = Holder(controller, bounded=False, timeout=5)
+        time.sleep(0.05)
+        assert not waiter.admitted.is_set()
+    finally:
+        holder.done()
+    assert waiter.admitted.wait(5)
+    waiter.done()
+    assert waiter.waited >= 0.05
+    assert controller.stats()['rejected'] == 2
+
+
+def test_estimated_wait_rejection_and_retry_after():
+    controller = AdmissionController(concurrency=1, queue_depth=4, max_wait=20, initial_rate=1.0)
+    holder = Holder(controller, cost=100.0)
+    try:
+        assert holder.admitted.wait(5)
+        error = rejection(controller)
+        assert error.reason == 'estimated wait too long'
+        assert 95 <= error.retry_after <= 100
+        # A caller whose own deadline is shorter than the backlog is turned away too
+        controller.rate = 10.0
+        assert rejection(controller, timeout=5).reason == 'estimated wait too long'
+        controller.rate = 0.001
+        assert rejection(controller).retry_after == admission.MAX_RETRY_AFTER_SECONDS
+    finally:
+        holder.done()
+
+
+def test_wait_times_out():
+    controller = AdmissionController(concurrency=1, queue_depth=4, max_wait=60, initial_rate=100.0)
+    holder = Holder(controller)
+    try:
+        assert holder.admitted.wait(5)
+        started = time.monotonic()
+        error = rejection(controller, timeout=0.1)
+        assert error.reason == 'wait timed out'
+        assert time.monotonic() - started >= 0.1
+        assert controller.stats()['queued'] == 0
+    finally:
+        holder.done()
+    stats = controller.stats()
+    assert stats['timed_out'] == 1 and stats['running'] == 0
+
+
+def test_slots_are_handed_over_in_arrival_order():
+    controller = AdmissionController(concurrency=2, queue_depth=4, max_wait=60, initial_rate=100.0)
+    holders = [Holder(controller) for _ in range(2)]
+    for holder in holders:
+        assert holder.admitted.wait(5)
+    waiters = []
+    for _ in range(3):
+        waiters.append(Holder(controller, timeout=5))
+        time.sleep(0.02)
+    assert controller.stats()['queued'] == 3
+    holders[0].done()
+    assert waiters[0].admitted.wait(5)
+    time.sleep(0.05)
+    assert not waiters[1].admitted.is_set() and not waiters[2].admitted.is_set()
+    holders[1].done()
+    assert waiters[1].admitted.wait(5)
+    for holder in waiters:
+        holder.done()
+    assert all(holder.error is None for holder in waiters)
+    stats = controller.stats()
+    assert stats['admitted'] == stats['completed'] == 5
+    assert stats['wait_seconds']['max'] >= 0.05 and stats['queued'] == 0
+
+
+def test_drain_rate_follows_completed_work():
+    controller = AdmissionController(concurrency=1, initial_rate=1.0)
+    ticket = controller._acquire(12.0, None, True)
+    ticket.started -= 2.0
+    controller._release(ticket)
+    # 12 megapixels in 2 seconds moves the average a fifth of the way towards 6
+    assert abs(controller.rate - 2.0) < 0.01
+    # Extractions that end almost at once do not count
+    with controller.admit(50.0):
+        pass
+    assert abs(controller.rate - 2.0) < 0.01
+
+
+def test_document_cost():
+    assert abs(document_cost(png(1000, 500), 'birth_certificate.png') - 0.5) < 1e-9
+    assert document_cost(png(10, 10)) == admission.MIN_COST
+    assert document_cost(b'not an image', 'scan.png') == admission.FALLBACK_COST
+
+    page = Image.new('L', (850, 1100), 255)
+    one, two = io.BytesIO(), io.BytesIO()
+    page.save(one, format='PDF', resolution=100)
+    page.save(two, format='PDF', resolution=100, save_all=True, append_images=[page])
+    single = document_cost(one.getvalue(), 'form137.pdf')
+    assert single > admission.MIN_COST
+    assert abs(document_cost(two.getvalue(), 'form137.pdf') - 2 * single) < 1e-6
+
+
+if __name__ == "__main__":
+    print("Testing admission control...")
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✅ {name}")
+    print("\n=== Test Complete ===")
@@ -0,0 +1,120 @@
+"""
+Archive expansion and scheduling checks for batch_extract.py.
+
+    python test_batch_extract.py    (or: python -m pytest test_batch_extract.py)
+"""
+
+import io
+import time
+import zipfile
+import threading
+
+import batch_extract
+from batch_extract import BatchError, BatchItem, collect_items, run_batch
+from deadline import Deadline
+
+
+def zip_bytes(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def item(name, size):
+    return BatchItem(name, size, lambda: name.encode())
+
+
+def test_collect_items_expands_archives():
+    packet = zip_bytes({
+        'packet/': b'',
+        'packet/birth_certificate.PNG': b'png',
+        'packet/form137.pdf': b'%PDF',
+        'packet/notes.txt': b'notes',
+        '__MACOSX/packet/._form137.pdf': b'fork',
+    })
+    items, rejected = collect_items([('form138.jpg', b'jpeg'), ('packet.zip', packet)])
+    assert [entry.name for entry in items] == ['form138.jpg', 'packet/birth_certificate.PNG', 'packet/form137.pdf']
+    assert [entry.read() for entry in items] == [b'jpeg', b'png', b'%PDF']
+    assert rejected == [{'filename': 'packet/notes.txt', 'status': 400, 'error': 'Unsupported file type'}]
+
+
+def test_collect_items_limits():
+    original = batch_extract.OCR_EXTRACT_BATCH_MAX_FILE_MB, batch_extract.OCR_EXTRACT_BATCH_MAX_FILES
+    batch_extract.OCR_EXTRACT_BATCH_MAX_FILE_MB, batch_extract.OCR_EXTRACT_BATCH_MAX_FILES = 1 / 1024, 2
+    try:
+        items, rejected = collect_items([('small.png', b'x' * 1024), ('large.png', b'x' * 1025)])
+        assert [entry.name for entry in items] == ['small.png']
+        assert rejected == [{'filename': 'large.png', 'status': 413, 'error': 'File too large'}]
+        for uploads in ([('page.png', b'x')] * 3, [('broken.zip', b'not a zip')]):
+            try:
+                collect_items(uploads)
+            except BatchError:
+                continue
+            raise AssertionError(f'{uploads[0][0]} batch was accepted')
+    finally:
+        batch_extract.OCR_EXTRACT_BATCH_MAX_FILE_MB, batch_extract.OCR_EXTRACT_BATCH_MAX_FILES = original
+
+
+def test_results_in_upload_order_started_largest_first():
+    items = [item('small.png', 10), item('large.pdf', 300), item('medium.jpg', 100), item('tiny.png', 1)]
+    started = []
+
+    def handler(data, name):
+        started.append(name)
+        # Smaller documents finish first
+        time.sleep(len(started) * 0.01)
+        return {'text': data.decode()}, 200, name == 'tiny.png'
+
+    results = run_batch(items, handler, workers=1)
+    assert started == ['large.pdf', 'medium.jpg', 'small.png', 'tiny.png']
+    assert [result['filename'] for result in results] == [entry.name for entry in items]
+    assert [result['result']['text'] for result in results] == [entry.name for entry in items]
+    assert [result['cache'] for result in results] == ['MISS', 'MISS', 'MISS', 'HIT']
+    assert [result['bytes'] for result in results] == [10, 300, 100, 1]
+
+
+def test_documents_run_concurrently():
+    running, peak, lock = [0], [0], threading.Lock()
+
+    def handler(data, name):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        return {}, 200, False
+
+    run_batch([item(f'{number}.png', number) for number in range(6)], handler, workers=3)
+    assert peak[0] == 3
+
+
+def test_failures_and_deadline():
+    names = []
+
+    def handler(data, name):
+        names.append(name)
+        if name == 'broken.png':
+            raise RuntimeError('cannot identify image file')
+        time.sleep(0.1)
+        return {}, 200, False
+
+    items = [item('broken.png', 30), item('Form137.PDF', 20), item('late.png', 10)]
+    results = run_batch(items, handler, deadline=Deadline(0.05), workers=1)
+    assert results[0] == {'filename': 'broken.png', 'status': 500, 'error': 'cannot identify image file',
+                          'seconds': results[0]['seconds'], 'bytes': 30}
+    assert results[1]['filename'] == 'Form137.PDF' and results[1]['status'] == 200
+    assert results[2]['status'] == 503 and 'deadline' in results[2]['error']
+    # Handlers get the lowercased name; skipped documents never reach the handler
+    assert names == ['broken.png', 'form137.pdf']
+
+
+if __name__ == "__main__":
+    print("Testing batch extraction...")
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✅ {name}")
+    print("\n=== Test Complete ===")
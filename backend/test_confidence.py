@@ -0,0 +1,81 @@
+"""
+Checks for confidence.py: blending word confidences into candidate scores and
+how the blend changes which candidate wins.
+
+    python test_confidence.py    (or: python -m pytest test_confidence.py)
+"""
+
+import confidence
+from confidence import blend_score
+from ocr_processor import GenericDocumentProcessor, OCRSearch
+
+# A candidate with a couple more names, and a shorter one read more cleanly
+NOISY = 'Name: Juan Dela Cruz Maria Santos ' + 'Quezon City Manila ' * 3
+CLEAN = 'Name: Juan Dela Cruz Maria Santos ' + 'Quezon City ' * 3
+
+
+class Settings:
+    """Overrides the confidence settings for a with-block"""
+
+    def __init__(self, use=True, weight=1.0, baseline=70.0):
+        self.values = use, weight, baseline
+
+    def __enter__(self):
+        self.saved = confidence.OCR_USE_CONFIDENCE, confidence.OCR_CONFIDENCE_WEIGHT, confidence.OCR_CONFIDENCE_BASELINE
+        confidence.OCR_USE_CONFIDENCE, confidence.OCR_CONFIDENCE_WEIGHT, confidence.OCR_CONFIDENCE_BASELINE = self.values
+
+    def __exit__(self, *exc):
+        confidence.OCR_USE_CONFIDENCE, confidence.OCR_CONFIDENCE_WEIGHT, confidence.OCR_CONFIDENCE_BASELINE = self.saved
+
+
+def test_blend_score():
+    with Settings():
+        assert blend_score(50.0, 70.0) == 50.0
+        assert blend_score(50.0, 90.0) == 70.0
+        assert blend_score(50.0, 40.0) == 20.0
+    with Settings(weight=0.5, baseline=60.0):
+        assert blend_score(50.0, 90.0) == 65.0
+
+
+def test_unknown_or_disabled_confidence_keeps_the_score():
+    with Settings():
+        assert blend_score(42.5, None) == 42.5
+    with Settings(use=False):
+        assert blend_score(42.5, 95.0) == 42.5
+
+
+def test_confidence_changes_the_selected_candidate():
+    processor = GenericDocumentProcessor()
+    noisy, clean = processor.score_text(NOISY), processor.score_text(CLEAN)
+    assert noisy > clean
+    with Settings():
+        # Unknown confidences fall back to the plain scores
+        assert processor._select_best_text([NOISY, CLEAN]) == NOISY
+        assert processor._select_best_text([NOISY, CLEAN], {CLEAN: 95.0}) == CLEAN
+        assert processor._select_best_text([NOISY, CLEAN], {NOISY: 40.0, CLEAN: 75.0}) == CLEAN
+        assert processor._select_best_text([NOISY, CLEAN], {NOISY: 80.0, CLEAN: 80.0}) == NOISY
+    with Settings(use=False):
+        assert processor._select_best_text([NOISY, CLEAN], {CLEAN: 95.0}) == NOISY
+
+
+def test_confidence_in_the_incremental_search():
+    processor = GenericDocumentProcessor()
+    with Settings():
+        search = OCRSearch(processor._candidate_score, processor.early_exit_score)
+        search.offer(NOISY, 'standard_preprocessing:0:--psm 6', None)
+        search.offer(CLEAN, 'standard_preprocessing:0:--psm 4', 95.0)
+        assert search.best_source == 'standard_preprocessing:0:--psm 4'
+        assert search.best_score == processor.score_text(CLEAN) + 25.0
+        assert search.confidences == {CLEAN: 95.0}
+        # The final selection agrees with the search
+        assert processor._select_result([NOISY, CLEAN], search) == CLEAN
+        assert search.winner == search.best_source
+
+
+if __name__ == "__main__":
+    print("Testing confidence blending...")
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✅ {name}")
+    print("\n=== Test Complete ===")
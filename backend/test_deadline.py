@@ -0,0 +1,136 @@
+"""
+Deadline checks for deadline.py and for how ocr_pool stops once a request's
+budget runs out.
+
+    python test_deadline.py    (or: python -m pytest test_deadline.py)
+"""
+
+import time
+import socket
+
+from flask import Flask
+
+import deadline
+import ocr_pool
+from deadline import Deadline, deadline_expired, tesseract_timeout
+from test_ocr_pool import FakeBackend, FakePool, Tally, images
+
+
+class SlowBackend(FakeBackend):
+    def image_to_string(self, image, config='', timeout=0):
+        time.sleep(0.2)
+        return f'{image.width} {config}'
+
+
+def test_unlimited_deadline():
+    for seconds in (None, 0, -5):
+        budget = Deadline(seconds)
+        assert budget.remaining() is None
+        assert not budget.expired() and not budget.tripped
+        assert budget.tesseract_timeout() == 0
+    assert not deadline_expired(None)
+    assert tesseract_timeout(None) == 0
+
+
+def test_deadline_expires_and_stays_expired():
+    budget = Deadline(0.05)
+    assert 0 < budget.remaining() <= 0.05
+    assert not budget.expired()
+    time.sleep(0.06)
+    assert budget.remaining() == 0
+    assert budget.expired() and budget.tripped and budget.reason == 'deadline'
+    # pytesseract reads a zero timeout as "no timeout"
+    assert budget.tesseract_timeout() == 0.1
+
+
+def test_client_disconnect_cancels():
+    gone = []
+    budget = Deadline(30, cancelled=lambda: bool(gone))
+    assert not budget.expired()
+    gone.append(True)
+    # The client socket is only probed every _DISCONNECT_CHECK_INTERVAL
+    assert not budget.expired()
+    time.sleep(deadline._DISCONNECT_CHECK_INTERVAL)
+    assert budget.expired() and budget.reason == 'disconnected'
+    gone.clear()
+    assert budget.expired()
+
+
+def test_client_disconnected_reads_socket():
+    server, client = socket.socketpair()
+    try:
+        environ = {'gunicorn.socket': server}
+        assert not deadline.client_disconnected(environ)
+        client.sendall(b'x')
+        # Pipelined bytes are not a disconnect
+        assert not deadline.client_disconnected(environ)
+        server.recv(1)
+        client.close()
+        assert deadline.client_disconnected(environ)
+    finally:
+        server.close()
+    assert not deadline.client_disconnected({})
+
+
+def test_from_request_budgets():
+    app = Flask(__name__)
+    cases = [
+        ({}, {}, deadline.OCR_DEADLINE_SECONDS),
+        ({'X-OCR-Deadline': '10'}, {'deadline': '20'}, 10),
+        ({}, {'deadline': '20'}, 20),
+        ({'X-OCR-Deadline': '100000'}, {}, deadline.OCR_DEADLINE_MAX_SECONDS),
+        ({'X-OCR-Deadline': '0'}, {}, deadline.OCR_DEADLINE_MAX_SECONDS),
+        ({'X-OCR-Deadline': 'soon'}, {}, deadline.OCR_DEADLINE_SECONDS),
+    ]
+    for headers, form, seconds in cases:
+        with app.test_request_context('/api/extract-pdf', method='POST', headers=headers, data=form) as context:
+            budget = deadline.from_request(context.request)
+            assert budget.seconds == (seconds or None), (headers, form)
+            assert not budget.expired()
+
+
+def test_pool_stops_at_deadline():
+    jobs = [(image, '--psm 6') for image in images(40)]
+    tally = Tally()
+    budget = Deadline(0.5)
+    with FakePool(2):
+        ocr_pool.ocr_backend._backend = SlowBackend()
+        started = time.monotonic()
+        texts = [result.text for result in ocr_pool.imap_ocr(jobs, tally=tally, deadline=budget, window=4, batch=1)]
+        elapsed = time.monotonic() - started
+    assert budget.tripped and budget.reason == 'deadline'
+    # Results so far come back in order, the rest is cancelled rather than run
+    assert 0 < len(texts) < len(jobs)
+    assert texts == [f'{width} --psm 6' for width in range(1, len(texts) + 1)]
+    assert tally.ocr_calls < len(texts) + 4 + 1
+    assert elapsed < 0.5 + 2 * ocr_pool._DEADLINE_POLL_SECONDS
+
+
+def test_in_process_stops_at_deadline():
+    tally = Tally()
+    budget = Deadline(0.3)
+    with FakePool(1):
+        ocr_pool.ocr_backend._backend = SlowBackend()
+        texts = [result.text for result in ocr_pool.imap_ocr([(image, '') for image in images(10)],
+                                                             tally=tally, deadline=budget, batch=1)]
+    assert budget.tripped
+    assert 1 <= len(texts) <= 3 and tally.ocr_calls == len(texts)
+
+
+def test_expired_deadline_runs_nothing():
+    budget = Deadline(0.01)
+    time.sleep(0.02)
+    for workers in (1, 2):
+        tally = Tally()
+        with FakePool(workers):
+            assert list(ocr_pool.imap_ocr([(image, '') for image in images(3)], tally=tally, deadline=budget)) == []
+        assert tally.ocr_calls == 0
+
+
+if __name__ == "__main__":
+    print("Testing request deadlines...")
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✅ {name}")
+    print("\n=== Test Complete ===")
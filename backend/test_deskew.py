@@ -0,0 +1,139 @@
+"""
+Orientation and skew checks for deskew.py on synthetic pages.
+
+Runs offline (no Tesseract needed): OSD answers are faked, or OSD is made to
+fail so the layout cue is what gets tested.
+
+    python test_deskew.py    (or: python -m pytest test_deskew.py)
+"""
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+import deskew
+import ocr_backend
+
+WORDS = ('REPUBLIC OF THE PHILIPPINES CERTIFICATE OF LIVE BIRTH NAME SEX DATE PLACE '
+         'FATHER MOTHER DELA CRUZ JUAN MIGUEL SANTOS MARIA January 15 1995 Manila').split()
+
+
+def create_test_page(lines=40, size=(1600, 2000), seed=0):
+    """A white page with lines of left-aligned black text"""
+    rng = np.random.default_rng(seed)
+    img = Image.new('L', size, 255)
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default(size=28)
+    for i in range(lines):
+        y = 80 + i * (size[1] - 160) // lines
+        draw.text((100, y), ' '.join(rng.choice(WORDS, rng.integers(4, 10))), fill=0, font=font)
+    return img
+
+
+def small_gray(image):
+    return np.asarray(deskew._downscale(image, deskew.SKEW_MAX_DIMENSION))
+
+
+def with_osd(rotate, confidence, check):
+    """Run check() with OSD answering (rotate, confidence) and count its calls"""
+    calls = []
+
+    def fake_osd(image, timeout=0):
+        calls.append(image.size)
+        return rotate, confidence
+
+    original = ocr_backend.detect_orientation
+    ocr_backend.detect_orientation = fake_osd
+    try:
+        return check(), len(calls)
+    finally:
+        ocr_backend.detect_orientation = original
+
+
+def without_osd(check):
+    """Run check() with OSD failing, as when osd.traineddata is missing"""
+    def failing_osd(image, timeout=0):
+        raise RuntimeError('osd.traineddata not found')
+
+    original = ocr_backend.detect_orientation
+    ocr_backend.detect_orientation = failing_osd
+    try:
+        return check()
+    finally:
+        ocr_backend.detect_orientation = original
+
+
+class Tally:
+    ocr_calls = 0
+
+
+def test_confident_osd_decides_the_orientation():
+    page = create_test_page()
+    tally = Tally()
+    assert with_osd(270, 9.5, lambda: deskew.detect_orientation(page, tally=tally)) == (270, 1)
+    assert tally.ocr_calls == 1
+
+
+def test_layout_orientation_upright():
+    for lines in (40, 10, 3):
+        page = create_test_page(lines)
+        assert deskew._layout_orientation(small_gray(page)) == 0, lines
+        assert deskew._layout_orientation(small_gray(page.rotate(180))) == 0, lines
+
+
+def test_layout_orientation_sideways():
+    for lines in (40, 10, 3):
+        page = create_test_page(lines)
+        for angle in (90, 270):
+            assert deskew._layout_orientation(small_gray(page.rotate(angle, expand=True))) == 90, (lines, angle)
+
+
+def test_layout_orientation_independent_of_scale():
+    page = create_test_page()
+    for size in ((800, 1000), (2400, 3000)):
+        scaled = page.resize(size, Image.BILINEAR)
+        assert deskew._layout_orientation(np.asarray(scaled)) == 0, size
+        assert deskew._layout_orientation(np.asarray(scaled.rotate(90, expand=True))) == 90, size
+
+
+def test_layout_orientation_blank_page():
+    assert deskew._layout_orientation(np.full((400, 300), 255, dtype=np.uint8)) == 0
+
+
+def test_estimate_skew():
+    page = create_test_page()
+    for angle in (-4.0, -1.5, 0.0, 2.0, 6.0):
+        skewed = page.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+        # The skew to undo is the opposite rotation
+        assert abs(deskew.estimate_skew(small_gray(skewed)) + angle) <= 0.1, angle
+
+
+def test_detect_orientation_without_osd():
+    page = create_test_page()
+    assert without_osd(lambda: deskew.detect_orientation(page)) == 0
+    assert without_osd(lambda: deskew.detect_orientation(page.rotate(90, expand=True))) == 90
+
+
+def test_deskew_image_upright_page_untouched():
+    page = create_test_page()
+    assert with_osd(0, 9.5, lambda: deskew.deskew_image(page)) == (page, 1)
+    # Without rotation detection there is no OSD call
+    assert with_osd(90, 9.5, lambda: deskew.deskew_image(page, detect_rotation=False)) == (page, 0)
+
+
+def test_deskew_image_sideways_page():
+    page = create_test_page()
+    straightened, _ = with_osd(90, 9.5, lambda: deskew.deskew_image(page.rotate(90, expand=True)))
+    assert straightened.size == page.size
+    # Without OSD the layout cue turns the page upright
+    straightened = without_osd(lambda: deskew.deskew_image(page.rotate(90, expand=True)))
+    assert straightened.size == page.size
+    assert deskew._layout_orientation(small_gray(straightened)) == 0
+
+
+if __name__ == "__main__":
+    print("Testing deskew...")
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✅ {name}")
+    print("\n=== Test Complete ===")
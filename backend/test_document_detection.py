@@ -0,0 +1,107 @@
+"""
+Document type detection checks: classify_header_text on header snippets of
+every supported form, and the header-strip-first OCR of
+DocumentOCRProcessor._detect_document_type with its wider fallback band.
+
+The header OCR is answered by a fake backend, one text per call.
+
+    python test_document_detection.py    (or: python -m pytest test_document_detection.py)
+"""
+
+from PIL import Image
+
+import lazy_imports
+import ocr_backend
+from deadline import Deadline
+from ocr_processor import DETECTION_REGIONS, DocumentOCRProcessor, OCR_DETECT_MIN_CONFIDENCE, classify_header_text
+
+PAGE_SIZE = (850, 1100)
+
+
+class HeaderBackend:
+    """Reads the given texts, one per call, and records the aspect ratio of every strip"""
+
+    name = 'fake'
+
+    def __init__(self, *texts, error=None):
+        self.texts = list(texts)
+        self.error = error
+        self.aspects = []
+
+    def image_to_string(self, image, config='', timeout=0):
+        self.aspects.append(image.height / image.width)
+        if self.error is not None:
+            raise self.error
+        return self.texts.pop(0) if self.texts else ''
+
+
+def detect(*texts, error=None, deadline=None, header_only=False):
+    backend = HeaderBackend(*texts, error=error)
+    original = ocr_backend._backend
+    ocr_backend._backend = backend
+    try:
+        processor = DocumentOCRProcessor(lazy_imports.tesseract_cmd())
+        result = processor._detect_document_type(Image.new('L', PAGE_SIZE, 255), deadline, header_only=header_only)
+    finally:
+        ocr_backend._backend = original
+    assert result[2] == len(backend.aspects)
+    return result, backend
+
+
+def test_classify_header_text():
+    cases = [
+        ('republic of the philippines\nphilippine statistics authority\ncertificate of live birth',
+         'birth_certificate', 1.0),
+        ('office of the civil registrar general\nbirth certificate', 'birth_certificate', 1.0),
+        ('psa  nso copy', 'birth_certificate', 0.6),
+        ('department of education\nlearner permanent record (form 137-e)', 'form137', 1.0),
+        ('school form 10 (sf10) learner\'s permanent academic record', 'form137', 0.9),
+        ('form 138\nreport card', 'form138', 1.0),
+        ('department of education\nlearner progress report', 'form138', 0.8),
+        ('sf 9 - shs', 'form138', 0.9),
+        ('department of education', 'form137', 0.2),
+        ('barangay clearance\nto whom it may concern', 'generic', 0.0),
+        ('', 'generic', 0.0),
+    ]
+    for text, expected_type, expected_confidence in cases:
+        document_type, confidence = classify_header_text(text)
+        assert document_type == expected_type, text
+        assert abs(confidence - expected_confidence) < 1e-9, text
+
+
+def test_confident_header_strip_is_enough():
+    (document_type, confidence, calls), backend = detect('certificate of live birth')
+    assert (document_type, confidence, calls) == ('birth_certificate', 1.0, 1)
+    # Only the top DETECTION_REGIONS[0] of the page was read
+    assert abs(backend.aspects[0] - DETECTION_REGIONS[0] * PAGE_SIZE[1] / PAGE_SIZE[0]) < 0.01
+
+
+def test_weak_header_falls_back_to_the_wider_band():
+    (document_type, confidence, calls), backend = detect('department of education',
+                                                          'department of education\npermanent record')
+    assert (document_type, calls) == ('form137', 2) and confidence >= OCR_DETECT_MIN_CONFIDENCE
+    assert abs(backend.aspects[1] - DETECTION_REGIONS[1] * PAGE_SIZE[1] / PAGE_SIZE[0]) < 0.01
+    # The wider band keeps the strip's answer when it finds nothing better
+    assert detect('psa', 'lorem ipsum')[0] == ('birth_certificate', 0.3, 2)
+    assert detect('lorem ipsum', 'dolor sit amet')[0] == ('generic', 0.0, 2)
+
+
+def test_header_only_and_deadline_skip_the_wider_band():
+    assert detect('department of education', 'permanent record', header_only=True)[0] == ('form137', 0.2, 1)
+    deadline = Deadline(60)
+    deadline._trip('deadline')
+    assert detect('department of education', 'permanent record', deadline=deadline)[0] == ('form137', 0.2, 1)
+
+
+def test_ocr_failure_reports_generic():
+    (document_type, confidence, calls), _ = detect(error=RuntimeError('tesseract is not installed'))
+    assert (document_type, confidence, calls) == ('generic', 0.0, 1)
+
+
+if __name__ == "__main__":
+    print("Testing document type detection...")
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✅ {name}")
+    print("\n=== Test Complete ===")
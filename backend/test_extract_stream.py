@@ -0,0 +1,136 @@
+"""
+Server-Sent Events checks for extractor_api._event_stream and
+/api/extract-pdf-stream: event order, duplicate drafts, errors and cancellation
+when the client goes away.
+
+    python test_extract_stream.py    (or: python -m pytest test_extract_stream.py)
+"""
+
+import io
+import json
+import time
+import threading
+
+import extractor_api
+from admission import AdmissionRejected
+from result_cache import ResultCache
+from test_pdf_extraction import FakeTesseract, HISTORY_LINES, LEARNER_LINES, create_test_pdf
+
+
+def parse(chunks):
+    """(event, data) pairs of an event stream, keepalive comments included as (None, None)"""
+    events = []
+    for block in ''.join(chunk.decode() if isinstance(chunk, bytes) else chunk for chunk in chunks).split('\n\n'):
+        if block.startswith(':'):
+            events.append((None, None))
+        elif block:
+            lines = dict(line.split(': ', 1) for line in block.split('\n'))
+            events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def stream(work, seconds=None):
+    return parse(extractor_api._event_stream(work, seconds).response)
+
+
+def post_pdf(pdf):
+    original = extractor_api.get_cache
+    cache = ResultCache(1024 * 1024)
+    extractor_api.get_cache = lambda: cache
+    try:
+        with FakeTesseract() as tesseract:
+            response = extractor_api.app.test_client().post('/api/extract-pdf-stream', data={
+                'document': (io.BytesIO(pdf), 'form137.pdf')}, content_type='multipart/form-data')
+            events = parse(response.response)
+            assert tesseract.calls == []
+    finally:
+        extractor_api.get_cache = original
+    assert response.status_code == 200 and response.mimetype == 'text/event-stream'
+    return events
+
+
+def test_drafts_updates_and_final():
+    def work(progress, deadline):
+        progress({'fields': {'surname': 'Dela Cruz'}, 'confidence': 0.5})
+        progress({'fields': {'surname': 'Dela Cruz'}, 'confidence': 0.5})
+        progress({'fields': {'surname': 'Dela Cruz'}, 'confidence': 0.8})
+        progress({'fields': {'surname': 'Dela Cruz', 'gradeLevel': '5'}, 'confidence': 0.8})
+        return {'surname': 'Dela Cruz', 'gradeLevel': '5'}, 200, True
+
+    events = stream(work)
+    assert [event for event, _ in events] == ['draft', 'update', 'update', 'final']
+    assert [data['confidence'] for _, data in events[:3]] == [0.5, 0.8, 0.8]
+    assert events[-1][1] == {'status': 200, 'cache': 'HIT', 'result': {'surname': 'Dela Cruz', 'gradeLevel': '5'}}
+
+
+def test_errors_end_the_stream():
+    def rejected(progress, deadline):
+        raise AdmissionRejected('queue full', 7)
+
+    def broken(progress, deadline):
+        progress({'fields': {}, 'confidence': 0.0})
+        raise ValueError('cannot identify image file')
+
+    assert stream(rejected) == [('error', {'status': 429, 'error': 'Server busy (queue full), retry in 7s',
+                                           'retry_after': 7})]
+    assert stream(broken) == [('draft', {'fields': {}, 'confidence': 0.0}),
+                              ('error', {'status': 500, 'error': 'cannot identify image file'})]
+
+
+def test_keepalive_while_no_draft_is_ready():
+    release = threading.Event()
+
+    def work(progress, deadline):
+        release.wait(5)
+        return {}, 200, False
+
+    original = extractor_api.SSE_KEEPALIVE_SECONDS
+    extractor_api.SSE_KEEPALIVE_SECONDS = 0.02
+    try:
+        chunks = iter(extractor_api._event_stream(work).response)
+        assert next(chunks) == ': keepalive\n\n'
+        release.set()
+        events = parse(chunks)
+    finally:
+        extractor_api.SSE_KEEPALIVE_SECONDS = original
+    assert events[-1][0] == 'final'
+
+
+def test_client_disconnect_cancels_the_extraction():
+    cancelled = threading.Event()
+
+    def work(progress, deadline):
+        progress({'fields': {'surname': 'Dela Cruz'}, 'confidence': 0.3})
+        # An OCR search polls its deadline between Tesseract runs
+        for _ in range(500):
+            if deadline.expired():
+                cancelled.set()
+                break
+            time.sleep(0.01)
+        return {}, 200, False
+
+    chunks = iter(extractor_api._event_stream(work, seconds=60).response)
+    assert next(chunks).startswith('event: draft\n')
+    assert not cancelled.is_set()
+    # What the server does with the generator when the client goes away
+    chunks.close()
+    assert cancelled.wait(5)
+
+
+def test_text_layer_pdf_stream():
+    events = post_pdf(create_test_pdf([('text', LEARNER_LINES), ('text', HISTORY_LINES)]))
+    assert [event for event, _ in events] == ['draft', 'update', 'final']
+    draft, update, final = (data for _, data in events)
+    assert draft['pages_read'] == 1 and not draft['fields']['schoolYear']
+    assert update['pages_read'] == 2 and update['fields']['schoolYear'] == '2019-2020'
+    assert final['status'] == 200 and final['cache'] == 'MISS'
+    assert final['result']['surname'] == 'Dela Cruz' and final['result']['gradeLevel'] == '5'
+
+
+if __name__ == "__main__":
+    print("Testing extraction event streams...")
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✅ {name}")
+    print("\n=== Test Complete ===")
@@ -0,0 +1,268 @@
+"""
+Zonal template checks for form_templates.py and the zonal path of
+DocumentOCRProcessor.extract_document.
+
+Tesseract is stubbed out: the field boxes are read by a fake imap_ocr that
+returns canned text per field config.
+
+    python test_form_templates.py    (or: python -m pytest test_form_templates.py)
+"""
+
+import io
+import os
+import json
+import tempfile
+
+from PIL import Image, ImageDraw
+
+import form_templates
+import ocr_processor
+from deadline import Deadline
+from form_templates import FieldZone, FormTemplate, ZonalResult
+from ocr_backend import OCRResult, OCRWord
+
+
+def create_test_form(size=(1000, 1300), border=60):
+    """A white page with a form border and a few printed rules inside"""
+    img = Image.new('L', size, 255)
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((border, border, size[0] - border, size[1] - border), outline=0, width=4)
+    for y in range(200, size[1] - border, 120):
+        draw.line((border, y, size[0] - border, y), fill=0, width=2)
+    return img
+
+
+def test_clean_names():
+    zone = FieldZone('firstName', 'First Name', (0, 0, 1, 1), 'name')
+    assert zone.clean('First  Name: JUAN MIGUEL.') == ('JUAN MIGUEL', True)
+    assert zone.clean('DE LA CRUZ 123') == ('DE LA CRUZ', True)
+    assert zone.clean('Ñ') == ('Ñ', False)
+    assert zone.clean(' - ') == ('', False)
+
+
+def test_clean_digits_with_pattern():
+    lrn = FieldZone('lrn', 'LRN', (0, 0, 1, 1), 'digits', r'\d{12}')
+    assert lrn.clean('LRN 1234 5678 9012') == ('123456789012', True)
+    assert lrn.clean('12345') == ('12345', False)
+    assert lrn.clean('no digits') == ('', False)
+    school_year = FieldZone('schoolYear', 'School Year', (0, 0, 1, 1), 'digits', r'\d{4}-\d{4}')
+    assert school_year.clean('S.Y. 2023-2024') == ('2023-2024', True)
+    assert school_year.clean('2023') == ('2023', False)
+
+
+def test_clean_dates_text_and_sex():
+    date = FieldZone('birthDate', 'Date of Birth', (0, 0, 1, 1), 'date')
+    assert date.clean('Date of Birth: January 15, 1995') == ('January 15, 1995', True)
+    assert date.clean('January 15') == ('January 15', False)
+    place = FieldZone('placeOfBirth', 'Place of Birth', (0, 0, 1, 1), 'text')
+    assert place.clean('Place of Birth Manila') == ('Manila', True)
+    assert place.clean('Q.C')[1] is False
+    sex = FieldZone('gender', 'Sex', (0, 0, 1, 1), 'sex')
+    assert sex.clean('MALE') == ('Male', True)
+    assert sex.clean('babae') == ('Female', True)
+    assert sex.clean('X')[1] is False
+
+
+def test_unknown_field_kind():
+    try:
+        FieldZone('lrn', 'LRN', (0, 0, 1, 1), 'number')
+    except ValueError:
+        return
+    raise AssertionError('FieldZone accepted an unknown kind')
+
+
+def test_zonal_result_text_and_complete():
+    template = FormTemplate('test', [FieldZone('lrn', 'LRN', (0, 0, 1, 1), 'digits'),
+                                     FieldZone('gender', 'Sex', (0, 0, 1, 1), 'sex')])
+    result = ZonalResult('form138', template)
+    result.values, result.valid = {'lrn': '123', 'gender': '?'}, {'lrn': True, 'gender': False}
+    assert not result.complete
+    assert result.fields == {'lrn': '123'}
+    assert result.text() == 'LRN: 123'
+    result.values['gender'], result.valid['gender'] = 'Male', True
+    assert result.complete
+    assert result.text() == 'LRN: 123\nSex: Male'
+
+
+def test_strict_patterns():
+    cases = [
+        ('name', 'DELA CRUZ, JUAN', True),
+        ('name', 'Ma. Clara Santos', True),
+        ('name', 'J Cruz', False),
+        ('name', 'Name of Child Juan Dela Cruz', False),
+        ('text', 'Quezon City', True),
+        ('text', 'Mla', False),
+        ('date', 'January 15, 2010', True),
+        ('date', '15/01/2010', True),
+        ('date', 'January 2010', False),
+        ('digits', '2019-2020', True),
+        ('digits', '2019 2020', False),
+        ('sex', 'Male', True),
+    ]
+    for kind, value, expected in cases:
+        assert FieldZone('field', 'Field', (0, 0, 1, 1), kind).strict(value) is expected, (kind, value)
+    # A field's own pattern replaces the kind's
+    lrn = FieldZone('lrn', 'LRN', (0, 0, 1, 1), 'digits', pattern=r'\d{12}')
+    assert lrn.strict('123456789012') and not lrn.strict('2019-2020')
+
+
+def test_zonal_result_trusted():
+    template = FormTemplate('test', [FieldZone('fullName', 'Name', (0, 0, 1, 1), 'name'),
+                                     FieldZone('gender', 'Sex', (0, 0, 1, 1), 'sex')])
+    result = ZonalResult('form138', template)
+    result.values, result.valid = {'fullName': 'DELA CRUZ, JUAN', 'gender': 'Male'}, {'fullName': True, 'gender': True}
+    assert result.complete and not result.trusted
+    result.confidences = {'fullName': 92.0, 'gender': 88.0}
+    assert result.trusted
+    result.confidences['gender'] = form_templates.OCR_ZONAL_SKIP_MIN_CONFIDENCE - 1
+    assert not result.trusted
+    result.confidences['gender'] = 88.0
+    # Valid, but not a name a full-page read would be worse at
+    result.values['fullName'] = 'J Cruz'
+    assert not result.trusted
+
+
+def test_field_confidence_needs_no_minimum_word_count():
+    words = [OCRWord('DELA', 80.0, (0, 0, 10, 10)), OCRWord('CRUZ', 100.0, (0, 0, 10, 10)),
+             OCRWord('', -1.0, (0, 0, 0, 0))]
+    result = OCRResult('DELA CRUZ', words)
+    assert result.mean_confidence is None
+    assert form_templates._field_confidence(result) == 90.0
+    assert form_templates._field_confidence(OCRResult('', [])) is None
+
+
+def test_load_templates_override():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'templates.json')
+        with open(path, 'w') as f:
+            json.dump({'form138': [{'name': 'sf9_es', 'fields': [
+                {'name': 'lrn', 'label': 'LRN', 'box': [0.1, 0.1, 0.5, 0.2], 'kind': 'digits'}]}],
+                'diploma': [{'name': 'v1', 'fields': [{'name': 'fullName', 'box': [0, 0, 1, 0.1]}]}]}, f)
+        templates = form_templates._load_templates(path)
+    assert [field.name for field in templates['form138'][0].fields] == ['lrn']
+    assert len(templates['form138']) == 1
+    assert templates['diploma'][0].fields[0].kind == 'text'
+    # Built-in templates are not modified
+    assert len(form_templates.TEMPLATES['form138'][0].fields) > 1
+
+
+def test_load_templates_bad_file():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'templates.json')
+        with open(path, 'w') as f:
+            f.write('{"form138": [{"fields": []}]}')
+        templates = form_templates._load_templates(path)
+    assert [template.name for template in templates['form138']] == ['sf9_es']
+
+
+def test_find_form_frame():
+    left, top, right, bottom = form_templates.find_form_frame(create_test_form())
+    assert abs(left - 60) <= 4 and abs(top - 60) <= 4
+    assert abs(right - 940) <= 4 and abs(bottom - 1240) <= 4
+    blank = Image.new('L', (400, 500), 255)
+    assert form_templates.find_form_frame(blank) == (0, 0, 400, 500)
+
+
+class FakeOCR:
+    """Stands in for ocr_pool.imap_ocr: answers every field config with canned text"""
+
+    def __init__(self, texts, on_call=None, confidence=90.0):
+        self.texts = texts
+        self.on_call = on_call
+        self.confidence = confidence
+        self.calls = 0
+
+    def __call__(self, jobs, tally=None, deadline=None, words=False, **kwargs):
+        def results():
+            for image, config in jobs:
+                self.calls += 1
+                if tally is not None:
+                    tally.ocr_calls += 1
+                if self.on_call is not None:
+                    self.on_call()
+                text = self.texts.get(config, '')
+                yield OCRResult(text, [OCRWord(word, self.confidence, (0, 0, 10, 10)) for word in text.split()])
+        return results()
+
+
+def with_fake_ocr(fake, check):
+    original = form_templates.ocr_pool.imap_ocr
+    form_templates.ocr_pool.imap_ocr = fake
+    try:
+        return check()
+    finally:
+        form_templates.ocr_pool.imap_ocr = original
+
+
+FORM138_TEXTS = {
+    form_templates.FIELD_CONFIGS['name']: 'DELA CRUZ, JUAN',
+    form_templates.FIELD_CONFIGS['sex']: 'MALE',
+    form_templates.FIELD_CONFIGS['digits']: '123456789012',
+}
+
+
+def test_extract_fields():
+    fake = FakeOCR(FORM138_TEXTS)
+    result = with_fake_ocr(fake, lambda: form_templates.extract_fields(create_test_form(), 'form138'))
+    assert result.template.name == 'sf9_es'
+    assert result.fields == {'fullName': 'DELA CRUZ, JUAN', 'lrn': '123456789012', 'gender': 'Male'}
+    assert not result.complete
+    assert fake.calls == len(result.template.fields)
+    assert form_templates.extract_fields(create_test_form(), 'generic') is None
+
+
+def png_bytes(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+ZONAL_TEXTS = dict(FORM138_TEXTS, **{form_templates.FIELD_CONFIGS['digits']: '2023-2024'})
+ZONAL_TEMPLATE = FormTemplate('sf9_test', [FieldZone('fullName', 'Name', (0.1, 0.1, 0.9, 0.2), 'name'),
+                                           FieldZone('schoolYear', 'School Year', (0.1, 0.3, 0.9, 0.4), 'digits')])
+
+
+def extract_zonal(fake, skip_full_page, deadline=None):
+    """Run extract_document on the two-field template; the full-page search answers 'FULL PAGE'"""
+    original = form_templates.get_templates, form_templates.OCR_ZONAL_SKIP_FULL_PAGE
+    form_templates.get_templates = lambda: {'form138': [ZONAL_TEMPLATE]}
+    form_templates.OCR_ZONAL_SKIP_FULL_PAGE = skip_full_page
+    try:
+        processor = ocr_processor.DocumentOCRProcessor()
+        processor.get_processor('form138')._run_strategies = lambda page, search: 'FULL PAGE'
+        return with_fake_ocr(fake, lambda: processor.extract_document(
+            png_bytes(create_test_form()), 'form138', deadline=deadline))
+    finally:
+        form_templates.get_templates, form_templates.OCR_ZONAL_SKIP_FULL_PAGE = original
+
+
+def test_zonal_early_return_reports_partial_and_score():
+    deadline = Deadline(60)
+    # The deadline trips while the last box is read
+    fake = FakeOCR(ZONAL_TEXTS, on_call=lambda: deadline._trip('deadline') if fake.calls == 2 else None)
+    result = extract_zonal(fake, True, deadline)
+
+    assert result['fields'] == {'fullName': 'DELA CRUZ, JUAN', 'schoolYear': '2023-2024'}
+    assert result['early_exit'] is True
+    assert result['partial'] is True
+    assert isinstance(result['score'], float)
+
+
+def test_full_page_search_runs_unless_enabled_and_trusted():
+    # Off by default: the boxes fill in fields but the full page is still read
+    result = extract_zonal(FakeOCR(ZONAL_TEXTS), form_templates.OCR_ZONAL_SKIP_FULL_PAGE)
+    assert result['text'] == 'FULL PAGE' and not result['early_exit']
+    assert result['fields'] == {'fullName': 'DELA CRUZ, JUAN', 'schoolYear': '2023-2024'}
+
+    # Every field valid, but read with little confidence
+    result = extract_zonal(FakeOCR(ZONAL_TEXTS, confidence=60.0), True)
+    assert result['text'] == 'FULL PAGE' and not result['early_exit']
+
+
+if __name__ == "__main__":
+    print("Testing form templates...")
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✅ {name}")
+    print("\n=== Test Complete ===")
@@ -0,0 +1,151 @@
+"""
+Lease, retry and worker checks for job_queue.py on a temporary SQLite file.
+
+    python test_job_queue.py    (or: python -m pytest test_job_queue.py)
+"""
+
+import os
+import time
+import tempfile
+
+from job_queue import JobQueue, QUEUED, RUNNING, DONE, FAILED
+
+
+def with_queue(check, **kwargs):
+    with tempfile.TemporaryDirectory() as directory:
+        return check(JobQueue(os.path.join(directory, 'ocr_jobs.sqlite3'), **kwargs))
+
+
+def wait_for(queue, job_id, statuses=(DONE, FAILED), timeout=5.0):
+    give_up = time.monotonic() + timeout
+    while time.monotonic() < give_up:
+        job = queue.get(job_id)
+        if job['status'] in statuses:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f'job {job_id} is still {queue.get(job_id)["status"]}')
+
+
+def test_submit_claim_finish():
+    def check(queue):
+        first = queue.submit(b'%PDF-1', 'form137.pdf', {'document_type': 'form137'})
+        second = queue.submit(b'%PDF-2', 'form138.pdf')
+        assert queue.get(first)['queuePosition'] == 0
+        assert queue.get(second)['queuePosition'] == 1
+        assert queue.get('no-such-job') is None
+
+        job = queue.claim()
+        assert job['id'] == first and bytes(job['document']) == b'%PDF-1' and job['attempts'] == 1
+        assert queue.get(first)['status'] == RUNNING and queue.get(first)['attempts'] == 1
+        assert queue.get(second)['queuePosition'] == 0
+
+        assert queue.finish(first, 1, {'success': True, 'text': 'FORM 137'}, 200)
+        done = queue.get(first)
+        assert done['status'] == DONE and done['httpStatus'] == 200
+        assert done['result'] == {'success': True, 'text': 'FORM 137'}
+        assert queue.claim()['id'] == second
+        assert queue.fail(second, 1, 'unreadable')
+        assert queue.get(second)['error'] == 'unreadable'
+        assert queue.counts() == {DONE: 1, FAILED: 1}
+        assert queue.claim() is None
+    with_queue(check)
+
+
+def test_expired_lease_is_reclaimed():
+    def check(queue):
+        job_id = queue.submit(b'scan', 'birth_certificate.png')
+        assert queue.claim()['id'] == job_id
+        # Still leased to the first worker
+        assert queue.claim() is None
+        time.sleep(0.1)
+        again = queue.claim()
+        assert again['id'] == job_id and bytes(again['document']) == b'scan'
+        assert again['attempts'] == queue.get(job_id)['attempts'] == 2
+    with_queue(check, lease_seconds=0.05)
+
+
+def test_stale_attempt_cannot_overwrite_the_reclaimed_job():
+    def check(queue):
+        job_id = queue.submit(b'scan', 'slow.png')
+        stale = queue.claim()
+        time.sleep(0.1)
+        current = queue.claim()
+        assert (stale['attempts'], current['attempts']) == (1, 2)
+        # The first worker finally returns after its lease ran out
+        assert not queue.finish(job_id, stale['attempts'], {'text': 'stale'}, 200)
+        assert not queue.fail(job_id, stale['attempts'], 'timed out')
+        assert queue.get(job_id)['status'] == RUNNING
+        assert queue.finish(job_id, current['attempts'], {'text': 'current'}, 200)
+        assert queue.get(job_id)['result'] == {'text': 'current'}
+        # Nothing overwrites a finished job
+        assert not queue.fail(job_id, current['attempts'], 'late failure')
+        assert queue.get(job_id)['status'] == DONE
+    with_queue(check, lease_seconds=0.05)
+
+
+def test_job_fails_after_max_attempts():
+    def check(queue):
+        job_id = queue.submit(b'scan', 'crashes_the_worker.png')
+        for _ in range(2):
+            assert queue.claim()['id'] == job_id
+            time.sleep(0.1)
+        assert queue.claim() is None
+        job = queue.get(job_id)
+        assert job['status'] == FAILED and job['attempts'] == 2
+        assert 'did not finish' in job['error']
+    with_queue(check, lease_seconds=0.05, max_attempts=2)
+
+
+def test_queues_sharing_a_database_claim_each_job_once():
+    def check(queue):
+        other = JobQueue(queue.path)
+        ids = [queue.submit(bytes([number]), f'{number}.png') for number in range(4)]
+        claimed = [job['id'] for job in (queue.claim(), other.claim(), other.claim(), queue.claim())]
+        assert claimed == ids
+        assert queue.claim() is None and other.claim() is None
+    with_queue(check)
+
+
+def test_purge_keeps_unfinished_jobs():
+    def check(queue):
+        queued = queue.submit(b'scan', 'queued.png')
+        finished = queue.add_finished('cached.png', {'success': True})
+        assert queue.get(finished)['status'] == DONE
+        assert queue.purge(retention_hours=1) == 0
+        time.sleep(0.01)
+        assert queue.purge(retention_hours=0) == 1
+        assert queue.get(finished) is None
+        assert queue.get(queued)['status'] == QUEUED
+    with_queue(check)
+
+
+def test_workers_run_jobs():
+    def handler(document, filename, params):
+        if document == b'broken':
+            raise ValueError('not an image')
+        return {'success': True, 'text': document.decode(), 'type': params.get('document_type')}, 200
+
+    def check(queue):
+        queue.start_workers(handler, count=2)
+        try:
+            good = queue.submit(b'CERTIFICATE OF LIVE BIRTH', 'birth.png', {'document_type': 'birth_certificate'})
+            bad = queue.submit(b'broken', 'broken.png')
+            job = wait_for(queue, good)
+            assert job['status'] == DONE and job['result']['type'] == 'birth_certificate'
+            job = wait_for(queue, bad)
+            assert job['status'] == FAILED and job['error'] == 'not an image'
+        finally:
+            queue.stop_workers()
+            # Let the workers leave the database before the directory goes
+            for worker in queue._workers:
+                worker.join(timeout=5)
+    with_queue(check)
+
+
+if __name__ == "__main__":
+    print("Testing job queue...")
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✅ {name}")
+    print("\n=== Test Complete ===")
@@ -0,0 +1,186 @@
+"""
+Fingerprint and classification checks for layout_classifier.py on synthetic
+ruled pages, and how detection uses the layout only as a prior the page text
+must confirm.
+
+    python test_layout_classifier.py    (or: python -m pytest test_layout_classifier.py)
+"""
+
+import os
+import tempfile
+
+from PIL import Image, ImageDraw
+
+import extractor_api
+import lazy_imports
+import layout_classifier
+import ocr_backend
+from ocr_processor import DocumentOCRProcessor, OCR_DETECT_MIN_CONFIDENCE
+
+
+def ruled_page(width, height, rows, columns):
+    """A blank form: rows x columns of ruling lines over the middle of the page"""
+    page = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(page)
+    for row in range(rows):
+        y = int(height * 0.1 + row * height * 0.8 / max(rows - 1, 1))
+        draw.line((int(width * 0.05), y, int(width * 0.95), y), fill=0, width=3)
+    for column in range(columns):
+        x = int(width * 0.05 + column * width * 0.9 / max(columns - 1, 1))
+        draw.line((x, int(height * 0.1), x, int(height * 0.9)), fill=0, width=3)
+    return page
+
+
+# Any landscape table lands near the Form 138 prototype, a ruled portrait page near the birth certificate
+LANDSCAPE_TABLE = ruled_page(1100, 850, 20, 8)
+LONG_BOND_TABLE = ruled_page(850, 1300, 36, 12)
+
+
+class References:
+    """Points the classifier at a temporary reference file for a with-block"""
+
+    def __init__(self, min_confidence=None):
+        self.min_confidence = min_confidence
+
+    def __enter__(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'layout_fingerprints.json')
+        self.saved = layout_classifier.OCR_LAYOUT_REFERENCES, layout_classifier.OCR_LAYOUT_MIN_CONFIDENCE
+        layout_classifier.OCR_LAYOUT_REFERENCES = self.path
+        if self.min_confidence is not None:
+            layout_classifier.OCR_LAYOUT_MIN_CONFIDENCE = self.min_confidence
+        layout_classifier._references = None
+        return self
+
+    def add(self, document_type, page):
+        image_path = os.path.join(self.directory.name, f'{document_type}.png')
+        page.save(image_path)
+        return layout_classifier.add_references(document_type, [image_path])
+
+    def __exit__(self, *exc):
+        layout_classifier.OCR_LAYOUT_REFERENCES, layout_classifier.OCR_LAYOUT_MIN_CONFIDENCE = self.saved
+        layout_classifier._references = None
+        self.directory.cleanup()
+
+
+class HeaderBackend:
+    """Reads the given header texts, one per Tesseract call"""
+
+    name = 'fake'
+
+    def __init__(self, *texts):
+        self.texts = list(texts)
+        self.calls = 0
+
+    def image_to_string(self, image, config='', timeout=0):
+        self.calls += 1
+        return self.texts.pop(0) if self.texts else ''
+
+
+def detect(layout_type, *header_texts):
+    """Run header detection with the layout classifier reporting layout_type"""
+    backend = HeaderBackend(*header_texts)
+    original = ocr_backend._backend, layout_classifier.confident_type
+    ocr_backend._backend = backend
+    layout_classifier.confident_type = lambda image: layout_type
+    try:
+        processor = DocumentOCRProcessor(lazy_imports.tesseract_cmd())
+        document_type, confidence, calls = processor._detect_document_type(Image.new('L', (850, 1100), 255))
+    finally:
+        ocr_backend._backend, layout_classifier.confident_type = original
+    assert calls == backend.calls
+    return document_type, confidence, calls
+
+
+def test_fingerprint_features():
+    features = dict(zip(layout_classifier.FEATURES, layout_classifier.fingerprint(LANDSCAPE_TABLE)))
+    assert features['aspect'] < 0.5
+    assert round(features['horizontal_lines'] * layout_classifier.MAX_HORIZONTAL_LINES) == 20
+    assert round(features['vertical_lines'] * layout_classifier.MAX_VERTICAL_LINES) == 8
+    assert features['grid_coverage'] > 0.9
+    assert abs(features['rulings_left'] - 0.5) < 0.01
+
+    blank = dict(zip(layout_classifier.FEATURES, layout_classifier.fingerprint(Image.new('RGB', (850, 1100), 'white'))))
+    assert abs(blank['aspect'] - 1100 / 850 / 2) < 0.01
+    assert blank['horizontal_lines'] == blank['vertical_lines'] == blank['grid_coverage'] == 0
+    # Without rulings the position shares are uniform
+    assert abs(blank['rulings_top'] - 1 / 3) < 1e-9 and blank['rulings_left'] == 0.5
+
+
+def test_fingerprint_ignores_scale():
+    small = LONG_BOND_TABLE.resize((425, 650))
+    large = layout_classifier.fingerprint(LONG_BOND_TABLE)
+    assert abs(layout_classifier.fingerprint(small) - large).max() < 0.1
+
+
+def test_classify_against_prototypes():
+    with References():
+        assert layout_classifier.classify(LANDSCAPE_TABLE)[0] == 'form138'
+        assert layout_classifier.classify(LONG_BOND_TABLE)[0] == 'birth_certificate'
+        # Far from every form
+        assert layout_classifier.classify(Image.new('L', (850, 1100), 255)) == (None, 0.0)
+        assert layout_classifier.classify(Image.new('L', (850, 1100), 0)) == (None, 0.0)
+
+
+def test_prototypes_alone_are_not_trusted():
+    with References(min_confidence=0.1):
+        for page in (LANDSCAPE_TABLE, LONG_BOND_TABLE):
+            document_type, confidence = layout_classifier.classify(page)
+            assert document_type is not None and confidence >= 0.1
+            assert layout_classifier.confident_type(page) is None
+        assert layout_classifier.recorded_types() == set()
+
+
+def test_recorded_references_are_trusted():
+    with References() as references:
+        assert references.add('form138', LANDSCAPE_TABLE) == 1
+        assert layout_classifier.recorded_types() == {'form138'}
+        assert layout_classifier.classify(LANDSCAPE_TABLE) == ('form138', 1.0)
+        assert layout_classifier.confident_type(LANDSCAPE_TABLE) == 'form138'
+        # Still only the prototype for birth certificates
+        assert layout_classifier.confident_type(LONG_BOND_TABLE) is None
+        layout_classifier.OCR_LAYOUT_MIN_CONFIDENCE = 1.01
+        assert layout_classifier.confident_type(LANDSCAPE_TABLE) is None
+
+
+def test_confirmed():
+    cases = [
+        ('form138', 'DEPARTMENT OF EDUCATION\nLEARNER PROGRESS REPORT', True),
+        ('form138', 'SF 9 - SHS', True),
+        ('form137', 'Learner Reference Number', True),
+        ('birth_certificate', 'Office of the Civil Registrar General', True),
+        ('birth_certificate', 'REPUBLIC OF THE PHILIPPINES', False),
+        ('form137', 'Subject  Q1  Q2  Q3  Q4', False),
+        (None, 'FORM 137', False),
+    ]
+    for document_type, text, expected in cases:
+        assert layout_classifier.confirmed(document_type, text) is expected, (document_type, text)
+
+
+def test_detection_takes_a_confirmed_layout():
+    # Both forms print the department name; the layout breaks the tie
+    assert detect('form138', 'department of education') == ('form138', OCR_DETECT_MIN_CONFIDENCE, 1)
+    assert detect(None, 'department of education', '')[0] == 'form137'
+
+
+def test_detection_overrules_an_unconfirmed_layout():
+    assert detect('form138', 'certificate of live birth')[0] == 'birth_certificate'
+    # A ruled page with no header hint is not forced into the layout's type
+    assert detect('birth_certificate', 'lorem ipsum', 'dolor sit amet') == ('generic', 0.0, 2)
+
+
+def test_fields_from_text_needs_confirmation():
+    text = 'Quarterly Assessment\nSubject  Q1  Q2  Q3  Q4\nMathematics  90  91  92  93'
+    document_type, payload, _ = extractor_api._fields_from_text(text, b'', 'upload.png', 'form137', zonal=False)
+    assert document_type is None and 'gradeLevel' not in payload
+    document_type, _, _ = extractor_api._fields_from_text('DepEd\n' + text, b'', 'upload.png', 'form137', zonal=False)
+    assert document_type == 'form137'
+
+
+if __name__ == "__main__":
+    print("Testing layout classifier...")
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✅ {name}")
+    print("\n=== Test Complete ===")
@@ -0,0 +1,89 @@
+"""
+Checks for lazy_imports.py: caching of deferred imports and what preload()
+imports.
+
+    python test_lazy_imports.py    (or: python -m pytest test_lazy_imports.py)
+"""
+
+import os
+
+import lazy_imports
+
+
+def preloaded_modules(credentials):
+    """Module names preload() asks for, with or without Google credentials"""
+    requested = []
+    original_load, original_credentials = lazy_imports._load, os.environ.get('GOOGLE_APPLICATION_CREDENTIALS')
+    lazy_imports._load = lambda name, optional: requested.append(name)
+    if credentials:
+        os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = credentials
+    else:
+        os.environ.pop('GOOGLE_APPLICATION_CREDENTIALS', None)
+    try:
+        lazy_imports.preload()
+    finally:
+        lazy_imports._load = original_load
+        if original_credentials is None:
+            os.environ.pop('GOOGLE_APPLICATION_CREDENTIALS', None)
+        else:
+            os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = original_credentials
+    return requested
+
+
+def test_preload_skips_vision_without_credentials():
+    assert preloaded_modules(None) == ['cv2', 'pdfplumber', 'pytesseract', 'tesserocr']
+    assert preloaded_modules('/etc/google/key.json')[-1] == 'google.cloud.vision'
+
+
+def test_missing_modules_are_cached():
+    name = 'no_such_ocr_module'
+    try:
+        assert lazy_imports._load(name, optional=True) is None
+        assert lazy_imports._modules[name] is lazy_imports._MISSING
+        for _ in range(2):
+            try:
+                lazy_imports._load(name, optional=False)
+            except ImportError as e:
+                assert name in str(e)
+            else:
+                raise AssertionError('a missing required module did not raise')
+        report = lazy_imports.startup_report()['deferred_imports'][name]
+        assert report['available'] is False
+    finally:
+        lazy_imports._modules.pop(name, None)
+        lazy_imports._import_seconds.pop(name, None)
+
+
+def test_loaded_modules_are_cached():
+    name = 'colorsys'
+    try:
+        module = lazy_imports._load(name, optional=False)
+        assert module is lazy_imports._load(name, optional=True)
+        assert lazy_imports.startup_report()['deferred_imports'][name]['available'] is True
+    finally:
+        lazy_imports._modules.pop(name, None)
+        lazy_imports._import_seconds.pop(name, None)
+
+
+def test_tesseract_cmd_without_pytesseract():
+    original = lazy_imports._tesseract_cmd
+    loaded = lazy_imports._modules.get('pytesseract')
+    lazy_imports._modules.pop('pytesseract', None)
+    try:
+        lazy_imports.set_tesseract_cmd('/opt/tesseract/bin/tesseract')
+        assert lazy_imports.tesseract_cmd() == '/opt/tesseract/bin/tesseract'
+        # Setting the command does not import pytesseract
+        assert 'pytesseract' not in lazy_imports._modules
+    finally:
+        lazy_imports._tesseract_cmd = original
+        if loaded is not None:
+            lazy_imports._modules['pytesseract'] = loaded
+
+
+if __name__ == "__main__":
+    print("Testing lazy imports...")
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✅ {name}")
+    print("\n=== Test Complete ===")
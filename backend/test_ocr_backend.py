@@ -0,0 +1,144 @@
+"""
+Checks for ocr_backend.py: config parsing, word confidences, batched
+tesseract runs and the backend choice.
+
+A fake tesseract executable stands in for the real binary, so no Tesseract
+install is needed.
+
+    python test_ocr_backend.py    (or: python -m pytest test_ocr_backend.py)
+"""
+
+import os
+import sys
+import types
+import tempfile
+
+from PIL import Image
+
+import lazy_imports
+import ocr_backend
+from ocr_backend import OCRResult, OCRWord
+
+# Writes one page per input image ("page <n> <width>") and, with tsv, one word row per page
+FAKE_TESSERACT = '''#!{python}
+import sys
+input_path, output_base = sys.argv[1], sys.argv[2]
+if input_path.endswith('.txt'):
+    paths = open(input_path).read().split()
+else:
+    paths = [input_path]
+from PIL import Image
+pages = []
+rows = ['level\\tpage_num\\tblock_num\\tpar_num\\tline_num\\tword_num\\tleft\\ttop\\twidth\\theight\\tconf\\ttext']
+for number, path in enumerate(paths, start=1):
+    width = Image.open(path).width
+    pages.append(f'page {{number}} {{width}}\\n')
+    rows.append(f'5\\t{{number}}\\t1\\t1\\t1\\t1\\t0\\t0\\t{{width}}\\t10\\t{{80 + number}}\\tpage{{number}}')
+open(output_base + '.txt', 'w').write('\\f'.join(pages) + '\\f')
+if 'tsv' in sys.argv[3:]:
+    open(output_base + '.tsv', 'w').write('\\n'.join(rows) + '\\n')
+'''
+
+
+def with_fake_tesseract(check):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'tesseract')
+        with open(path, 'w') as f:
+            f.write(FAKE_TESSERACT.format(python=sys.executable))
+        os.chmod(path, 0o755)
+        original = lazy_imports.tesseract_cmd()
+        lazy_imports.set_tesseract_cmd(path)
+        try:
+            return check()
+        finally:
+            lazy_imports.set_tesseract_cmd(original)
+
+
+def with_tesserocr(module, check):
+    """Run check() with ``module`` as the installed tesserocr and a fresh backend choice"""
+    original_module = lazy_imports._modules.get('tesserocr')
+    original_backend, original_setting = ocr_backend._backend, ocr_backend.OCR_BACKEND
+    lazy_imports._modules['tesserocr'] = module
+    ocr_backend._backend, ocr_backend.OCR_BACKEND = None, 'auto'
+    try:
+        return check()
+    finally:
+        if original_module is None:
+            lazy_imports._modules.pop('tesserocr', None)
+        else:
+            lazy_imports._modules['tesserocr'] = original_module
+        ocr_backend._backend, ocr_backend.OCR_BACKEND = original_backend, original_setting
+
+
+def fake_tesserocr(starts):
+    class PyTessBaseAPI:
+        def __init__(self, **kwargs):
+            if not starts:
+                raise RuntimeError('Failed to init API, possibly an invalid tessdata path')
+
+    return types.SimpleNamespace(PyTessBaseAPI=PyTessBaseAPI)
+
+
+def test_parse_tesseract_config():
+    assert ocr_backend.parse_tesseract_config('') == (None, {})
+    assert ocr_backend.parse_tesseract_config('--psm 6 -c tessedit_char_whitelist=ABC') == \
+        (6, {'tessedit_char_whitelist': 'ABC'})
+    assert ocr_backend.parse_tesseract_config('--oem 1 --psm 7') == (7, {})
+
+
+def test_mean_confidence():
+    words = [OCRWord(text, confidence, (0, 0, 1, 1))
+             for text, confidence in [('Juan', 90), ('Dela', 80), ('Cruz', 70), ('a', 10), ('b', 10), ('x', -1)]]
+    # Weighted by word length; -1 (no confidence) is ignored
+    assert round(OCRResult('', words).mean_confidence, 2) == round((360 + 320 + 280 + 20) / 14, 2)
+    assert OCRResult('', words[:4]).mean_confidence is None
+    assert OCRResult('text').mean_confidence is None
+
+
+def test_parse_tsv():
+    tsv = ('level\tpage_num\tblock_num\tpar_num\tline_num\tword_num\tleft\ttop\twidth\theight\tconf\ttext\n'
+           '1\t1\t0\t0\t0\t0\t0\t0\t100\t100\t-1\t\n'
+           '5\t1\t1\t1\t1\t1\t1\t2\t3\t4\t95.5\tJuan\n'
+           '5\t2\t1\t1\t1\t1\t5\t6\t7\t8\t60\tCruz\n'
+           '5\t2\t1\t1\t1\t2\t5\t6\t7\t8\tbad\tskipped\n')
+    pages = ocr_backend._parse_tsv(tsv)
+    assert [(word.text, word.confidence, word.box) for word in pages[1]] == [('Juan', 95.5, (1, 2, 3, 4))]
+    assert [word.text for word in pages[2]] == ['Cruz']
+
+
+def test_batched_run_splits_pages():
+    images = [Image.new('L', (width, 20), 255) for width in (30, 40, 50)]
+    backend = ocr_backend.PytesseractBackend()
+    texts = with_fake_tesseract(lambda: backend.images_to_strings(images, config='--psm 6'))
+    assert [text.split()[2] for text in texts] == ['30', '40', '50']
+
+    results = with_fake_tesseract(lambda: backend.images_to_data(images, config='--psm 6'))
+    assert [result.words[0].text for result in results] == ['page1', 'page2', 'page3']
+    assert [result.words[0].confidence for result in results] == [81.0, 82.0, 83.0]
+
+
+def test_backend_choice():
+    def choose(setting):
+        return lambda: ocr_backend._create_backend(setting).name
+
+    assert with_tesserocr(fake_tesserocr(starts=True), choose('auto')) == 'tesserocr'
+    assert with_tesserocr(fake_tesserocr(starts=True), choose('pytesseract')) == 'pytesseract'
+    # Installed but failing to start, or not installed: pytesseract is the fallback
+    assert with_tesserocr(fake_tesserocr(starts=False), choose('auto')) == 'pytesseract'
+    assert with_tesserocr(lazy_imports._MISSING, choose('tesserocr')) == 'pytesseract'
+
+
+def test_spawns_process_follows_backend_in_use():
+    assert with_tesserocr(fake_tesserocr(starts=True), ocr_backend.spawns_process) is False
+    # Installed but failing to start: the pytesseract fallback spawns processes
+    assert with_tesserocr(fake_tesserocr(starts=False), ocr_backend.spawns_process) is True
+    assert with_tesserocr(lazy_imports._MISSING, ocr_backend.spawns_process) is True
+
+
+if __name__ == "__main__":
+    print("Testing OCR backends...")
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✅ {name}")
+    print("\n=== Test Complete ===")
@@ -0,0 +1,133 @@
+"""
+Ordering, batching and cancellation checks for ocr_pool.py, with a fake
+OCR backend and a real process pool.
+
+    python test_ocr_pool.py    (or: python -m pytest test_ocr_pool.py)
+"""
+
+import time
+
+from PIL import Image
+
+import ocr_backend
+import ocr_pool
+from ocr_backend import OCRResult
+
+
+class FakeBackend:
+    """'Reads' an image as its width; narrow images take longest, so results finish out of order"""
+
+    def __init__(self, spawns=True):
+        # Batching is only enabled for the backend that spawns a process per call
+        self.name = 'pytesseract' if spawns else 'fake'
+
+    def image_to_string(self, image, config='', timeout=0):
+        time.sleep(0.01 * (12 - image.width % 12))
+        return f'{image.width} {config}'
+
+    def images_to_strings(self, images, config='', timeout=0):
+        return [self.image_to_string(image, config) for image in images]
+
+    def images_to_data(self, images, config='', timeout=0):
+        return [OCRResult(text) for text in self.images_to_strings(images, config)]
+
+
+class Tally:
+    ocr_calls = 0
+
+
+class FakePool:
+    """Runs ocr_pool with the fake backend and the given pool size for a with-block"""
+
+    def __init__(self, workers, spawns=True):
+        self.workers = workers
+        self.spawns = spawns
+
+    def __enter__(self):
+        self.saved = ocr_backend._backend, ocr_pool.OCR_POOL_WORKERS
+        # Pool workers are forked after this, so they inherit the fake backend
+        ocr_pool.shutdown()
+        ocr_backend._backend, ocr_pool.OCR_POOL_WORKERS = FakeBackend(self.spawns), self.workers
+        return self
+
+    def __exit__(self, *exc):
+        ocr_pool.shutdown()
+        ocr_backend._backend, ocr_pool.OCR_POOL_WORKERS = self.saved
+
+
+def images(count):
+    return [Image.new('L', (width, 10), 255) for width in range(1, count + 1)]
+
+
+def test_batches_group_consecutive_configs():
+    jobs = [(1, 'a'), (2, 'a'), (3, 'a'), (4, 'b'), (5, 'a')]
+    assert list(ocr_pool._batches(jobs, 2)) == [([1, 2], 'a'), ([3], 'a'), ([4], 'b'), ([5], 'a')]
+    assert list(ocr_pool._batches([], 2)) == []
+
+
+def test_batch_size_follows_backend():
+    with FakePool(1, spawns=True):
+        assert ocr_pool.batch_size() == max(ocr_pool.OCR_BATCH_SIZE, 1)
+    with FakePool(1, spawns=False):
+        assert ocr_pool.batch_size() == 1
+
+
+def test_results_in_job_order():
+    jobs = [(image, f'--psm {6 + image.width // 8}') for image in images(24)]
+    expected = [f'{image.width} {config}' for image, config in jobs]
+    for workers in (1, 3):
+        for batch in (1, 4):
+            tally = Tally()
+            with FakePool(workers):
+                texts = [result.text for result in ocr_pool.imap_ocr(jobs, tally=tally, batch=batch, window=2)]
+            assert texts == expected, (workers, batch)
+            assert tally.ocr_calls == len(jobs)
+
+
+def test_word_results_in_job_order():
+    jobs = [(image, '--psm 6') for image in images(10)]
+    with FakePool(2):
+        results = list(ocr_pool.imap_ocr(jobs, words=True, batch=3))
+    assert [result.text.split()[0] for result in results] == [str(width) for width in range(1, 11)]
+
+
+def test_closing_early_cancels_queued_jobs():
+    pulled = []
+
+    def jobs():
+        for image in images(40):
+            pulled.append(image.width)
+            yield image, '--psm 6'
+
+    tally = Tally()
+    with FakePool(2):
+        results = ocr_pool.imap_ocr(jobs(), tally=tally, window=4, batch=1)
+        first = [next(results).text for _ in range(3)]
+        results.close()
+    assert first == ['1 --psm 6', '2 --psm 6', '3 --psm 6']
+    # Jobs are pulled lazily: only what the window allowed was ever rendered
+    assert len(pulled) <= 3 + 4
+    # Cancelled jobs are not counted as Tesseract calls
+    assert 3 <= tally.ocr_calls <= len(pulled)
+
+
+def test_worker_errors_become_empty_results():
+    class Broken(FakeBackend):
+        def image_to_string(self, image, config='', timeout=0):
+            if image.width == 2:
+                raise RuntimeError('tesseract crashed')
+            return super().image_to_string(image, config, timeout)
+
+    with FakePool(2):
+        ocr_backend._backend = Broken()
+        texts = [result.text for result in ocr_pool.imap_ocr([(image, '') for image in images(3)], batch=1)]
+    assert texts == ['1 ', '', '3 ']
+
+
+if __name__ == "__main__":
+    print("Testing OCR pool...")
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✅ {name}")
+    print("\n=== Test Complete ===")
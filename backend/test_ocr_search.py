@@ -0,0 +1,156 @@
+"""
+Candidate search checks for OCRSearch and BaseDocumentProcessor.process_image,
+with a scripted OCR backend run in-process.
+
+    python test_ocr_search.py    (or: python -m pytest test_ocr_search.py)
+"""
+
+from PIL import Image, ImageDraw
+
+import ocr_backend
+import ocr_pool
+import ocr_processor
+from deadline import Deadline
+from ocr_backend import OCRResult
+from ocr_processor import DocumentOCRProcessor, GenericDocumentProcessor, OCRSearch
+
+NOISE = 'lorem ipsum dolor sit amet'
+FAIR = ('Certificate of Live Birth\nName: Juan Dela Cruz\nPlace of Birth: Quezon City, Manila\n'
+        'Mother: Maria Santos Dela Cruz\nFather: Pedro Dela Cruz')
+GOOD = FAIR + '\nDate of Birth: January 15, 2010\nRegistered: 01/20/2010\nBaptized: February 2, 2010'
+
+
+class ScriptedBackend:
+    """Returns the scripted text for the n-th Tesseract call (counting the OSD call) and NOISE otherwise"""
+
+    name = 'fake'
+
+    def __init__(self, script):
+        self.script = script
+        self.calls = 0
+
+    def _read(self):
+        self.calls += 1
+        return self.script.get(self.calls, NOISE)
+
+    def image_to_string(self, image, config='', timeout=0):
+        return self._read()
+
+    def images_to_strings(self, images, config='', timeout=0):
+        return [self._read() for _ in images]
+
+    def images_to_data(self, images, config='', timeout=0):
+        return [OCRResult(text) for text in self.images_to_strings(images, config)]
+
+    def detect_orientation(self, image, timeout=0):
+        self.calls += 1
+        return 0, 0.0
+
+
+class Scripted:
+    """Runs OCR in-process on a ScriptedBackend for a with-block"""
+
+    def __init__(self, script):
+        self.backend = ScriptedBackend(script)
+
+    def __enter__(self):
+        self.saved = ocr_backend._backend, ocr_pool.OCR_POOL_WORKERS
+        ocr_pool.shutdown()
+        ocr_backend._backend, ocr_pool.OCR_POOL_WORKERS = self.backend, 0
+        return self.backend
+
+    def __exit__(self, *exc):
+        ocr_backend._backend, ocr_pool.OCR_POOL_WORKERS = self.saved
+
+
+def page():
+    """A small scan with a few lines of 'text'"""
+    image = Image.new('L', (400, 300), 255)
+    draw = ImageDraw.Draw(image)
+    for y in range(40, 260, 30):
+        draw.rectangle((30, y, 370, y + 12), fill=0)
+    return image
+
+
+def search(processor, incremental=True, **kwargs):
+    # No win statistics: candidates run in their declared order
+    return OCRSearch(processor._candidate_score, processor.early_exit_score if incremental else None,
+                     document_type=processor.document_type, **kwargs)
+
+
+def test_offer_tracks_the_best_candidate():
+    processor = GenericDocumentProcessor()
+    improvements = []
+    state = search(processor, on_improvement=lambda text, score: improvements.append(text))
+    state.offer(FAIR, 'standard_preprocessing|0|--psm 6')
+    state.offer(NOISE, 'aggressive_preprocessing|3|--psm 4')
+    assert state.best_score == processor.score_text(FAIR) and not state.done
+    assert improvements == [FAIR] and state.best_source == 'standard_preprocessing|0|--psm 6'
+    state.offer(GOOD, 'aggressive_preprocessing|1|--psm 4')
+    assert improvements == [FAIR, GOOD]
+    assert state.best_score == processor.score_text(GOOD) >= processor.early_exit_score
+    assert state.done and state.candidates == 3
+    assert state.best_source == state.sources[GOOD] == 'aggressive_preprocessing|1|--psm 4'
+    # Without a target score the search never ends early
+    exhaustive = search(processor, incremental=False)
+    exhaustive.offer(GOOD)
+    assert not exhaustive.done and OCRSearch().best_score is None
+
+
+def test_deadline_stops_and_marks_partial():
+    deadline = Deadline(60)
+    state = search(GenericDocumentProcessor(), deadline=deadline)
+    assert not state.stopped
+    deadline._trip('deadline')
+    assert state.stopped and state.partial and not state.done
+
+
+def test_search_stops_at_target_score():
+    processor = GenericDocumentProcessor()
+    with Scripted({3: FAIR, 9: GOOD}) as backend:
+        state = search(processor)
+        text = processor.process_image(page(), state)
+    assert text == GOOD and state.done
+    # Nothing is read after the good-enough candidate
+    assert backend.calls == state.ocr_calls == 9
+    assert state.candidates == 8
+
+
+def test_exhaustive_search_returns_the_best_candidate():
+    processor = GenericDocumentProcessor()
+    with Scripted({3: FAIR, 9: GOOD, 40: FAIR}) as backend:
+        state = search(processor, incremental=False)
+        text = processor.process_image(page(), state)
+    assert text == GOOD and not state.done
+    assert backend.calls == state.ocr_calls > 40
+    # Every read after the OSD call was offered, escalations included
+    assert state.candidates == state.ocr_calls - 1
+    assert state.best_score == processor.score_text(GOOD)
+    assert state.winner == state.best_source == state.sources[GOOD]
+
+
+def test_expired_deadline_reads_nothing():
+    processor = GenericDocumentProcessor()
+    deadline = Deadline(60)
+    deadline._trip('deadline')
+    with Scripted({1: GOOD}) as backend:
+        state = search(processor, deadline=deadline)
+        assert processor.process_image(page(), state) == ''
+    assert backend.calls == state.ocr_calls == 0 and state.partial
+
+
+def test_early_exit_scores():
+    processor = DocumentOCRProcessor(early_exit_scores={'form137': 50})
+    assert processor.get_processor('form137').early_exit_score == 50
+    assert processor.get_processor('generic').early_exit_score == GenericDocumentProcessor.early_exit_score
+    assert ocr_processor._parse_early_exit_scores('birth_certificate=120, form137=x,generic') == {
+        'birth_certificate': 120.0}
+
+
+if __name__ == "__main__":
+    print("Testing OCR candidate search...")
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✅ {name}")
+    print("\n=== Test Complete ===")
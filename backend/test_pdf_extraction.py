@@ -0,0 +1,363 @@
+"""
+PDF routing checks for extractor_api.extract_document_fields and
+_extract_with_cache: per-page text layer vs OCR, and the adaptive render DPI.
+
+The PDFs are built here. A fake tesseract executable stands in for the real
+binary: it logs every image it is handed and answers with the text in
+FAKE_OCR_TEXT, except for the first FAKE_OCR_NOISE_CALLS images, which get
+noise. Rendered pages are recorded with their DPI.
+
+    python test_pdf_extraction.py    (or: python -m pytest test_pdf_extraction.py)
+"""
+
+import io
+import os
+import sys
+import zlib
+import tempfile
+
+from PIL import Image, ImageDraw, ImageFont
+
+import extractor_api
+import lazy_imports
+import ocr_pool
+import pdf_pages
+from result_cache import ResultCache
+
+LEARNER_LINES = [
+    'REPUBLIC OF THE PHILIPPINES',
+    'Department of Education',
+    'Learner Permanent Record for Elementary School (Form 137)',
+    'Learner Reference Number (LRN): 123456789012',
+    'Name: DELA CRUZ, JUAN MIGUEL   Date of Birth: January 15, 2010',
+    'Place of Birth: Quezon City   Sex: Male   Citizenship: Filipino',
+    'Father: DELA CRUZ, JOSE ANTONIO   Mother: SANTOS, MARIA ELENA',
+]
+HISTORY_LINES = [
+    'Elementary School Progress',
+    'School Year: 2019-2020',
+    'Grade Level: Grade 5',
+    'Learning Areas   First Quarter   Second Quarter   Third Quarter   Fourth Quarter   Final Rating',
+    'Filipino   88   89   90   91   90   Passed',
+    'English   85   87   88   90   88   Passed',
+    'Mathematics   90   91   92   93   92   Passed',
+    'Science   86   88   89   90   88   Passed',
+]
+COVER_LINES = LEARNER_LINES + HISTORY_LINES
+
+# What the fake tesseract reads from scanned pages
+SCANNED_TEXT = '\n'.join(COVER_LINES) + '\n'
+
+FAKE_TESSERACT = '''#!{python}
+import os, sys
+if sys.argv[1:] == ['--version']:
+    print('tesseract 5.3.0')
+    sys.exit(0)
+from PIL import Image
+input_path, output_base = sys.argv[1], sys.argv[2]
+width, height = Image.open(input_path).size
+with open(os.environ['FAKE_OCR_LOG'], 'a+') as log:
+    log.seek(0)
+    calls = len(log.readlines())
+    log.write(f'{{width}} {{height}}\\n')
+text = os.environ.get('FAKE_OCR_TEXT', '')
+if calls < int(os.environ.get('FAKE_OCR_NOISE_CALLS', '0')):
+    text = '~~ |# ~~ ;; ^^'
+with open(output_base + '.txt', 'w') as out:
+    out.write(text)
+'''
+
+LETTER = (612, 792)
+LETTER_WIDTH_INCHES = 8.5
+
+
+def _pdf(objects):
+    """Serialize numbered PDF objects (1 is the catalog) with a valid xref table"""
+    out = io.BytesIO()
+    out.write(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b'%d 0 obj\n' % number + body + b'\nendobj\n')
+    xref = out.tell()
+    out.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b'%010d 00000 n \n' % offset)
+    out.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def _stream(data, extra=b''):
+    return b'<< /Length %d %s>>\nstream\n' % (len(data), extra) + data + b'\nendstream'
+
+
+def scanned_page(dpi, text='CERTIFICATE OF LIVE BIRTH'):
+    """A letter-size page scan at the given DPI"""
+    image = Image.new('L', (int(8.5 * dpi), int(11 * dpi)), 255)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=max(dpi // 6, 10))
+    for number in range(12):
+        draw.text((dpi, dpi + number * dpi // 2), text, fill=0, font=font)
+    return image
+
+
+def create_test_pdf(pages):
+    """
+    A letter-size PDF from ('text', [lines]) and ('scan', image) pages: text
+    pages have a real text layer, scan pages are a single full-page image
+    """
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>', None,
+               b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    page_numbers = []
+    for kind, content in pages:
+        if kind == 'text':
+            ops = [b'BT /F1 11 Tf 14 TL 60 740 Td']
+            for line in content:
+                ops.append(b'(%s) Tj T*' % line.replace('(', '\\(').replace(')', '\\)').encode('latin-1'))
+            ops.append(b'ET')
+            objects.append(_stream(b'\n'.join(ops)))
+            resources = b'<< /Font << /F1 3 0 R >> >>'
+        else:
+            data = zlib.compress(content.tobytes())
+            objects.append(_stream(data, b'/Type /XObject /Subtype /Image /Width %d /Height %d '
+                                         b'/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode '
+                                   % content.size))
+            image_number = len(objects)
+            objects.append(_stream(b'q %d 0 0 %d 0 0 cm /Im0 Do Q' % LETTER))
+            resources = b'<< /XObject << /Im0 %d 0 R >> >>' % image_number
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R /Resources %s >>'
+                       % (LETTER + (len(objects), resources)))
+        page_numbers.append(len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % number for number in page_numbers), len(page_numbers))
+    return _pdf(objects)
+
+
+class FakeTesseract:
+    """
+    Installs the fake tesseract for a with-block; collects the images it saw
+    and the DPI of every rendered page
+    """
+
+    def __init__(self, text=SCANNED_TEXT, noise_calls=0, workers=1):
+        self.text = text
+        self.noise_calls = noise_calls
+        self.workers = workers
+        self.rendered = []
+
+    def __enter__(self):
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, 'tesseract')
+        with open(path, 'w') as f:
+            f.write(FAKE_TESSERACT.format(python=sys.executable))
+        os.chmod(path, 0o755)
+        self.log = os.path.join(self.directory.name, 'calls.log')
+        open(self.log, 'w').close()
+        self.saved = (lazy_imports.tesseract_cmd(), ocr_pool.OCR_POOL_WORKERS,
+                      {name: os.environ.get(name) for name in ('FAKE_OCR_LOG', 'FAKE_OCR_TEXT', 'FAKE_OCR_NOISE_CALLS')},
+                      pdf_pages.render_pages)
+        os.environ.update(FAKE_OCR_LOG=self.log, FAKE_OCR_TEXT=self.text, FAKE_OCR_NOISE_CALLS=str(self.noise_calls))
+        lazy_imports.set_tesseract_cmd(path)
+
+        render_pages = pdf_pages.render_pages
+
+        def recording_render_pages(*args, **kwargs):
+            for image in render_pages(*args, **kwargs):
+                self.rendered.append(round(image.width / LETTER_WIDTH_INCHES))
+                yield image
+
+        pdf_pages.render_pages = recording_render_pages
+        # Pool workers are forked after this, so they see the fake too
+        ocr_pool.shutdown()
+        ocr_pool.OCR_POOL_WORKERS = self.workers
+        return self
+
+    def __exit__(self, *exc):
+        ocr_pool.shutdown()
+        cmd, ocr_pool.OCR_POOL_WORKERS, environ, pdf_pages.render_pages = self.saved
+        lazy_imports.set_tesseract_cmd(cmd)
+        for name, value in environ.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        self.directory.cleanup()
+
+    @property
+    def calls(self):
+        with open(self.log) as f:
+            return [tuple(int(value) for value in line.split()) for line in f if line.strip()]
+
+
+def sources(payload):
+    return [entry['source'] for entry in payload['pageSources']]
+
+
+def test_page_resolution():
+    for dpi, expected in ((100, 150), (150, 150), (240, 240), (400, 300)):
+        pdf = create_test_pdf([('scan', scanned_page(dpi))])
+        # Never above the scan (but at least OCR_PDF_MIN_RESOLUTION), never above OCR_PDF_RESOLUTION
+        assert pdf_pages.page_resolutions(pdf) == [expected], dpi
+    text_pdf = create_test_pdf([('text', COVER_LINES)])
+    # Letter is 11in tall: 300 DPI stays under OCR_PDF_MAX_DIMENSION
+    assert pdf_pages.page_resolutions(text_pdf) == [300]
+    assert pdf_pages.page_resolutions(text_pdf, max_resolution=200) == [200]
+
+
+def test_text_layer_pdf_is_not_ocrd():
+    pdf = create_test_pdf([('text', COVER_LINES), ('text', COVER_LINES)])
+    with FakeTesseract() as tesseract:
+        payload, status = extractor_api.extract_document_fields(pdf, 'form137.pdf', early_stop=False)
+        assert status == 200
+        assert sources(payload) == ['text', 'text']
+        assert (payload['surname'], payload['dateOfBirth']) == ('Dela Cruz', 'January 15, 2010')
+        assert tesseract.calls == []
+
+
+def test_scanned_pdf_is_ocrd_at_the_scan_resolution():
+    pdf = create_test_pdf([('scan', scanned_page(150)), ('scan', scanned_page(150))])
+    with FakeTesseract(workers=2) as tesseract:
+        payload, status = extractor_api.extract_document_fields(pdf, 'form137.pdf', early_stop=False)
+        assert status == 200
+        assert sources(payload) == ['ocr', 'ocr']
+        assert (payload['surname'], payload['dateOfBirth']) == ('Dela Cruz', 'January 15, 2010')
+        assert len(tesseract.calls) == 2
+        # The 150 DPI scans are not upsampled to OCR_PDF_RESOLUTION
+        assert tesseract.rendered == [150, 150]
+
+
+def test_mixed_pdf_only_ocrs_scanned_pages():
+    pdf = create_test_pdf([('text', COVER_LINES), ('scan', scanned_page(150)), ('text', COVER_LINES)])
+    with FakeTesseract() as tesseract:
+        payload, status = extractor_api.extract_document_fields(pdf, 'form137.pdf', early_stop=False)
+        assert status == 200
+        assert sources(payload) == ['text', 'ocr', 'text']
+        assert len(tesseract.calls) == 1
+        assert tesseract.rendered == [150]
+
+
+def test_good_draft_is_not_escalated():
+    pdf = create_test_pdf([('scan', scanned_page(300))])
+    with FakeTesseract() as tesseract:
+        payload, _ = extractor_api.extract_document_fields(pdf, 'form137.pdf', early_stop=False)
+        assert sources(payload) == ['ocr']
+        assert tesseract.rendered == [pdf_pages.OCR_PDF_DRAFT_RESOLUTION]
+        assert len(tesseract.calls) == 1
+
+
+def test_poor_draft_is_escalated_to_full_resolution():
+    pdf = create_test_pdf([('scan', scanned_page(300))])
+    with FakeTesseract(noise_calls=1) as tesseract:
+        payload, _ = extractor_api.extract_document_fields(pdf, 'form137.pdf', early_stop=False)
+        assert sources(payload) == ['ocr']
+        assert tesseract.rendered == [pdf_pages.OCR_PDF_DRAFT_RESOLUTION, 300]
+        assert len(tesseract.calls) == 2
+        assert payload['surname'] == 'Dela Cruz'
+
+
+def test_weak_ocr_keeps_garbled_text_layer():
+    # A garbled text layer is OCR'd, but stays the page text unless OCR clearly beats it
+    pdf = create_test_pdf([('text', ['x y z', 'q w'])])
+    with FakeTesseract(text='x y') as tesseract:
+        payload, _ = extractor_api.extract_document_fields(pdf, 'form137.pdf', early_stop=False)
+        assert sources(payload) == ['text']
+        # The poor draft was escalated to the full DPI before giving up
+        assert tesseract.rendered == [pdf_pages.OCR_PDF_DRAFT_RESOLUTION, 300]
+
+
+def test_early_stop_skips_remaining_pages():
+    pdf = create_test_pdf([('text', COVER_LINES), ('scan', scanned_page(150))])
+    with FakeTesseract() as tesseract:
+        payload, status = extractor_api.extract_document_fields(pdf, 'form137.pdf', early_stop=True)
+        assert status == 200
+        assert all(payload[field] for field in extractor_api.REQUIRED_FIELDS['form137'])
+        # The cover page had every required field: the scan behind it is never rendered
+        assert sources(payload) == ['text', 'skipped']
+        assert tesseract.rendered == [] and tesseract.calls == []
+
+
+def test_later_page_fields_survive_the_default_path():
+    # The grade history is on page 2, behind a complete learner box
+    pdf = create_test_pdf([('text', LEARNER_LINES), ('text', HISTORY_LINES)])
+    original = extractor_api.get_cache
+    extractor_api.get_cache = lambda: ResultCache(1024 * 1024)
+    try:
+        with FakeTesseract():
+            payload, status = extractor_api.extract_document_fields(pdf, 'form137.pdf')
+            assert status == 200 and sources(payload) == ['text', 'text']
+            assert (payload['schoolYear'], payload['gradeLevel']) == ('2019-2020', '5')
+            # What /api/extract-pdf runs for the Node controller, which sends no options
+            payload, status, _ = extractor_api._extract_with_cache(pdf, 'form137.pdf')
+            assert (payload['schoolYear'], payload['gradeLevel']) == ('2019-2020', '5')
+            # With the early stop on, the learner box alone does not end the read
+            payload, _ = extractor_api.extract_document_fields(pdf, 'form137.pdf', early_stop=True)
+            assert sources(payload) == ['text', 'text']
+            assert payload['schoolYear'] == '2019-2020'
+    finally:
+        extractor_api.get_cache = original
+
+
+def test_extract_with_cache_serves_repeat_pdf_uploads():
+    pdf = create_test_pdf([('text', COVER_LINES), ('scan', scanned_page(150))])
+    original = extractor_api.get_cache
+    cache = ResultCache(1024 * 1024)
+    extractor_api.get_cache = lambda: cache
+    try:
+        with FakeTesseract() as tesseract:
+            payload, status, cached = extractor_api._extract_with_cache(pdf, 'form137.pdf', full_history=True)
+            assert (status, cached) == (200, False)
+            assert sources(payload) == ['text', 'ocr']
+            again, status, cached = extractor_api._extract_with_cache(pdf, 'form137.pdf', full_history=True)
+            assert (status, cached) == (200, True)
+            assert again == payload
+            assert len(tesseract.calls) == 1
+    finally:
+        extractor_api.get_cache = original
+
+
+def test_declared_document_type_is_a_type_hint():
+    # A grade history page alone names no form
+    pdf = create_test_pdf([('text', HISTORY_LINES)])
+    with FakeTesseract():
+        payload, status = extractor_api.extract_document_fields(pdf, 'upload.pdf')
+        assert status == 200 and 'gradeLevel' not in payload
+        for declared in ('form137', 'FORM137'):
+            payload, status = extractor_api.extract_document_fields(pdf, 'upload.pdf', document_type=declared)
+            assert (payload['schoolYear'], payload['gradeLevel']) == ('2019-2020', '5')
+        # Types the pipeline has no extractor for leave the detection alone
+        payload, _ = extractor_api.extract_document_fields(pdf, 'upload.pdf', document_type='form138')
+        assert 'gradeLevel' not in payload
+
+
+def test_declared_document_type_in_the_cache_key():
+    cache = ResultCache(1024 * 1024)
+    key = lambda document_type, filename='upload.pdf': extractor_api._cache_key(cache, b'%PDF', filename, document_type)
+    assert key('form137') != key(None) != key('birth_certificate')
+    # Values that change nothing share the undeclared entry
+    assert key('auto') == key('generic') == key(None)
+    assert key('form137', 'upload.pdf') != key('form137', 'upload.png')
+
+
+def test_extract_pdf_passes_the_declared_type():
+    pdf = create_test_pdf([('text', HISTORY_LINES)])
+    original = extractor_api.get_cache
+    extractor_api.get_cache = lambda: ResultCache(1024 * 1024)
+    try:
+        with FakeTesseract():
+            client = extractor_api.app.test_client()
+            payloads = [client.post('/api/extract-pdf', data=dict(form, document=(io.BytesIO(pdf), 'upload.pdf')),
+                                    content_type='multipart/form-data').get_json()
+                        for form in ({}, {'document_type': 'form137'})]
+    finally:
+        extractor_api.get_cache = original
+    assert 'gradeLevel' not in payloads[0]
+    assert payloads[1]['gradeLevel'] == '5'
+
+
+if __name__ == "__main__":
+    print("Testing PDF extraction...")
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✅ {name}")
+    print("\n=== Test Complete ===")
@@ -0,0 +1,153 @@
+"""
+Checks for ocr_processor.process_document, the serverless pipeline, and the
+api/ocr.py function that serves it: text-layer PDFs without OCR, first-page
+OCR of scanned PDFs, the time budget and the accepted inputs.
+
+OCR runs in-process on a fake backend that reads every image as the same text.
+
+    python test_process_document.py    (or: python -m pytest test_process_document.py)
+"""
+
+import io
+import os
+import time
+import importlib.util
+
+from werkzeug.datastructures import FileStorage
+
+import ocr_backend
+import ocr_pool
+import ocr_processor
+import pdf_pages
+from ocr_backend import OCRResult
+from test_pdf_extraction import COVER_LINES, SCANNED_TEXT, create_test_pdf, scanned_page
+
+API_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api', 'ocr.py')
+
+
+class TextBackend:
+    """Reads every image as the same text, after an optional delay"""
+
+    name = 'fake'
+
+    def __init__(self, text=SCANNED_TEXT, delay=0.0):
+        self.text = text
+        self.delay = delay
+        self.calls = 0
+
+    def image_to_string(self, image, config='', timeout=0):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.text
+
+    def images_to_strings(self, images, config='', timeout=0):
+        return [self.image_to_string(image, config, timeout) for image in images]
+
+    def images_to_data(self, images, config='', timeout=0):
+        return [OCRResult(text) for text in self.images_to_strings(images, config, timeout)]
+
+    def detect_orientation(self, image, timeout=0):
+        self.calls += 1
+        return 0, 0.0
+
+
+class Serverless:
+    """Runs process_document on a TextBackend in-process for a with-block; records the rendered pages"""
+
+    def __init__(self, backend=None):
+        self.backend = backend or TextBackend()
+        self.rendered = []
+        self.closed = []
+
+    def __enter__(self):
+        self.saved = ocr_backend._backend, ocr_pool.OCR_POOL_WORKERS, pdf_pages.render_pages
+        ocr_pool.shutdown()
+        ocr_backend._backend, ocr_pool.OCR_POOL_WORKERS = self.backend, 0
+        render_pages = pdf_pages.render_pages
+
+        def recording_render_pages(*args, **kwargs):
+            try:
+                for image in render_pages(*args, **kwargs):
+                    self.rendered.append((kwargs.get('pages'), image.size))
+                    yield image
+            finally:
+                self.closed.append(True)
+
+        pdf_pages.render_pages = recording_render_pages
+        return self.backend
+
+    def __exit__(self, *exc):
+        ocr_backend._backend, ocr_pool.OCR_POOL_WORKERS, pdf_pages.render_pages = self.saved
+
+
+def png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def test_text_layer_pdf_is_not_ocrd():
+    with Serverless() as backend:
+        result = ocr_processor.process_document(create_test_pdf([('text', COVER_LINES)]))
+    assert result['source'] == 'text_layer' and result['document_type'] == 'form137'
+    assert result['ocr_calls'] == backend.calls == 0
+    assert 'Learner Reference Number' in result['text'] and not result['partial']
+
+
+def test_scanned_pdf_ocrs_the_first_page_only():
+    pdf = create_test_pdf([('scan', scanned_page(150)), ('scan', scanned_page(150))])
+    serverless = Serverless()
+    with serverless as backend:
+        result = ocr_processor.process_document(pdf, 'form137', filename='scan.pdf')
+    assert result['source'] == 'ocr' and result['document_type'] == 'form137'
+    assert [pages for pages, _ in serverless.rendered] == [[0]]
+    # The render generator is closed once the page is taken
+    assert serverless.closed == [True]
+    assert result['ocr_calls'] == backend.calls > 0
+    assert 'Learner Reference Number' in result['text']
+
+
+def test_budget_marks_partial_results():
+    serverless = Serverless(TextBackend('lorem ipsum dolor sit amet', delay=0.1))
+    with serverless as backend:
+        started = time.monotonic()
+        result = ocr_processor.process_document(png(scanned_page(100)), 'generic', budget_seconds=0.3)
+    assert result['partial'] is True
+    assert result['ocr_calls'] == backend.calls
+    assert time.monotonic() - started < 2 and result['elapsed_seconds'] < 2
+
+
+def test_file_inputs():
+    pdf = create_test_pdf([('text', COVER_LINES)])
+    upload = FileStorage(stream=io.BytesIO(pdf), filename='Form137.PDF')
+    with Serverless():
+        assert ocr_processor.process_document(upload)['source'] == 'text_layer'
+        assert ocr_processor.process_document(io.BytesIO(pdf))['source'] == 'text_layer'
+        # Image uploads go straight to OCR
+        result = ocr_processor.process_document(FileStorage(stream=io.BytesIO(png(scanned_page(100))),
+                                                            filename='scan.png'), 'form137')
+    assert result['source'] == 'ocr'
+
+
+def test_api_function():
+    spec = importlib.util.spec_from_file_location('api_ocr', API_PATH)
+    api = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(api)
+    client = api.app.test_client()
+    with Serverless():
+        response = client.post('/api/ocr', data={'file': (io.BytesIO(create_test_pdf([('text', COVER_LINES)])),
+                                                          'form137.pdf')}, content_type='multipart/form-data')
+        assert response.status_code == 200
+        data = response.get_json()['data']
+        assert data['source'] == 'text_layer' and data['document_type'] == 'form137'
+        assert client.post('/api/ocr', data={}).status_code == 400
+        assert client.get('/api/ocr').status_code == 405
+
+
+if __name__ == "__main__":
+    print("Testing serverless document processing...")
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✅ {name}")
+    print("\n=== Test Complete ===")
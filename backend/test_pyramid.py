@@ -0,0 +1,130 @@
+"""
+Scale selection and escalation checks for pyramid.py and the pyramid search
+in BaseDocumentProcessor._run_strategies, on synthetic pages whose
+"characters" are solid blocks of a known height.
+
+    python test_pyramid.py    (or: python -m pytest test_pyramid.py)
+"""
+
+from PIL import Image, ImageDraw
+
+import pyramid
+from ocr_processor import GenericDocumentProcessor, OCRSearch
+from pyramid import ResolutionPyramid
+from strategy_stats import combination_key
+from test_ocr_search import GOOD, NOISE
+
+
+def glyph_page(glyph_height, width=1000, height=1300, lines=8):
+    """A white page with lines of black glyph-sized blocks, glyph_height pixels tall"""
+    page = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(page)
+    glyph_width = max(2, int(glyph_height * 0.6))
+    top = height // 10
+    for line in range(lines):
+        y = top + line * int(glyph_height * 2.5)
+        if y + glyph_height > height:
+            break
+        for x in range(width // 10, width * 9 // 10 - glyph_width, glyph_width * 2):
+            draw.rectangle((x, y, x + glyph_width - 1, y + glyph_height - 1), fill=0)
+    return page
+
+
+class RecordingProcessor(GenericDocumentProcessor):
+    """Two strategies whose 'OCR' returns the scripted text per (strategy, level width)"""
+
+    def __init__(self, texts=None):
+        super().__init__()
+        self.texts = texts or {}
+        self.runs = []
+
+    def _strategies(self):
+        return [self._standard_preprocessing, self._aggressive_preprocessing]
+
+    def _run_strategy(self, name, strategy, image, search):
+        if search.stopped:
+            return []
+        self.runs.append((name, image.width))
+        text = self.texts.get((name, image.width), NOISE)
+        search.offer(text, combination_key(name, 0, '--psm 6'))
+        return [text]
+
+
+def search(processor):
+    return OCRSearch(processor._candidate_score, processor.early_exit_score)
+
+
+def test_first_level_is_the_smallest_legible_scale():
+    # 10px glyphs need doubling to reach OCR_MIN_TEXT_HEIGHT (20px)
+    page = ResolutionPyramid.for_page(glyph_page(10))
+    assert abs(page.text_height - 10) <= 1
+    assert abs(page.scales[0] - pyramid.OCR_MIN_TEXT_HEIGHT / page.text_height) < 1e-9
+    assert len(page.scales) == pyramid.OCR_PYRAMID_LEVELS
+    # One OCR_PYRAMID_STEP per level, the last one capped at OCR_MAX_SCALED_WIDTH
+    max_scale = pyramid.OCR_MAX_SCALED_WIDTH / 1000
+    for smaller, larger in zip(page.scales, page.scales[1:]):
+        assert abs(larger - min(smaller * pyramid.OCR_PYRAMID_STEP, max_scale)) < 1e-9
+    assert page.scales[-1] == max_scale
+
+
+def test_large_glyphs_start_below_native_size():
+    page = ResolutionPyramid.for_page(glyph_page(40))
+    assert page.scales[0] < 1.0
+    assert page.level(page.scales[0]).width < 1000
+
+
+def test_pyramid_stops_at_the_width_cap():
+    # A wide page reaches OCR_MAX_SCALED_WIDTH after one step
+    page = ResolutionPyramid.for_page(glyph_page(18, width=3000, height=2000))
+    max_scale = pyramid.OCR_MAX_SCALED_WIDTH / 3000
+    assert page.scales[0] < max_scale and page.scales[1] == max_scale and len(page.scales) == 2
+    assert page.level(max_scale).width == pyramid.OCR_MAX_SCALED_WIDTH
+    # Small glyphs on a page already at the cap leave a single level
+    assert ResolutionPyramid.for_page(glyph_page(10, width=3000, height=2000)).scales == [max_scale]
+
+
+def test_levels_are_cached():
+    page = ResolutionPyramid.for_page(glyph_page(10))
+    assert page.level(page.scales[1]) is page.level(page.scales[1])
+    assert page.level(page.scales[1]).width == round(1000 * page.scales[1])
+
+
+def test_fixed_mode_is_a_single_level():
+    original = pyramid.OCR_SCALE_MODE
+    pyramid.OCR_SCALE_MODE = 'fixed'
+    try:
+        page = ResolutionPyramid.for_mode(glyph_page(10))
+    finally:
+        pyramid.OCR_SCALE_MODE = original
+    assert len(page.scales) == 1 and page.scales[0] > pyramid.OCR_MIN_TEXT_HEIGHT / 10
+
+
+def test_escalation_retries_only_the_best_strategy():
+    processor = RecordingProcessor()
+    state = search(processor)
+    page = glyph_page(10)
+    processor._run_strategies(page, state)
+    widths = [round(1000 * scale) for scale in ResolutionPyramid.for_page(page).scales]
+    # Every level is tried while nothing is good enough, and the search ends at the top of the pyramid
+    assert processor.runs == [('standard_preprocessing', widths[0]), ('aggressive_preprocessing', widths[0])] + [
+        ('standard_preprocessing', width) for width in widths[1:]]
+    assert not state.done
+
+
+def test_good_enough_candidate_stops_escalation():
+    page = glyph_page(10)
+    first = round(1000 * ResolutionPyramid.for_page(page).scales[0])
+    processor = RecordingProcessor({('aggressive_preprocessing', first): GOOD})
+    state = search(processor)
+    assert processor._run_strategies(page, state) == GOOD
+    assert processor.runs == [('standard_preprocessing', first), ('aggressive_preprocessing', first)]
+    assert state.done and state.winner == combination_key('aggressive_preprocessing', 0, '--psm 6')
+
+
+if __name__ == "__main__":
+    print("Testing resolution pyramid...")
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✅ {name}")
+    print("\n=== Test Complete ===")
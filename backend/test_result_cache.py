@@ -0,0 +1,112 @@
+"""
+Key and tier checks for result_cache.py.
+
+    python test_result_cache.py    (or: python -m pytest test_result_cache.py)
+"""
+
+import os
+import json
+import tempfile
+
+import result_cache
+from result_cache import ResultCache
+
+
+def test_key_depends_on_content_type_and_version():
+    cache = ResultCache(1024)
+    key = cache.make_key(b'scan', 'birth_certificate')
+    assert key == cache.make_key(b'scan', 'birth_certificate')
+    assert key != cache.make_key(b'scan 2', 'birth_certificate')
+    assert key != cache.make_key(b'scan', 'form137')
+    assert cache.make_key(b'scan') == cache.make_key(b'scan', 'auto')
+    assert key.endswith(result_cache.PIPELINE_VERSION)
+
+
+def test_key_covers_template_file():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'templates.json')
+        original = os.environ.get('OCR_TEMPLATES_PATH')
+        os.environ['OCR_TEMPLATES_PATH'] = path
+        try:
+            # A missing file means the built-in templates
+            assert ResultCache(1024).pipeline_version == result_cache.PIPELINE_VERSION
+            with open(path, 'w') as f:
+                json.dump({'birth_certificate': []}, f)
+            first = ResultCache(1024).make_key(b'scan')
+            with open(path, 'w') as f:
+                json.dump({'form137': []}, f)
+            second = ResultCache(1024).make_key(b'scan')
+        finally:
+            if original is None:
+                os.environ.pop('OCR_TEMPLATES_PATH')
+            else:
+                os.environ['OCR_TEMPLATES_PATH'] = original
+    assert first != second
+    assert first.startswith(ResultCache(1024).make_key(b'scan'))
+
+
+def test_memory_tier_round_trip():
+    cache = ResultCache(1024)
+    assert cache.get('a') is None
+    cache.set('a', {'firstName': 'Juan', 'partial': False})
+    assert cache.contains('a')
+    assert cache.get('a') == {'firstName': 'Juan', 'partial': False}
+    # Results are copies: callers may mutate what they get
+    cache.get('a')['firstName'] = 'Pedro'
+    assert cache.get('a')['firstName'] == 'Juan'
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (3, 1, 1)
+
+
+def test_memory_tier_evicts_least_recently_used_by_size():
+    value = {'text': 'x' * 80}
+    size = len(json.dumps(value))
+    cache = ResultCache(size * 3)
+    for key in 'abc':
+        cache.set(key, value)
+    cache.get('a')
+    cache.set('d', value)
+    assert not cache.contains('b')
+    assert all(cache.contains(key) for key in 'acd')
+    assert cache.stats()['bytes'] <= cache.max_bytes
+    # Results larger than the whole budget are not kept
+    cache.set('big', {'text': 'x' * size * 4})
+    assert not cache.contains('big') and cache.contains('d')
+
+
+def test_disk_tier_survives_restart():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResultCache(1024, directory)
+        key = cache.make_key(b'scan', 'form137')
+        cache.set(key, {'lrn': '123456789012'})
+
+        restarted = ResultCache(1024, directory)
+        assert restarted.stats()['entries'] == 0
+        assert restarted.contains(key)
+        assert restarted.get(key) == {'lrn': '123456789012'}
+        # Promoted into memory on the first hit
+        assert restarted.stats()['entries'] == 1
+        assert not any(name.endswith('.tmp') for _, _, names in os.walk(directory) for name in names)
+
+
+def test_disk_tier_without_memory_tier():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResultCache(0, directory)
+        cache.set('key', {'sex': 'Male'})
+        assert cache.stats()['entries'] == 0
+        assert cache.get('key') == {'sex': 'Male'}
+
+
+def test_unserializable_results_are_skipped():
+    cache = ResultCache(1024)
+    cache.set('key', {'image': object()})
+    assert not cache.contains('key')
+
+
+if __name__ == "__main__":
+    print("Testing result cache...")
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✅ {name}")
+    print("\n=== Test Complete ===")
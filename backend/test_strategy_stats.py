@@ -0,0 +1,133 @@
+"""
+Persistence and pruning checks for strategy_stats.py.
+
+    python test_strategy_stats.py    (or: python -m pytest test_strategy_stats.py)
+"""
+
+import os
+import json
+import tempfile
+
+from strategy_stats import StrategyStats, combination_key, combination_strategy
+
+STANDARD_6 = combination_key('standard', 0, '--psm 6')
+STANDARD_4 = combination_key('standard', 1, '--psm 4')
+MOBILE_6 = combination_key('mobile', 0, '--psm 6')
+
+
+def with_stats_file(check):
+    with tempfile.TemporaryDirectory() as directory:
+        return check(os.path.join(directory, 'ocr_strategy_stats.json'))
+
+
+def test_combination_keys():
+    assert STANDARD_6 == 'standard|0|--psm 6'
+    assert combination_strategy(STANDARD_6) == 'standard'
+    # Configs may contain the separator
+    assert combination_strategy(combination_key('name', 2, '-c a=|b')) == 'name'
+
+
+def test_records_survive_restart():
+    def check(path):
+        stats = StrategyStats(path)
+        stats.record('form137', STANDARD_6)
+        stats.record('form137', STANDARD_6)
+        stats.record('form137', None)
+        restarted = StrategyStats(path)
+        assert restarted.runs('form137') == 3
+        assert restarted.win_rate('form137', STANDARD_6) == 2 / 3
+        with open(path) as f:
+            assert json.load(f) == {'form137': {'runs': 3, 'wins': {STANDARD_6: 2}}}
+        assert not [name for name in os.listdir(os.path.dirname(path)) if name.endswith('.tmp')]
+    with_stats_file(check)
+
+
+def test_processes_sharing_a_file_merge_their_counts():
+    def check(path):
+        first, second = StrategyStats(path), StrategyStats(path)
+        first.record('birth_certificate', STANDARD_6)
+        second.record('birth_certificate', MOBILE_6)
+        second.record('form138', MOBILE_6)
+        first.record('birth_certificate', STANDARD_6)
+        merged = StrategyStats(path)
+        assert merged.runs('birth_certificate') == 3
+        assert merged.win_rate('birth_certificate', MOBILE_6) == 1 / 3
+        assert merged.runs('form138') == 1
+        # Each process sees the other's counts after its own next save
+        assert first.runs('birth_certificate') == 3
+        assert first.runs('form138') == 1
+    with_stats_file(check)
+
+
+def test_corrupt_or_missing_file():
+    def check(path):
+        assert StrategyStats(path).runs('form137') == 0
+        with open(path, 'w') as f:
+            f.write('{"form137": ')
+        stats = StrategyStats(path)
+        assert stats.runs('form137') == 0
+        stats.record('form137', STANDARD_6)
+        assert StrategyStats(path).runs('form137') == 1
+    with_stats_file(check)
+
+
+def test_no_path_disables_recording():
+    stats = StrategyStats('')
+    stats.record('form137', STANDARD_6)
+    assert stats.runs('form137') == 0
+
+
+def test_order_strategies_by_wins():
+    def check(path):
+        stats = StrategyStats(path)
+        for winner in (MOBILE_6, MOBILE_6, STANDARD_4):
+            stats.record('form137', winner)
+        assert stats.order_strategies('form137', ['standard', 'aggressive', 'mobile']) == \
+            ['mobile', 'standard', 'aggressive']
+        # Unknown document types keep the given order
+        assert stats.order_strategies('form138', ['standard', 'mobile']) == ['standard', 'mobile']
+    with_stats_file(check)
+
+
+def test_plan_prunes_only_after_enough_samples():
+    pairs = [(0, '--psm 6'), (1, '--psm 4'), (2, '--psm 3')]
+
+    def check(path):
+        stats = StrategyStats(path, min_samples=10, prune_below=0.05, explore_every=0)
+        for _ in range(9):
+            stats.record('form137', STANDARD_4)
+        # Below min_samples: ordered by wins, nothing pruned
+        assert stats.plan('form137', 'standard', pairs) == [(1, '--psm 4'), (0, '--psm 6'), (2, '--psm 3')]
+        stats.record('form137', STANDARD_6)
+        assert stats.plan('form137', 'standard', pairs) == [(1, '--psm 4'), (0, '--psm 6')]
+        assert stats.plan('form137', 'standard', pairs, explore=True) == \
+            [(1, '--psm 4'), (0, '--psm 6'), (2, '--psm 3')]
+        # A strategy that never won keeps its best pair
+        assert stats.plan('form137', 'mobile', pairs) == [(0, '--psm 6')]
+        table = stats.table()['form137']
+        assert table['runs'] == 10
+        assert [(row['variant'], row['wins'], row['pruned']) for row in table['combinations']] == \
+            [(1, 9, False), (0, 1, False)]
+    with_stats_file(check)
+
+
+def test_should_explore():
+    def check(path):
+        stats = StrategyStats(path, min_samples=2, explore_every=3)
+        assert stats.should_explore('form137')
+        for _ in range(4):
+            stats.record('form137', STANDARD_6)
+        assert not stats.should_explore('form137')
+        stats.record('form137', STANDARD_6)
+        stats.record('form137', STANDARD_6)
+        assert stats.should_explore('form137')
+    with_stats_file(check)
+
+
+if __name__ == "__main__":
+    print("Testing strategy stats...")
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✅ {name}")
+    print("\n=== Test Complete ===")
@@ -0,0 +1,88 @@
+"""
+Glyph size and scale checks for text_metrics.py on synthetic pages whose
+"characters" are solid blocks of a known height.
+
+    python test_text_metrics.py    (or: python -m pytest test_text_metrics.py)
+"""
+
+from PIL import Image
+
+import lazy_imports
+import text_metrics
+from test_pyramid import glyph_page
+from text_metrics import estimate_text_height, ocr_scale, resize_by, scale_for_ocr
+
+
+def without_opencv(check):
+    """Run check() as if OpenCV were not installed"""
+    original = lazy_imports.cv2
+    lazy_imports.cv2 = lambda: None
+    try:
+        return check()
+    finally:
+        lazy_imports.cv2 = original
+
+
+def test_estimate_text_height():
+    for glyph_height in (10, 24, 60):
+        assert abs(estimate_text_height(glyph_page(glyph_height)) - glyph_height) <= 1, glyph_height
+    # Pages are measured on a copy at most MEASURE_MAX_DIMENSION wide, but reported at their own size
+    large = glyph_page(40, width=4000, height=3000)
+    assert abs(estimate_text_height(large) - 40) <= 2
+    assert estimate_text_height(glyph_page(24).convert('RGB')) == estimate_text_height(glyph_page(24))
+
+
+def test_estimate_text_height_without_opencv():
+    # Line heights stand in for the components, scaled down to a character height
+    height = without_opencv(lambda: estimate_text_height(glyph_page(24)))
+    assert abs(height - 24 * 0.75) <= 1
+
+
+def test_unmeasurable_pages():
+    blank = Image.new('L', (1000, 1300), 255)
+    assert estimate_text_height(blank) is None
+    assert without_opencv(lambda: estimate_text_height(blank)) is None
+    # Too few glyphs to trust
+    assert estimate_text_height(glyph_page(24, lines=1).crop((0, 0, 300, 1300))) is None
+
+
+def test_ocr_scale():
+    target = text_metrics.OCR_TARGET_TEXT_HEIGHT
+    assert ocr_scale(15.0, 1000) == target / 15
+    # Large glyphs shrink the page, but never below MIN_SCALE
+    assert ocr_scale(60.0, 1000) == target / 60
+    assert ocr_scale(1000.0, 1000) == text_metrics.MIN_SCALE
+    # Tiny glyphs are enlarged up to OCR_MAX_SCALED_WIDTH
+    assert ocr_scale(2.0, 1000) == text_metrics.OCR_MAX_SCALED_WIDTH / 1000
+    assert ocr_scale(10.0, 1000, target_height=20) == 2.0
+
+
+def test_ocr_scale_without_a_measurement():
+    assert ocr_scale(None, 1000) == text_metrics.FALLBACK_WIDTH / 1000
+    assert ocr_scale(None, 100) == text_metrics.FALLBACK_WIDTH / 100
+    # Never shrunk
+    assert ocr_scale(None, 2500) == 1.0
+
+
+def test_resize_by():
+    page = glyph_page(24)
+    assert resize_by(page, 1.04) is page
+    assert resize_by(page, 0.5).size == (500, 650)
+    assert resize_by(page, 2.0).size == (2000, 2600)
+
+
+def test_scale_for_ocr():
+    # 15px glyphs are doubled to the 30px target, 60px glyphs halved
+    assert scale_for_ocr(glyph_page(15)).width == 2000
+    assert scale_for_ocr(glyph_page(60)).width == 500
+    scaled = scale_for_ocr(glyph_page(15))
+    assert abs(estimate_text_height(scaled) - text_metrics.OCR_TARGET_TEXT_HEIGHT) <= 2
+
+
+if __name__ == "__main__":
+    print("Testing text metrics...")
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✅ {name}")
+    print("\n=== Test Complete ===")
@@ -0,0 +1,110 @@
+"""
+Warm-up checks for warmup.py with a fake OCR backend and a real process pool.
+
+    python test_warmup.py    (or: python -m pytest test_warmup.py)
+"""
+
+import os
+
+import ocr_backend
+import ocr_pool
+import warmup
+
+CERTIFICATE_TEXT = '\n'.join(warmup.CERTIFICATE_LINES)
+
+
+class FakeBackend:
+    """Reads the certificate perfectly, except in processes listed in ``broken_in``"""
+
+    name = 'fake'
+
+    def __init__(self, broken_in=()):
+        self.parent = os.getpid()
+        self.broken_in = broken_in
+
+    def image_to_string(self, image, config='', timeout=0):
+        where = 'parent' if os.getpid() == self.parent else 'pool'
+        return '' if where in self.broken_in else CERTIFICATE_TEXT
+
+
+class FakeProcessor:
+    def __init__(self, text):
+        self.text = text
+        self.calls = []
+
+    def extract_document(self, image_bytes, document_type='auto', **kwargs):
+        self.calls.append(kwargs)
+        return {'text': self.text, 'document_type': 'birth_certificate'}
+
+
+def run_warm_up(backend, processor=None, workers=2):
+    original = ocr_backend._backend, ocr_pool.OCR_POOL_WORKERS
+    # Pool workers are forked after this, so they inherit the fake backend
+    ocr_pool.shutdown()
+    ocr_backend._backend, ocr_pool.OCR_POOL_WORKERS = backend, workers
+    try:
+        return warmup.warm_up(processor)
+    finally:
+        ocr_pool.shutdown()
+        ocr_backend._backend, ocr_pool.OCR_POOL_WORKERS = original
+
+
+def test_certificate_image():
+    image = warmup.certificate_image()
+    assert image.size == (1700, 2200) and image.mode == 'L'
+    # Print-size text on a white page
+    assert image.getextrema() == (0, 255)
+
+
+def test_check_text():
+    warmup.check_text(CERTIFICATE_TEXT, 'test')
+    for text in ('', 'REPUBLIC', 'lorem ipsum dolor'):
+        try:
+            warmup.check_text(text, 'test')
+        except RuntimeError:
+            continue
+        raise AssertionError(f'check_text accepted {text!r}')
+
+
+def test_warm_up_ready():
+    processor = FakeProcessor(CERTIFICATE_TEXT)
+    state = run_warm_up(FakeBackend(), processor)
+    assert state['state'] == warmup.READY, state
+    assert state['pool_workers'] == 2
+    assert state['document_type'] == 'birth_certificate'
+    # The synthetic page stays out of the strategy statistics and Google Vision
+    assert processor.calls[0]['synthetic'] is True
+    assert warmup.ready() and warmup.status() == state
+
+
+def test_warm_up_in_process_only():
+    state = run_warm_up(FakeBackend(), workers=1)
+    assert state['state'] == warmup.READY and state['pool_workers'] == 0
+
+
+def test_broken_pool_fails_warm_up():
+    state = run_warm_up(FakeBackend(broken_in=('pool',)))
+    assert state['state'] == warmup.FAILED
+    assert 'pool worker' in state['error']
+    assert not warmup.ready()
+
+
+def test_broken_backend_fails_warm_up():
+    state = run_warm_up(FakeBackend(broken_in=('parent',)))
+    assert state['state'] == warmup.FAILED
+    assert 'OCR backend' in state['error']
+
+
+def test_processor_without_text_fails_warm_up():
+    state = run_warm_up(FakeBackend(), FakeProcessor(''))
+    assert state['state'] == warmup.FAILED
+    assert 'DocumentOCRProcessor' in state['error']
+
+
+if __name__ == "__main__":
+    print("Testing warm-up...")
+    for name, test in list(globals().items()):
+        if name.startswith('test_') and callable(test):
+            test()
+            print(f"✅ {name}")
+    print("\n=== Test Complete ===")
@@ -0,0 +1,134 @@
+"""
+Glyph size estimation and OCR scale selection.
+
+Tesseract reads best when characters are roughly 20-40 pixels tall. The page
+scale is chosen from the measured character height instead of fixed target
+widths: the median height of character-sized connected components on a
+downscaled, binarized copy of the page. A whole-page phone photo with large
+glyphs is shrunk instead of blown up, a small crop is enlarged as far as needed.
+
+Configuration:
+- OCR_TARGET_TEXT_HEIGHT: character height in pixels pages are scaled to (default 30)
+- OCR_MAX_SCALED_WIDTH: no page is upscaled wider than this (default 3500)
+"""
+
+import os
+import logging
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+import lazy_imports
+from deskew import otsu_threshold
+
+logger = logging.getLogger(__name__)
+
+OCR_TARGET_TEXT_HEIGHT = float(os.environ.get('OCR_TARGET_TEXT_HEIGHT', 30))
+OCR_MAX_SCALED_WIDTH = int(os.environ.get('OCR_MAX_SCALED_WIDTH', 3500))
+
+# Never shrink a page by more than this; thin strokes start to break up
+MIN_SCALE = 0.25
+# Width pages are upscaled to when their text height cannot be measured
+FALLBACK_WIDTH = 2000
+
+# Size of the copy that is measured; text stays several pixels tall at this size
+MEASURE_MAX_DIMENSION = 2000
+# Fewer character-like components than this means the estimate is not trustworthy
+MIN_COMPONENTS = 15
+MIN_LINES = 3
+
+
+def estimate_text_height(image: Image.Image) -> Optional[float]:
+    """
+    Estimate the median character height of a page.
+
+    Args:
+        image: Grayscale page at the resolution it will be OCR'd from
+
+    Returns:
+        Median character height in pixels of ``image``, or None when the page has
+        too few character-like shapes to tell
+    """
+    gray = image if image.mode == 'L' else image.convert('L')
+    factor = min(1.0, MEASURE_MAX_DIMENSION / max(gray.size))
+    if factor < 1.0:
+        gray = gray.resize((max(1, int(gray.width * factor)), max(1, int(gray.height * factor))), Image.BILINEAR)
+
+    pixels = np.asarray(gray)
+    ink = (pixels <= otsu_threshold(pixels)).astype(np.uint8)
+
+    # OpenCV gives connected component statistics, otherwise text lines are measured
+    if lazy_imports.cv2() is not None:
+        heights, minimum = _component_heights(ink), MIN_COMPONENTS
+    else:
+        heights, minimum = _line_heights(ink), MIN_LINES
+
+    if len(heights) < minimum:
+        return None
+    return float(np.median(heights)) / factor
+
+
+def _component_heights(ink: np.ndarray) -> np.ndarray:
+    """Heights of the character-sized connected components of a binary page."""
+    cv2 = lazy_imports.cv2()
+    _, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    areas = stats[1:, cv2.CC_STAT_AREA]
+
+    # Drop specks, ruling lines, boxes and photos
+    page_height, page_width = ink.shape
+    keep = ((heights >= 4) & (areas >= 8)
+            & (heights <= page_height * 0.5) & (widths <= page_width * 0.5)
+            & (widths <= heights * 5) & (heights <= widths * 10))
+    return heights[keep]
+
+
+def _line_heights(ink: np.ndarray) -> np.ndarray:
+    """
+    Text line heights from the row profile, used without OpenCV.
+
+    Lines span ascenders to descenders, so they are scaled down to approximate
+    the character height the connected components would give.
+    """
+    rows = ink.sum(axis=1) > max(2, ink.shape[1] // 200)
+    # Start and end of every run of inked rows
+    edges = np.diff(np.concatenate(([0], rows.astype(np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    runs = ends - starts
+    return runs[runs >= 4] * 0.75
+
+
+def ocr_scale(text_height: Optional[float], width: int,
+              target_height: float = OCR_TARGET_TEXT_HEIGHT) -> float:
+    """
+    Scale factor that brings a measured character height to the target height.
+
+    Args:
+        text_height: Median character height from estimate_text_height (None if unknown)
+        width: Width of the page in pixels
+        target_height: Desired character height in pixels
+
+    Returns:
+        Factor to resize the page by (below 1.0 shrinks it). Without a measurement
+        the page is upscaled to FALLBACK_WIDTH and never shrunk.
+    """
+    max_scale = max(1.0, OCR_MAX_SCALED_WIDTH / width)
+    if not text_height:
+        return min(max(1.0, FALLBACK_WIDTH / width), max_scale)
+    return min(max(target_height / text_height, MIN_SCALE), max_scale)
+
+
+def resize_by(image: Image.Image, factor: float) -> Image.Image:
+    """Resize an image by a factor; changes under 5% are not worth the resampling."""
+    if abs(factor - 1.0) < 0.05:
+        return image
+    new_size = (max(1, round(image.width * factor)), max(1, round(image.height * factor)))
+    return image.resize(new_size, Image.LANCZOS)
+
+
+def scale_for_ocr(image: Image.Image, target_height: float = OCR_TARGET_TEXT_HEIGHT) -> Image.Image:
+    """Resize a page so its characters are about target_height pixels tall."""
+    return resize_by(image, ocr_scale(estimate_text_height(image), image.width, target_height))
@@ -0,0 +1,168 @@
+"""
+Warm-up of a freshly started service worker.
+
+The first request a worker serves otherwise pays for starting Tesseract
+(loading the traineddata, building the tesserocr engine) and for forking the
+OCR process pool. warm_up() runs a synthetic birth certificate, drawn at start-up
+so no sample document has to ship with the service, through the in-process OCR
+backend, through every pool worker and through the service's
+DocumentOCRProcessor, and records the outcome for /health. The warm-up fails
+when any of them reads no text from it: a pool whose Tesseract is broken must
+not report ready.
+
+Configuration:
+- OCR_WARMUP: run the warm-up when serve.py starts a worker (default 1)
+- OCR_WARMUP_TIMEOUT_SECONDS: budget of each warm-up OCR pass (default 60)
+"""
+
+import io
+import os
+import time
+import logging
+import threading
+from typing import Dict, Tuple
+
+from PIL import Image, ImageDraw, ImageFont
+
+logger = logging.getLogger(__name__)
+
+OCR_WARMUP = os.environ.get('OCR_WARMUP', '1').lower() not in ('0', 'false', 'no')
+OCR_WARMUP_TIMEOUT_SECONDS = float(os.environ.get('OCR_WARMUP_TIMEOUT_SECONDS', 60))
+
+# Lines of the synthetic certificate, laid out like the top of a Municipal Form 102
+CERTIFICATE_LINES = (
+    'REPUBLIC OF THE PHILIPPINES',
+    'OFFICE OF THE CIVIL REGISTRAR GENERAL',
+    'CERTIFICATE OF LIVE BIRTH',
+    '',
+    '1. NAME (First) JUAN (Middle) SANTOS (Last) DELA CRUZ',
+    '2. SEX Male',
+    '3. DATE OF BIRTH January 15, 2010',
+    '4. PLACE OF BIRTH Quezon City, Metro Manila',
+    '5. CITIZENSHIP Filipino',
+)
+
+# Words the OCR must find on the certificate for the warm-up to count
+EXPECTED_WORDS = ('REPUBLIC', 'PHILIPPINES', 'CERTIFICATE', 'BIRTH')
+MIN_EXPECTED_WORDS = 2
+# Rounds of one job per cold worker; the pool hands jobs to whichever worker is free
+POOL_WARMUP_ROUNDS = 3
+
+COLD, WARMING, READY, FAILED = 'cold', 'warming', 'ready', 'failed'
+
+_state: Dict = {'state': COLD}
+_state_lock = threading.Lock()
+
+
+def certificate_image(width: int = 1700, height: int = 2200) -> Image.Image:
+    """The synthetic certificate: black print-size text in a ruled box on a white page."""
+    image = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    try:
+        font = ImageFont.load_default(size=36)
+    except TypeError:
+        # Pillow before 10.1 only has the small bitmap font
+        font = ImageFont.load_default()
+    draw.rectangle((60, 60, width - 60, height - 60), outline=0, width=4)
+    for number, line in enumerate(CERTIFICATE_LINES):
+        draw.text((120, 140 + number * 70), line, fill=0, font=font)
+    return image
+
+
+def check_text(text: str, where: str) -> None:
+    """Raise RuntimeError unless the OCR'd text shows the certificate was actually read."""
+    found = [word for word in EXPECTED_WORDS if word in text.upper()]
+    if len(found) < MIN_EXPECTED_WORDS:
+        raise RuntimeError(f"{where} did not read the warm-up certificate ({len(text.strip())} chars)")
+
+
+def _warm_pool_worker(image: Image.Image, tesseract_cmd: str) -> Tuple[int, str]:
+    """OCR the certificate inside a pool worker. Errors propagate, unlike in ocr_pool's jobs."""
+    import lazy_imports
+    import ocr_backend
+    lazy_imports.set_tesseract_cmd(tesseract_cmd)
+    return os.getpid(), ocr_backend.recognize(image, config='--psm 6').text
+
+
+def _warm_pool(image: Image.Image) -> int:
+    """OCR the certificate in every pool worker; returns how many workers were warmed."""
+    import lazy_imports
+    import ocr_pool
+
+    executor = ocr_pool.get_executor()
+    if executor is None:
+        return 0
+    warmed = set()
+    for _ in range(POOL_WARMUP_ROUNDS):
+        cold = max(ocr_pool.OCR_POOL_WORKERS - len(warmed), 0)
+        if not cold:
+            break
+        futures = [executor.submit(_warm_pool_worker, image, lazy_imports.tesseract_cmd()) for _ in range(cold)]
+        for future in futures:
+            pid, text = future.result(timeout=OCR_WARMUP_TIMEOUT_SECONDS)
+            check_text(text, f"OCR pool worker {pid}")
+            warmed.add(pid)
+    if len(warmed) < ocr_pool.OCR_POOL_WORKERS:
+        logger.warning(f"OCR warm-up reached {len(warmed)} of {ocr_pool.OCR_POOL_WORKERS} pool workers")
+    return len(warmed)
+
+
+def warm_up(processor=None) -> Dict:
+    """
+    OCR the synthetic certificate in-process, in every pool worker and, when
+    given, through the service's DocumentOCRProcessor.
+
+    Args:
+        processor: Optional DocumentOCRProcessor; the certificate runs through
+            its whole pipeline (type detection, deskew, templates, candidate
+            search) without being recorded in the strategy statistics
+
+    Returns:
+        The recorded state: {'state': 'ready' or 'failed', 'seconds', 'chars',
+        'pool_workers' and 'document_type', or 'error'}
+    """
+    # The OCR modules are imported here: serve.py sizes the pool through the
+    # environment before they are loaded
+    import ocr_backend
+    from deadline import Deadline
+
+    with _state_lock:
+        _state.clear()
+        _state['state'] = WARMING
+    started = time.monotonic()
+    image = certificate_image()
+    try:
+        text = ocr_backend.recognize(image, config='--psm 6').text
+        check_text(text, 'The OCR backend')
+        state = {'state': READY, 'chars': len(text.strip()), 'pool_workers': _warm_pool(image)}
+        if processor is not None:
+            result = processor.extract_document(_png_bytes(image), 'auto', synthetic=True,
+                                                deadline=Deadline(OCR_WARMUP_TIMEOUT_SECONDS))
+            check_text(result['text'], 'DocumentOCRProcessor')
+            state['document_type'] = result['document_type']
+    except Exception as e:
+        logger.error(f"OCR warm-up failed: {e}")
+        state = {'state': FAILED, 'error': str(e)}
+    state['seconds'] = round(time.monotonic() - started, 3)
+    with _state_lock:
+        _state.clear()
+        _state.update(state)
+    logger.info(f"OCR warm-up: {state}")
+    return dict(state)
+
+
+def _png_bytes(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def status() -> Dict:
+    """The warm-up state of this process ('cold' when no warm-up was run)."""
+    with _state_lock:
+        return dict(_state)
+
+
+def ready() -> bool:
+    """False while the warm-up runs or after it failed."""
+    return status()['state'] in (COLD, READY)